@@ -47,6 +47,18 @@ class constants_properties(type):
     def MAX_LOGROTATE_DEPTH(cls):
         return cls._MAX_LOGROTATE_DEPTH()
 
+    @property
+    def SEARCH_SINCE(cls):
+        return cls._SEARCH_SINCE()
+
+    @property
+    def SEARCH_UNTIL(cls):
+        return cls._SEARCH_UNTIL()
+
+    @property
+    def SEARCH_INDEX_DIR(cls):
+        return cls._SEARCH_INDEX_DIR()
+
 
 class constants(object, metaclass=constants_properties):
     """
@@ -108,3 +120,15 @@ class constants(object, metaclass=constants_properties):
     @classmethod
     def _MAX_LOGROTATE_DEPTH(cls):
         return int(os.environ.get('MAX_LOGROTATE_DEPTH', 7))
+
+    @classmethod
+    def _SEARCH_SINCE(cls):
+        return os.environ.get('SEARCH_SINCE') or None
+
+    @classmethod
+    def _SEARCH_UNTIL(cls):
+        return os.environ.get('SEARCH_UNTIL') or None
+
+    @classmethod
+    def _SEARCH_INDEX_DIR(cls):
+        return os.environ.get('SEARCH_INDEX_DIR') or None
@@ -1,6 +1,62 @@
+import array
+import bisect
+import functools
+import heapq
+import itertools
+import math
 import statistics
 
-from datetime import datetime
+from datetime import datetime, timedelta
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+EPOCH = datetime(1970, 1, 1)
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_date(day, date_format):
+    return datetime.strptime(day, date_format)
+
+
+def parse_timestamp(day, secs, date_format="%Y-%m-%d"):
+    """
+    Convert a log timestamp into a datetime object.
+
+    Log timestamps (e.g. oslo.log) usually have a fixed layout so rather than
+    using strptime for every timestamp, the date is parsed once and memoised
+    and the time is extracted by slicing. Anything not in the expected layout
+    falls back to strptime.
+
+    @param day: date string in date_format e.g. 2021-07-19
+    @param secs: time string of the form HH:MM:SS with an optional fraction
+                 of a second e.g. 09:01:58.498
+    @param date_format: strptime format of day.
+    """
+    date = _parse_date(day, date_format)
+    if (len(secs) >= 8 and secs[2] == ':' and secs[5] == ':' and
+            secs[0:2].isdigit() and secs[3:5].isdigit() and
+            secs[6:8].isdigit()):
+        frac = secs[9:]
+        if len(secs) == 8:
+            usecs = 0
+        elif secs[8] == '.' and 0 < len(frac) <= 6 and frac.isdigit():
+            usecs = int(frac.ljust(6, '0'))
+        else:
+            usecs = None
+
+        if usecs is not None:
+            return datetime(date.year, date.month, date.day, int(secs[0:2]),
+                            int(secs[3:5]), int(secs[6:8]), usecs)
+
+    time_format = "%H:%M:%S"
+    if '.' in secs:
+        time_format += ".%f"
+
+    return datetime.strptime("{} {}".format(day, secs),
+                             "{} {}".format(date_format, time_format))
 
 
 class EventCollection(object):
@@ -14,6 +70,12 @@ class EventCollection(object):
     """
     def __init__(self):
         self._events = {}
+        self._complete_events = None
+        self._incomplete_events = None
+
+    def _reset_cache(self):
+        self._complete_events = None
+        self._incomplete_events = None
 
     def most_recent(self, items):
         """ For an event id that has been re-used, find the most recent one.
@@ -21,12 +83,15 @@ class EventCollection(object):
         This means that when we calculate stats on events found we will include
         only the most recent instance of an event with a given id.
         """
-        return sorted(items, key=lambda e: e["end"], reverse=True)[0]
+        return max(items, key=lambda e: e["end"])
 
     @property
     def complete_events(self):
         """ Complete events are ones for which a duration has been
         calculated which implies their start and has been identified. """
+        if self._complete_events is not None:
+            return self._complete_events
+
         complete = {}
         for event_id, info in self._events.items():
             for item in info.get("heads", []):
@@ -39,10 +104,14 @@ class EventCollection(object):
             if event_id in complete:
                 complete[event_id] = self.most_recent(complete[event_id])
 
+        self._complete_events = complete
         return complete
 
     @property
     def incomplete_events(self):
+        if self._incomplete_events is not None:
+            return self._incomplete_events
+
         incomplete = {}
         for event_id, info in self._events.items():
             for item in info.get("heads", []):
@@ -52,20 +121,32 @@ class EventCollection(object):
 
                     incomplete[event_id].append(item)
 
+        self._incomplete_events = incomplete
         return incomplete
 
     def find_most_recent_start(self, event_id, end_ts):
         """
         For a given event end marker, find the most recent start marker.
         """
-        last = None
-        for item in self._events[event_id].get("heads", []):
-            start_ts = item["start"]
-            if start_ts <= end_ts:
-                if not last or start_ts > last["start"]:
-                    last = item
+        heads = sorted(self._events[event_id].get("heads", []),
+                       key=lambda e: e["start"])
+        return self._find_most_recent_start(heads,
+                                            [item["start"] for item in heads],
+                                            end_ts)
+
+    @staticmethod
+    def _find_most_recent_start(heads, starts, end_ts):
+        """
+        @param heads: list of heads sorted by start time.
+        @param starts: start times of heads (same order).
+        @param end_ts: timestamp of event end.
+        """
+        idx = bisect.bisect_right(starts, end_ts) - 1
+        if idx < 0:
+            return
 
-        return last
+        # if more than one head has the same start, use the first one found
+        return heads[bisect.bisect_left(starts, starts[idx])]
 
     def add_event_end(self, event_id, end_ts):
         """
@@ -81,6 +162,7 @@ class EventCollection(object):
         if event_id not in self._events:
             self._events[event_id] = {}
 
+        self._reset_cache()
         if "tails" not in self._events[event_id]:
             self._events[event_id]["tails"] = [end_ts]
         else:
@@ -114,6 +196,7 @@ class EventCollection(object):
         if event_id not in self._events:
             self._events[event_id] = {}
 
+        self._reset_cache()
         if "heads" not in self._events[event_id]:
             self._events[event_id]["heads"] = [event_info]
         else:
@@ -127,11 +210,20 @@ class EventCollection(object):
 
         Since it is possible for events to be incomplete i.e. not have a start
         or end, we ensure to account for this by matching ends with their
-        most recent start.
+        most recent start. Heads are sorted by start time once per event id so
+        that each end can be matched using bisection.
         """
+        self._reset_cache()
         for event, info in self._events.items():
-            for end_ts in info.get("tails", []):
-                start_item = self.find_most_recent_start(event, end_ts)
+            if not info.get("tails"):
+                continue
+
+            # sort is stable so heads with the same start retain their order
+            heads = sorted(info.get("heads", []), key=lambda e: e["start"])
+            starts = [item["start"] for item in heads]
+            for end_ts in info["tails"]:
+                start_item = self._find_most_recent_start(heads, starts,
+                                                          end_ts)
                 if not start_item:
                     # incomplete event
                     continue
@@ -142,6 +234,189 @@ class EventCollection(object):
                 start_item["end"] = end_ts
 
 
+class OnlineStats(object):
+    """
+    Running statistics for a stream of values calculated without storing the
+    values (Welford's algorithm).
+    """
+
+    def __init__(self):
+        self.samples = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value):
+        self.samples += 1
+        if self.min is None or value < self.min:
+            self.min = value
+
+        if self.max is None or value > self.max:
+            self.max = value
+
+        delta = value - self.mean
+        self.mean += delta / self.samples
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def pvariance(self):
+        if not self.samples:
+            return 0.0
+
+        return self._m2 / self.samples
+
+    @property
+    def pstdev(self):
+        return math.sqrt(self.pvariance)
+
+
+class TopN(object):
+    """ Bounded heap retaining the n items with the largest (or smallest if
+    reverse is False) key. Items added with a uid are unique i.e. only the
+    best item is retained for each uid. """
+
+    def __init__(self, n, reverse=True):
+        self.n = n
+        self.reverse = reverse
+        self._heap = []
+        # uid -> heap entry
+        self._entries = {}
+        # tie-breaker so that items themselves are never compared
+        self._counter = itertools.count()
+
+    def add(self, key, item, uid=None):
+        """
+        @param key: value items are ordered by.
+        @param item: item to retain.
+        @param uid: optional unique id of item.
+        """
+        if not self.reverse:
+            key = -key
+
+        entry = (key, -next(self._counter), item, uid)
+        if uid is not None and uid in self._entries:
+            current = self._entries[uid]
+            if entry < current:
+                return
+
+            self._heap.remove(current)
+            heapq.heapify(self._heap)
+        elif len(self._heap) >= self.n:
+            if entry < self._heap[0]:
+                return
+
+            evicted = heapq.heappop(self._heap)
+            if evicted[3] is not None:
+                del self._entries[evicted[3]]
+
+        heapq.heappush(self._heap, entry)
+        if uid is not None:
+            self._entries[uid] = entry
+
+    def items(self):
+        """ Return items ordered by key, largest first if reverse is True
+        otherwise smallest first. """
+        return [e[2] for e in sorted(self._heap, reverse=True)]
+
+
+class DurationAnalytics(object):
+    """
+    Distribution analysis of event durations i.e. percentiles, per-hour
+    buckets and outliers. Samples are stored in typed arrays and, if numpy is
+    available, calculations are vectorised otherwise pure python is used.
+    """
+
+    def __init__(self):
+        self.durations = array.array('d')
+        # event start as seconds since epoch
+        self.timestamps = array.array('d')
+
+    def add(self, start, duration):
+        """
+        @param start: datetime of event start.
+        @param duration: event duration in seconds.
+        """
+        self.durations.append(duration)
+        self.timestamps.append((start - EPOCH).total_seconds())
+
+    @property
+    def samples(self):
+        return len(self.durations)
+
+    @staticmethod
+    def _percentiles(values, qs):
+        """
+        Linear interpolation between closest ranks. numpy, if available, is
+        only used to sort the values so that results are the same either way.
+        """
+        if numpy is not None:
+            values = numpy.sort(numpy.asarray(values))
+        else:
+            values = sorted(values)
+
+        ret = []
+        for q in qs:
+            pos = (len(values) - 1) * q / 100
+            lo = math.floor(pos)
+            hi = math.ceil(pos)
+            ret.append(float(values[lo] +
+                             (values[hi] - values[lo]) * (pos - lo)))
+
+        return ret
+
+    def percentiles(self, qs=(50, 90, 99)):
+        """ Returns dict of p<q>: <value> for each of qs. """
+        if not self.samples:
+            return {}
+
+        values = self._percentiles(self.durations, qs)
+        return {"p{}".format(q): round(v, 2) for q, v in zip(qs, values)}
+
+    def hourly(self, q=90):
+        """
+        Returns a dict keyed by hour (of event start) with number of samples
+        and percentile q of durations for that hour.
+        """
+        buckets = {}
+        if numpy is not None:
+            hours = (numpy.frombuffer(self.timestamps) // 3600).astype(int)
+            # group in one pass by sorting on hour and splitting where it
+            # changes.
+            order = numpy.argsort(hours, kind='stable')
+            hours = hours[order]
+            durations = numpy.frombuffer(self.durations)[order]
+            uniq, idxs = numpy.unique(hours, return_index=True)
+            for hour, values in zip(uniq, numpy.split(durations, idxs[1:])):
+                buckets[int(hour)] = values
+        else:
+            for ts, duration in zip(self.timestamps, self.durations):
+                buckets.setdefault(int(ts // 3600), []).append(duration)
+
+        hourly = {}
+        for hour in sorted(buckets):
+            label = (EPOCH + timedelta(hours=hour)).strftime("%Y-%m-%d %H:00")
+            hourly[label] = {
+                'samples': len(buckets[hour]),
+                "p{}".format(q): round(self._percentiles(buckets[hour],
+                                                         [q])[0], 2)}
+
+        return hourly
+
+    def outliers(self):
+        """ Number of durations above the upper Tukey fence i.e. more than 1.5
+        times the interquartile range above the third quartile. """
+        if not self.samples:
+            return 0
+
+        q1, q3 = self._percentiles(self.durations, [25, 75])
+        fence = q3 + 1.5 * (q3 - q1)
+        if numpy is not None:
+            return int((numpy.frombuffer(self.durations) > fence).sum())
+
+        return len([d for d in self.durations if d > fence])
+
+
 class SearchResultIndices(object):
     def __init__(self, day_idx=1, secs_idx=2, event_id_idx=3,
                  metadata_idx=None, metadata_key=None):
@@ -167,16 +442,36 @@ class LogEventStats(object):
 
     This class supports overlapping events e.g. for scenarios where logs
     are generated by parallal tasks.
+
+    In streaming mode events are paired in the order they are logged, i.e.
+    an end is paired with the last start seen with the same event id, and
+    complete events are fed into running statistics and bounded top-n heaps
+    so that only unmatched starts are retained. This keeps the analysis
+    itself cheap for a long log history, although the search results it is
+    given are still held in memory. Every complete event counts as a sample,
+    even if its event id has been reused.
     """
 
-    def __init__(self, results, results_tag_prefix, custom_idxs=None):
+    def __init__(self, results, results_tag_prefix, custom_idxs=None,
+                 streaming=False, max_top_n=5):
         """
         @param results: FileSearcher results. This will be searched using
                         <results_tag_prefix>-start and <results_tag_prefix>-end
         @param results_tag_prefix: prefix of tag used for search results for
                                    events start and end.
         @param custom_idxs: optionally provide custom SearchResultIndices.
+        @param streaming: use streaming mode (see above).
+        @param max_top_n: maximum number of top events retained in streaming
+                          mode.
         """
+        self.streaming = streaming
+        self.max_top_n = max_top_n
+        self._stats = OnlineStats()
+        self._longest = TopN(max_top_n)
+        self._shortest = TopN(max_top_n, reverse=False)
+        self._open_events = {}
+        self._num_incomplete = 0
+        self._durations = DurationAnalytics()
         self.data = EventCollection()
         self.results = results
         self.results_tag_prefix = results_tag_prefix
@@ -187,27 +482,102 @@ class LogEventStats(object):
 
         self.log_seq_idxs = log_seq_idxs
 
+    def _get_ordered_results(self, start_tag, end_tag):
+        """
+        Yields (is_start, result) for all start and end results in the order
+        they were logged. Files are ordered by the timestamp of their first
+        result and results within each file by line number. Results are only
+        ordered one file at a time.
+        """
+        seq_idxs = self.log_seq_idxs
+        files = []
+        for path in self.results.files:
+            first = None
+            for tag in (start_tag, end_tag):
+                for r in self.results.find_by_tag(tag, path=path):
+                    if first is None or r.linenumber < first.linenumber:
+                        first = r
+
+            if first is None:
+                continue
+
+            first_ts = parse_timestamp(first.get(seq_idxs.day),
+                                       first.get(seq_idxs.secs))
+            files.append((first_ts, path))
+
+        for _, path in sorted(files, key=lambda e: e[0]):
+            starts = [(r.linenumber, True, r) for r in
+                      self.results.find_by_tag(start_tag, path=path)]
+            ends = [(r.linenumber, False, r) for r in
+                    self.results.find_by_tag(end_tag, path=path)]
+            for _, is_start, result in sorted(starts + ends,
+                                              key=lambda e: e[0]):
+                yield is_start, result
+
+    def _run_streaming(self):
+        seq_idxs = self.log_seq_idxs
+        start_tag = "{}-start".format(self.results_tag_prefix)
+        end_tag = "{}-end".format(self.results_tag_prefix)
+        for is_start, result in self._get_ordered_results(start_tag,
+                                                          end_tag):
+            ts = parse_timestamp(result.get(seq_idxs.day),
+                                 result.get(seq_idxs.secs))
+            event_id = result.get(seq_idxs.event_id)
+            if is_start:
+                if event_id in self._open_events:
+                    # superseded before it completed
+                    self._num_incomplete += 1
+
+                event_info = {"start": ts}
+                metadata = result.get(seq_idxs.metadata)
+                if metadata:
+                    event_info[seq_idxs.metadata_key or "metadata"] = metadata
+
+                self._open_events[event_id] = event_info
+                continue
+
+            event_info = self._open_events.get(event_id)
+            if not event_info or event_info["start"] > ts:
+                continue
+
+            del self._open_events[event_id]
+            etime = ts - event_info["start"]
+            event_info["end"] = ts
+            event_info["duration"] = round(float(etime.total_seconds()), 2)
+            self._stats.add(event_info["duration"])
+            self._durations.add(event_info["start"], event_info["duration"])
+            # results are keyed by event id so only retain the longest and
+            # shortest of each.
+            self._longest.add(event_info["duration"], (event_id, event_info),
+                              uid=event_id)
+            self._shortest.add(event_info["duration"], (event_id, event_info),
+                               uid=event_id)
+
+        self._num_incomplete += len(self._open_events)
+
     def run(self):
         """ Collect event start markers and end markers then attempt to link
         them to form complete events thus allowing us to calculate their
         duration.
         """
+        if self.streaming:
+            self._run_streaming()
+            return
+
         seq_idxs = self.log_seq_idxs
 
         end_tag = "{}-end".format(self.results_tag_prefix)
         for result in self.results.find_by_tag(end_tag):
             day = result.get(seq_idxs.day)
             secs = result.get(seq_idxs.secs)
-            end = "{} {}".format(day, secs)
-            end = datetime.strptime(end, "%Y-%m-%d %H:%M:%S.%f")
+            end = parse_timestamp(day, secs)
             self.data.add_event_end(result.get(seq_idxs.event_id), end)
 
         start_tag = "{}-start".format(self.results_tag_prefix)
         for result in self.results.find_by_tag(start_tag):
             day = result.get(seq_idxs.day)
             secs = result.get(seq_idxs.secs)
-            start = "{} {}".format(day, secs)
-            start = datetime.strptime(start, "%Y-%m-%d %H:%M:%S.%f")
+            start = parse_timestamp(day, secs)
             metadata = result.get(seq_idxs.metadata)
             meta_key = seq_idxs.metadata_key
             event_id = result.get(seq_idxs.event_id)
@@ -215,6 +585,8 @@ class LogEventStats(object):
                                       metadata_key=meta_key)
 
         self.data.calculate_event_deltas()
+        for item in self.data.complete_events.values():
+            self._durations.add(item["start"], item["duration"])
 
     def get_top_n_events_sorted(self, max, reverse=True):
         """
@@ -229,9 +601,17 @@ class LogEventStats(object):
         top_n = {}
         top_n_sorted = {}
 
-        for event_id, item in sorted(self.data.complete_events.items(),
-                                     key=lambda e: e[1]["duration"],
-                                     reverse=reverse):
+        if self.streaming:
+            if reverse:
+                events = self._longest.items()
+            else:
+                events = self._shortest.items()
+        else:
+            events = sorted(self.data.complete_events.items(),
+                            key=lambda e: e[1]["duration"],
+                            reverse=reverse)
+
+        for event_id, item in events:
             if count >= max:
                 break
 
@@ -254,6 +634,20 @@ class LogEventStats(object):
 
     def get_event_stats(self):
         """ Return common statistics on the dataset of events. """
+        if self.streaming:
+            if not self._stats.samples:
+                return
+
+            stats = {'min': round(self._stats.min, 2),
+                     'max': round(self._stats.max, 2),
+                     'stdev': round(self._stats.pstdev, 2),
+                     'avg': round(self._stats.mean, 2),
+                     'samples': self._stats.samples}
+            if self._num_incomplete:
+                stats['incomplete'] = self._num_incomplete
+
+            return stats
+
         events = self.data.complete_events
         if not events:
             return
@@ -269,3 +663,14 @@ class LogEventStats(object):
             stats['incomplete'] = len(self.data.incomplete_events.values())
 
         return stats
+
+    def get_event_distribution(self):
+        """ Return percentiles, outliers and per-hour distribution of event
+        durations. """
+        if not self._durations.samples:
+            return
+
+        distribution = self._durations.percentiles()
+        distribution['outliers'] = self._durations.outliers()
+        distribution['hourly'] = self._durations.hourly()
+        return distribution
@@ -5,7 +5,12 @@ import re
 import subprocess
 import yaml
 
-from core import constants
+from collections import Counter
+
+from core import (
+    constants,
+    host_helpers,
+)
 from core.issues import (
     issue_types,
     issue_utils,
@@ -335,20 +340,33 @@ class BugChecksBase(ChecksBase):
 
 class EventCheckResult(object):
 
-    def __init__(self, search_results, defs_section):
+    def __init__(self, search_results, defs_section, counts=None):
         """
         @param search_results:
         @param defs_section:
+        @param counts: for aggregated events, dict of Counter objects keyed by
+                       source path.
         """
         self.results = search_results
         self.section = defs_section
+        self.counts = counts or {}
+
+    @property
+    def counts_merged(self):
+        """ Counts from all sources merged into a single Counter. """
+        merged = Counter()
+        for counter in self.counts.values():
+            merged.update(counter)
+
+        return merged
 
 
 class EventChecksBase(ChecksBase):
 
     def __init__(self, *args, callback_helper=None,
                  event_results_output_key=None,
-                 event_results_passthrough=False, **kwargs):
+                 event_results_passthrough=False, event_aggregates=None,
+                 **kwargs):
         """
         @param callback_helper: optionally provide a callback helper. This is
         used to "register" callbacks against events defined in the yaml so
@@ -363,11 +381,17 @@ class EventChecksBase(ChecksBase):
                                           list is passed to callbacks so that
                                           they may fetch results in their own
                                           way.
+        @param event_aggregates: optional dict of searchtools.CountBy objects
+                                 keyed by (single-line) event name. Matches
+                                 for these events are counted by the searcher
+                                 and callbacks receive the counts in place of
+                                 results.
         """
         super().__init__(*args, **kwargs)
         self.callback_helper = callback_helper
         self.event_results_output_key = event_results_output_key
         self.event_results_passthrough = event_results_passthrough
+        self.event_aggregates = event_aggregates or {}
         self._event_defs = {}
 
     def _load_event_definitions(self):
@@ -401,6 +425,7 @@ class EventChecksBase(ChecksBase):
                 # if this is a multiline event (has a start and end), append
                 # this to the tag so that it can be used with
                 # core.analytics.LogEventStats.
+                aggregate = None
                 if 'end' in event:
                     tag = "{}-start".format(ename)
                     expr = event['start']['expr']
@@ -409,8 +434,10 @@ class EventChecksBase(ChecksBase):
                     tag = ename
                     expr = event['expr']
                     hint = event.get('hint')
+                    aggregate = self.event_aggregates.get(ename)
 
-                start = SearchDef(expr, tag=tag, hint=hint)
+                start = SearchDef(expr, tag=tag, hint=hint,
+                                  aggregate=aggregate)
                 if 'end' in event:
                     tag = "{}-end".format(ename)
                     hint = event['end'].get('hint')
@@ -435,7 +462,8 @@ class EventChecksBase(ChecksBase):
                 if ename not in self._event_defs[section.name]:
                     self._event_defs[section.name][ename] = {}
 
-                e_def = {'searchdefs': [start], 'datasource': ds}
+                e_def = {'searchdefs': [start], 'datasource': ds,
+                         'aggregated': aggregate is not None}
                 if end:
                     e_def['searchdefs'].append(end)
 
@@ -482,14 +510,20 @@ class EventChecksBase(ChecksBase):
         info = {}
         for section_name, section in self.event_definitions.items():
             for event in section:
-                if self.event_results_passthrough:
+                counts = None
+                if section[event]['aggregated']:
+                    search_results = []
+                    counts = results.find_counts_by_source(event)
+                    if not counts:
+                        continue
+                elif self.event_results_passthrough:
                     # this is for implementations that have their own means of
                     # retreiving results.
                     search_results = results
                 else:
                     search_results = results.find_by_tag(event)
 
-                if not search_results:
+                if not search_results and not counts:
                     continue
 
                 # We want this to throw an exception if the callback is not
@@ -498,7 +532,8 @@ class EventChecksBase(ChecksBase):
                 callback = self.callback_helper.callbacks[callback_name]
                 log.debug("executing event callback '%s'", callback_name)
                 event_results_obj = EventCheckResult(search_results,
-                                                     section_name)
+                                                     section_name,
+                                                     counts=counts)
                 ret = callback(self, event_results_obj)
                 if not ret:
                     continue
@@ -737,10 +772,75 @@ class ConfigChecksBase(object):
                     break
 
 
+class ServiceMatcher(object):
+    """
+    Pre-compiled matcher for a set of service expressions.
+
+    For each of SVC_EXPR_TEMPLATES a single regex combining all expressions
+    is used to discard lines that cannot match any expression before
+    trying the individual (also pre-compiled) expression/template patterns.
+    """
+
+    def __init__(self, service_exprs):
+        """
+        @param service_exprs: list of (expr, hint) tuples.
+        """
+        self.service_exprs = []
+        for expr, hint in service_exprs:
+            if hint:
+                hint = re.compile(hint)
+
+            templates = [(name, re.compile(tmplt.format(expr)))
+                         for name, tmplt in SVC_EXPR_TEMPLATES.items()]
+            self.service_exprs.append((hint, templates))
+
+        combined = "|".join(["(?:{})".format(expr)
+                             for expr, _ in service_exprs])
+        self.prefilters = {}
+        for name, tmplt in SVC_EXPR_TEMPLATES.items():
+            try:
+                self.prefilters[name] = re.compile(tmplt.format(combined))
+            except re.error:
+                # e.g. group names that clash across expressions
+                self.prefilters[name] = None
+
+    def match(self, line):
+        """
+        Returns a list of re.Match objects, one for each expression that
+        matches line using the first matching template.
+        """
+        candidates = set()
+        for name, prefilter in self.prefilters.items():
+            if prefilter is None or prefilter.match(line):
+                candidates.add(name)
+
+        if not candidates:
+            return []
+
+        matches = []
+        for hint, templates in self.service_exprs:
+            if hint and not hint.search(line):
+                continue
+
+            for name, regex in templates:
+                if name not in candidates:
+                    continue
+
+                ret = regex.match(line)
+                if ret:
+                    matches.append(ret)
+                    break
+
+        return matches
+
+
 class ServiceChecksBase(object):
     """This class should be used by any plugin that wants to identify
     and check the status of running services."""
 
+    # matchers are shared by all instances using the same expressions
+    _service_matchers = {}
+
     def __init__(self, service_exprs, *args, hint_range=None, **kwargs):
         """
         @param service_exprs: list of python.re expressions used to match a
@@ -763,38 +863,36 @@ class ServiceChecksBase(object):
 
         self._get_running_services()
 
+    @property
+    def service_matcher(self):
+        key = tuple(self.service_exprs)
+        if key not in self._service_matchers:
+            self._service_matchers[key] = ServiceMatcher(self.service_exprs)
+
+        return self._service_matchers[key]
+
     def _get_running_services(self):
         """
         Execute each provided service expression against lines in ps and store
         each full line in a list against the service matched.
-        """
-        for line in CLIHelper().ps():
-            for expr, hint in self.service_exprs:
-                if hint:
-                    ret = re.compile(hint).search(line)
-                    if not ret:
-                        continue
 
-                """
-                look for running process with this name.
-                We need to account for different types of process binary e.g.
+        We need to account for different types of process binary e.g.
 
-                /snap/<name>/1830/<svc>
-                /usr/bin/<svc>
+        /snap/<name>/1830/<svc>
+        /usr/bin/<svc>
 
-                and filter e.g.
+        and filter e.g.
 
-                /var/lib/<svc> and /var/log/<svc>
-                """
-                for expr_tmplt in SVC_EXPR_TEMPLATES.values():
-                    ret = re.compile(expr_tmplt.format(expr)).match(line)
-                    if ret:
-                        svc = ret.group(1)
-                        if svc not in self.services:
-                            self.services[svc] = {"ps_cmds": []}
-
-                        self.services[svc]["ps_cmds"].append(ret.group(0))
-                        break
+        /var/lib/<svc> and /var/log/<svc>
+        """
+        matcher = self.service_matcher
+        for proc in host_helpers.get_process_table().processes:
+            for ret in matcher.match(proc.line):
+                svc = ret.group(1)
+                if svc not in self.services:
+                    self.services[svc] = {"ps_cmds": []}
+
+                self.services[svc]["ps_cmds"].append(ret.group(0))
 
     def get_service_info_str(self):
         """Create a list of "<service> (<num running>)" for running services
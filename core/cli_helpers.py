@@ -1,12 +1,16 @@
-import glob
 import json
 import os
 import re
 import subprocess
 import sys
-import tempfile
 
-from core import constants
+from core import (
+    constants,
+    filecatalog,
+)
+from core.journal import JournalReader
+from core.jsonstream import JSONStreamReader
+from core.searchtools import SearchSource
 
 
 def catch_exceptions(*exc_types):
@@ -39,6 +43,60 @@ class NullSource(object):
         return []
 
 
+def stream_file_lines(path):
+    """ Lazily read lines from path. """
+    with open(path, 'r', errors="surrogateescape") as fd:
+        for line in fd:
+            yield line
+
+
+def stream_cmd_lines(cmd, env=None):
+    """
+    Lazily read lines of output from cmd as it runs. A command that can't be
+    run produces no output.
+
+    @param cmd: command as a list
+    @param env: optional environment to run the command with.
+    """
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, env=env)
+    except OSError:
+        return
+
+    with proc:
+        for line in proc.stdout:
+            yield line.decode('UTF-8', errors="surrogateescape")
+
+
+def json_decode_stream(fd, json_pointers=None):
+    """
+    Decode JSON read from fd ignoring any trailing content.
+
+    @param fd: file object opened in text mode.
+    @param json_pointers: optional list of JSON pointers. If provided only
+                          the values they reference are decoded and returned
+                          in their place within the document.
+    """
+    reader = JSONStreamReader(fd)
+    if json_pointers:
+        return reader.extract(json_pointers)
+
+    return reader.decode()
+
+
+def get_sosreport_tz():
+    """
+    Return the timezone of the host the data was collected from as
+    reported by its date command or None if that is not available.
+    """
+    try:
+        return DateFileCmd('sos_commands/date/date',
+                           singleline=True)(format="+%Z")
+    except SourceNotFound:
+        return None
+
+
 def run_pre_exec_hooks(f):
     """ pre-exec hooks are run before running __call__ method.
 
@@ -116,6 +174,18 @@ class CmdBase(object):
         """
         self.hooks[name] = f
 
+    def iter_lines(self, *args, **kwargs):
+        """
+        Same as __call__ but returns an iterator over lines of output rather
+        than a list. This default just iterates over the output of __call__
+        so implementations that can produce output lazily should override it.
+        """
+        output = self(*args, **kwargs)
+        if isinstance(output, str):
+            output = output.splitlines(keepends=True)
+
+        return iter(output or [])
+
 
 class BinCmd(CmdBase):
     TYPE = "BIN"
@@ -147,6 +217,15 @@ class BinCmd(CmdBase):
         if kwargs:
             cmd = cmd.format(**kwargs)
 
+        if self.json_decode and kwargs.get('json_pointers'):
+            # decode the requested values as output arrives rather than
+            # collecting and decoding all of it.
+            with subprocess.Popen(cmd.split(), stdout=subprocess.PIPE,
+                                  stderr=subprocess.DEVNULL,
+                                  universal_newlines=True) as proc:
+                return json_decode_stream(proc.stdout,
+                                          kwargs['json_pointers'])
+
         output = subprocess.check_output(cmd.split(),
                                          stderr=subprocess.STDOUT)
 
@@ -158,6 +237,25 @@ class BinCmd(CmdBase):
 
         return output.decode('UTF-8').splitlines(keepends=True)
 
+    def _format_cmd(self, *args, **kwargs):
+        cmd = self.cmd
+        if args:
+            cmd = cmd.format(*args)
+
+        if kwargs:
+            cmd = cmd.format(**kwargs)
+
+        return cmd
+
+    @reset_command
+    @run_pre_exec_hooks
+    def iter_lines(self, *args, **kwargs):
+        return stream_cmd_lines(self._format_cmd(*args, **kwargs).split())
+
+    def search_source(self, *args, **kwargs):
+        return SearchSource(self.original_cmd,
+                            self.iter_lines(*args, **kwargs))
+
 
 class FileCmd(CmdBase):
     TYPE = "FILE"
@@ -188,7 +286,7 @@ class FileCmd(CmdBase):
         if kwargs:
             self.path = self.path.format(**kwargs)
 
-        if not os.path.exists(self.path):
+        if not filecatalog.exists(self.path):
             raise SourceNotFound()
 
         # NOTE: any post-exec hooks much be aware that their input will be
@@ -198,7 +296,8 @@ class FileCmd(CmdBase):
             # surrogateescape but only seldom.
             output = self.safe_readlines(self.path)
         elif self.json_decode:
-            output = json.load(open(self.path))
+            with open(self.path) as fd:
+                output = json_decode_stream(fd, kwargs.get('json_pointers'))
         else:
             output = open(self.path, 'r').readlines()
             if self.singleline:
@@ -206,20 +305,39 @@ class FileCmd(CmdBase):
 
         return output
 
+    @reset_command
+    @run_pre_exec_hooks
+    def _get_path(self, *args, **kwargs):
+        if args:
+            self.path = self.path.format(*args)
+
+        if kwargs:
+            self.path = self.path.format(**kwargs)
+
+        if not filecatalog.exists(self.path):
+            raise SourceNotFound()
+
+        return self.path
+
+    def iter_lines(self, *args, **kwargs):
+        return stream_file_lines(self._get_path(*args, **kwargs))
+
+    def search_source(self, *args, **kwargs):
+        """ Files are searched by path. """
+        return self._get_path(*args, **kwargs)
+
 
 class BinFileCmd(FileCmd):
     """ This is used when we are executing an actual binary/command against a
     file. """
 
-    @catch_exceptions(OSError, subprocess.CalledProcessError,
-                      json.JSONDecodeError)
-    @reset_command
-    @run_post_exec_hooks
-    @run_pre_exec_hooks
-    def __call__(self, *args, **kwargs):
+    def _prepare(self, *args, **kwargs):
+        """
+        Format the command and return the environment to run it with.
+        """
         # TODO: find a better way to handle this because path may still need
         # formatting.
-        if not os.path.exists(self.original_path):
+        if not filecatalog.exists(self.original_path):
             raise SourceNotFound()
 
         if args:
@@ -231,18 +349,36 @@ class BinFileCmd(FileCmd):
         # If this file is part of a sosreport we want to make sure it is run
         # in the same timezone context as the sosreport host.
         env = {}
-        try:
-            env['TZ'] = DateFileCmd('sos_commands/date/date',
-                                    singleline=True)(format="+%Z")
-        except SourceNotFound:
-            pass
+        tz = get_sosreport_tz()
+        if tz is not None:
+            env['TZ'] = tz
+
+        return env
 
+    @catch_exceptions(OSError, subprocess.CalledProcessError,
+                      json.JSONDecodeError)
+    @reset_command
+    @run_post_exec_hooks
+    @run_pre_exec_hooks
+    def __call__(self, *args, **kwargs):
+        env = self._prepare(*args, **kwargs)
         # Now split into a command and run
         output = subprocess.check_output(self.path.split(),
                                          stderr=subprocess.STDOUT, env=env)
 
         return output.decode('UTF-8').splitlines(keepends=True)
 
+    @reset_command
+    @run_pre_exec_hooks
+    def iter_lines(self, *args, **kwargs):
+        env = self._prepare(*args, **kwargs)
+        return stream_cmd_lines(self.path.split(), env=env)
+
+    def search_source(self, *args, **kwargs):
+        """ Output is streamed from the command run against the file. """
+        return SearchSource(self.original_path,
+                            self.iter_lines(*args, **kwargs))
+
 
 class JournalctlBinCmd(BinCmd):
 
@@ -259,19 +395,35 @@ class JournalctlBinCmd(BinCmd):
             self.cmd = "{} --since {}".format(self.cmd, kwargs.get("date"))
 
 
-class JournalctlBinFileCmd(BinFileCmd):
+class JournalFileCmd(FileCmd):
+    """
+    Journal directory (e.g. var/log/journal) read natively rather than by
+    running journalctl against it. Supports the same unit and date options
+    as JournalctlBinCmd.
+    """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.register_hook("pre-exec", self.preformat_sos_journalctl)
+    def _get_reader(self, unit=None, date=None, **kwargs):
+        if not filecatalog.isdir(self.path):
+            raise SourceNotFound()
 
-    def preformat_sos_journalctl(self, **kwargs):
-        self.path = "journalctl -oshort-iso -D {}".format(self.path)
-        if kwargs.get("unit"):
-            self.path = "{} --unit {}".format(self.path, kwargs.get("unit"))
+        # If this journal is part of a sosreport we want to display it in
+        # the same timezone context as the sosreport host.
+        return JournalReader(self.path, unit=unit, since=date,
+                             tz=get_sosreport_tz() or None)
 
-        if kwargs.get("date"):
-            self.path = "{} --since {}".format(self.path, kwargs.get("date"))
+    @catch_exceptions(OSError)
+    @reset_command
+    def __call__(self, *args, **kwargs):
+        return list(self._get_reader(**kwargs))
+
+    @reset_command
+    def iter_lines(self, *args, **kwargs):
+        return iter(self._get_reader(**kwargs))
+
+    def search_source(self, *args, **kwargs):
+        """ Entries are streamed straight from the journal files. """
+        return SearchSource(self.original_path,
+                            self.iter_lines(*args, **kwargs))
 
 
 class OVSDPCTLFileCmd(FileCmd):
@@ -328,56 +480,61 @@ class DateFileCmd(FileCmd):
         return output.decode('UTF-8').splitlines(keepends=True)[0]
 
 
-class CephReportFileCmd(FileCmd):
-
-    def __init__(self, *args, **kwargs):  # pylint: disable=W0613
-        super().__init__(*args, **kwargs)
-        self.register_hook("pre-exec", self.format_json_contents)
-        self.register_hook("post-exec", self.cleanup)
-        self.orig_path = None
-
-    def format_json_contents(self, *args, **kwargs):  # pylint: disable=W0613
-        with open(self.path) as f:
-            lines = f.readlines()
-
-        # Remove the last line as that makes it an invalid json.
-        # The extra line comes from the stderr of 'ceph report'.
-        if lines and lines[-1].startswith('report'):
-            lines = lines[:-1]
-            with tempfile.NamedTemporaryFile(mode='w+t', delete=False) as tmp:
-                tmp.write(''.join(lines))
-                tmp.close()
-                self.orig_path = self.path
-                self.path = tmp.name
-
-    def cleanup(self, output, **kwargs):  # pylint: disable=W0613
-        if not self.orig_path:
-            os.unlink(self.path)
-            self.path = self.orig_path
-        return output
-
-
 class SourceRunner(object):
 
-    def __init__(self, sources):
+    def __init__(self, sources, name=None):
+        """
+        @param sources: list of command source objects.
+        @param name: optional logical name for this command.
+        """
         self.sources = sources
+        self.name = name
 
-    def __call__(self, *args, **kwargs):
+    def _run(self, method, null_output, *args, **kwargs):
         # always try file sources first
         for fsource in [s for s in self.sources
                         if s.TYPE == "FILE"]:
             try:
-                return fsource(*args, **kwargs)
+                return getattr(fsource, method)(*args, **kwargs)
             except SourceNotFound:
                 pass
 
         if constants.DATA_ROOT != '/':
-            return NullSource()()
+            return null_output
 
         # binary sources only apply if data_root is localhost root
         for bsource in [s for s in self.sources
                         if s.TYPE == "BIN"]:
-            return bsource(*args, **kwargs)
+            return getattr(bsource, method)(*args, **kwargs)
+
+    def __call__(self, *args, **kwargs):
+        return self._run('__call__', NullSource()(), *args, **kwargs)
+
+    def iter_lines(self, *args, **kwargs):
+        """
+        Returns a lazy iterator over lines of output. This is preferable to
+        calling the command directly when output can be large and is
+        processed line by line.
+        """
+        out = self._run('iter_lines', iter([]), *args, **kwargs)
+        if out is None:
+            return iter([])
+
+        return out
+
+    def search_source(self, *args, **kwargs):
+        """
+        Returns a data source that can be passed as path to
+        FileSearcher.add_search_term. File-backed commands are searched by
+        path and anything else is streamed from the command.
+        """
+        source = self._run('search_source', None, *args, **kwargs)
+        if source is None:
+            source = SearchSource(self.name, [])
+        elif isinstance(source, SearchSource) and self.name:
+            source.name = self.name
+
+        return source
 
 
 class CLIHelper(object):
@@ -450,11 +607,11 @@ class CLIHelper(object):
             'ceph_report_json_decoded':
                 [BinCmd('ceph report', json_decode=True),
                  # sosreport < 4.2
-                 CephReportFileCmd('sos_commands/ceph/ceph_report',
-                                   json_decode=True),
+                 FileCmd('sos_commands/ceph/ceph_report',
+                         json_decode=True),
                  # sosreport >= 4.2
-                 CephReportFileCmd('sos_commands/ceph_mon/ceph_report',
-                                   json_decode=True),
+                 FileCmd('sos_commands/ceph_mon/ceph_report',
+                         json_decode=True),
                  ],
             'date':
                 [DateBinCmd('date --utc {format}', singleline=True),
@@ -488,7 +645,7 @@ class CLIHelper(object):
                  FileCmd('sos_commands/networking/ip_-s_-d_link')],
             'journalctl':
                 [JournalctlBinCmd('journalctl -oshort-iso'),
-                 JournalctlBinFileCmd('var/log/journal')],
+                 JournalFileCmd('var/log/journal')],
             'ls_lanR_sys_block':
                 [BinCmd('ls -lanR /sys/block/'),
                  FileCmd('sos_commands/block/ls_-lanR_.sys.block')],
@@ -555,7 +712,7 @@ class CLIHelper(object):
     def __getattr__(self, cmdname):
         cmd = self.command_catalog.get(cmdname)
         if cmd:
-            return SourceRunner(cmd)
+            return SourceRunner(cmd, name=cmdname)
         else:
             raise CommandNotFound(cmdname)
 
@@ -565,9 +722,7 @@ def get_ps_axo_flags_available():
                         "sos_commands/process/ps_axo_flags_state_"
                         "uid_pid_ppid_pgid_sid_cls_pri_addr_sz_wchan*_lstart_"
                         "tty_time_cmd")
-    _paths = []
-    for path in glob.glob(path):
-        _paths.append(path)
+    _paths = filecatalog.glob_paths(path)
 
     if not _paths:
         return
@@ -0,0 +1,122 @@
+import bz2
+import gzip
+import io
+import lzma
+import re
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# errors raised when reading a corrupt or truncated compressed file.
+READ_ERRORS = (EOFError, OSError, zlib.error, lzma.LZMAError)
+if zstandard is not None:
+    READ_ERRORS += (zstandard.ZstdError,)
+
+
+class CodecUnavailable(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+    def __str__(self):
+        return self.msg
+
+
+class Codec(object):
+
+    def __init__(self, name, magic, opener, suffixes):
+        """
+        Compression format that logs may be stored in.
+
+        @param name: name of the format.
+        @param magic: bytes that every file in this format starts with.
+        @param opener: callable that takes a path and returns a binary file
+                       object of its decompressed contents or None if
+                       support for this format is not available.
+        @param suffixes: file name suffixes used for this format e.g. by
+                         logrotate.
+        """
+        self.name = name
+        self.magic = magic
+        self.opener = opener
+        self.suffixes = suffixes
+
+    @property
+    def available(self):
+        return self.opener is not None
+
+    def open(self, path):
+        if not self.available:
+            raise CodecUnavailable("no support for {} compressed file {}".
+                                   format(self.name, path))
+
+        return self.opener(path)
+
+
+def _open_zstd(path):
+    reader = zstandard.ZstdDecompressor().stream_reader(
+                                    open(path, 'rb'), read_across_frames=True,
+                                    closefd=True)
+    return io.BufferedReader(reader)
+
+
+# registered codecs in order of detection.
+CODECS = []
+
+
+def register_codec(codec):
+    CODECS.append(codec)
+
+
+register_codec(Codec('gzip', b'\x1f\x8b', lambda path: gzip.open(path, 'rb'),
+                     ['.gz']))
+register_codec(Codec('xz', b'\xfd7zXZ\x00', lambda path: lzma.open(path),
+                     ['.xz']))
+register_codec(Codec('bzip2', b'BZh', lambda path: bz2.open(path), ['.bz2']))
+register_codec(Codec('zstd', b'\x28\xb5\x2f\xfd',
+                     _open_zstd if zstandard else None, ['.zst']))
+
+
+def suffix_expr():
+    """
+    Return regex pattern that matches any of the registered codec suffixes.
+    """
+    return '|'.join([re.escape(suffix) for codec in CODECS
+                     for suffix in codec.suffixes])
+
+
+def detect(fd):
+    """
+    Return the codec of the data in fd or None if it is not compressed with
+    any registered codec. Only the first few bytes are read and fd is left
+    at offset 0.
+
+    @param fd: file object opened in binary mode at offset 0.
+    """
+    head = fd.read(max([len(codec.magic) for codec in CODECS]))
+    fd.seek(0)
+    for codec in CODECS:
+        if head.startswith(codec.magic):
+            return codec
+
+    return None
+
+
+def open_binary(path):
+    """
+    Open path for reading in binary mode, transparently decompressing it.
+
+    @return: tuple of (codec, file object) where codec is None if the file
+             is not compressed. Compressed files are read as a stream of
+             their decompressed contents.
+    """
+    fd = open(path, 'rb')
+    codec = detect(fd)
+    if codec is None:
+        return None, fd
+
+    fd.close()
+    return codec, codec.open(path)
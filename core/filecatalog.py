@@ -0,0 +1,263 @@
+import fnmatch
+import glob
+import os
+
+from core import constants
+from core.runcache import run_cached
+
+
+class CatalogEntry(object):
+
+    def __init__(self, kind, direntry=None):
+        """
+        @param kind: one of 'file', 'dir' or 'other'.
+        @param direntry: os.DirEntry for this path. Stat information is only
+                         retrieved when asked for and then cached by the
+                         entry itself.
+        """
+        self.kind = kind
+        self.direntry = direntry
+
+    @property
+    def size(self):
+        return self.direntry.stat().st_size
+
+    @property
+    def mtime(self):
+        return self.direntry.stat().st_mtime
+
+
+class FileCatalog(object):
+    """
+    Index of paths under a root directory e.g. a sosreport. Directories are
+    scanned with os.scandir the first time a path in them is looked up and
+    subsequent existence, type and glob lookups are resolved against the
+    index rather than the filesystem. Only the directories that are actually
+    queried are ever scanned.
+
+    Every directory is scanned once. Any other path to an already scanned
+    directory (i.e. via a symlink) shares the same listing.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._root_entry = CatalogEntry('dir')
+        # directory path -> listing
+        self._dirs = {}
+        # (dev, inode) -> listing i.e. dict of entry name -> CatalogEntry in
+        # scandir order. Entries for dangling symlinks are None.
+        self._listings = {}
+
+    @staticmethod
+    def _kind(entry):
+        """
+        Returns kind of entry or None if it is a dangling symlink.
+        """
+        try:
+            if entry.is_dir():
+                return 'dir'
+
+            if entry.is_file():
+                return 'file'
+
+            entry.stat()
+        except OSError:
+            return None
+
+        return 'other'
+
+    def _listdir(self, path):
+        """
+        Return listing of directory path, scanning it if not already done.
+        """
+        listing = self._dirs.get(path)
+        if listing is not None:
+            return listing
+
+        listing = {}
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._dirs[path] = listing
+            return listing
+
+        key = (st.st_dev, st.st_ino)
+        if key in self._listings:
+            listing = self._listings[key]
+        else:
+            self._listings[key] = listing
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                entries = []
+
+            for entry in entries:
+                kind = self._kind(entry)
+                if kind is None:
+                    listing[entry.name] = None
+                else:
+                    listing[entry.name] = CatalogEntry(kind, entry)
+
+        self._dirs[path] = listing
+        return listing
+
+    def _normpath(self, path):
+        return os.path.normpath(os.path.abspath(path))
+
+    def covers(self, path):
+        """ Returns True if path is under the root of this catalog. """
+        path = self._normpath(path)
+        return path == self.root or path.startswith(self.root + os.sep)
+
+    def _lookup(self, path):
+        """
+        Return tuple of (found, entry) where found is True if path exists
+        in its parent directory even if it is a dangling symlink.
+        """
+        path = self._normpath(path)
+        if path == self.root:
+            return True, self._root_entry
+
+        if not self.covers(path):
+            return False, None
+
+        parent, name = os.path.split(path)
+        if parent != self.root and not self.isdir(parent):
+            return False, None
+
+        listing = self._listdir(parent)
+        return name in listing, listing.get(name)
+
+    def get(self, path):
+        """
+        Return CatalogEntry for path or None if it does not exist.
+        """
+        return self._lookup(path)[1]
+
+    def exists(self, path):
+        """ Equivalent of os.path.exists. """
+        return self.get(path) is not None
+
+    def lexists(self, path):
+        """ Equivalent of os.path.lexists. """
+        return self._lookup(path)[0]
+
+    def isfile(self, path):
+        entry = self.get(path)
+        return entry is not None and entry.kind == 'file'
+
+    def isdir(self, path):
+        entry = self.get(path)
+        return entry is not None and entry.kind == 'dir'
+
+    def listdir(self, path):
+        if not self.isdir(path):
+            return []
+
+        return list(self._listdir(self._normpath(path)))
+
+    def glob(self, pattern):
+        """
+        Equivalent of glob.glob (non-recursive) against the catalog. Returned
+        paths retain the form of the pattern provided.
+        """
+        if not glob.has_magic(pattern):
+            if self.lexists(pattern):
+                return [pattern]
+
+            return []
+
+        dirname, basename = os.path.split(pattern)
+        if dirname and glob.has_magic(dirname):
+            dirs = [d for d in self.glob(dirname) if self.isdir(d)]
+        else:
+            dirs = [dirname]
+
+        paths = []
+        for d in dirs:
+            if not glob.has_magic(basename):
+                path = os.path.join(d, basename)
+                if self.lexists(path):
+                    paths.append(path)
+
+                continue
+
+            names = self.listdir(d or os.curdir)
+            if not basename.startswith('.'):
+                names = [n for n in names if not n.startswith('.')]
+
+            for name in fnmatch.filter(names, basename):
+                paths.append(os.path.join(d, name))
+
+        return paths
+
+
+@run_cached
+def get_catalog():
+    """
+    Returns a FileCatalog for DATA_ROOT if it is a sosreport, otherwise None
+    since the contents of a live host are not static. The catalog starts out
+    empty and only scans the directories that are looked up.
+    """
+    if constants.DATA_ROOT == '/' or not os.path.isdir(constants.DATA_ROOT):
+        return
+
+    return FileCatalog(constants.DATA_ROOT)
+
+
+def _get_catalog(path):
+    catalog = get_catalog()
+    if catalog and catalog.covers(path):
+        return catalog
+
+
+def exists(path):
+    catalog = _get_catalog(path)
+    if catalog:
+        return catalog.exists(path)
+
+    return os.path.exists(path)
+
+
+def isfile(path):
+    catalog = _get_catalog(path)
+    if catalog:
+        return catalog.isfile(path)
+
+    return os.path.isfile(path)
+
+
+def isdir(path):
+    catalog = _get_catalog(path)
+    if catalog:
+        return catalog.isdir(path)
+
+    return os.path.isdir(path)
+
+
+def listdir(path):
+    catalog = _get_catalog(path)
+    if catalog:
+        return catalog.listdir(path)
+
+    return os.listdir(path)
+
+
+def glob_paths(pattern):
+    catalog = _get_catalog(pattern)
+    if catalog:
+        return catalog.glob(pattern)
+
+    return glob.glob(pattern)
+
+
+def getmtime(path):
+    catalog = _get_catalog(path)
+    if catalog:
+        entry = catalog.get(path)
+        if entry is None or entry.direntry is None:
+            raise FileNotFoundError(path)
+
+        return entry.mtime
+
+    return os.path.getmtime(path)
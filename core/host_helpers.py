@@ -1,41 +1,46 @@
+import ipaddress
 import os
+import queue
 import re
 
-from core import cli_helpers
-from core.utils import mktemp_dump
-from core.searchtools import (
-    FileSearcher,
-    SearchDef,
-    SequenceSearchDef,
-)
+from concurrent.futures import ThreadPoolExecutor
+
+from core import constants
+from core.cli_helpers import CLIHelper
+from core.runcache import run_cached
 
 # compatible with ip addr and ip link
 # this one is name and state
 IP_IFACE_NAME = r"^\d+:\s+(\S+):\s+.+state\s+(\S+)"
-IP_IFACE_NAME_TEMPLATE = r"^\d+:\s+({}):\s+.+"
 IP_IFACE_V4_ADDR = r".+(inet) ([\d\.]+)/(\d+) (?:brd \S+ )?scope global (\S+)"
 IP_IFACE_V6_ADDR = r".+(inet6) (\S+)/(\d+) scope global (\S+)"
 IP_IFACE_HW_ADDR = r".+(link/ether) (\S+) brd .+"
 IP_IFACE_HW_ADDR_TEMPLATE = r".+(link/ether) {} brd .+"
 IP_IFACE_VXLAN_INFO = r"\s+(vxlan) id (\d+) local (\S+) dev (\S+) .+"
-IP_EOF = r"^$"
+IP_LINK_STATS_HEADER = r"\s+([RT]X):\s+.+"
+# ip link stats we collect
+IP_LINK_COUNTERS = ['packets', 'dropped', 'errors', 'overrun']
+
+# Processes whose argv[0] is an interpreter are also indexed by the name of
+# the script they are running.
+PS_INTERPRETERS = r"^(?:ba|da|z)?sh$|^python[0-9.]*$|^perl$"
 
 
 class NetworkPort(object):
 
-    def __init__(self, name, addresses, hwaddr, state, encap_info):
+    def __init__(self, name, addresses, hwaddr, state, encap_info,
+                 prefixlens=None):
+        """
+        @param addresses: list of addresses
+        @param prefixlens: optional list of prefix lengths corresponding to
+                           addresses.
+        """
         self.name = name
         self.addresses = addresses
+        self.prefixlens = prefixlens or []
         self.hwaddr = hwaddr
         self.state = state
         self.encap_info = encap_info
-        self.cli_helper = cli_helpers.CLIHelper()
-        self.f_ip_link_show = mktemp_dump(''.join(self.cli_helper.ip_link()))
-        self._counters = None
-
-    def __del__(self):
-        if os.path.exists(self.f_ip_link_show):
-            os.unlink(self.f_ip_link_show)
 
     def to_dict(self):
         return {self.name: {'addresses': self.addresses,
@@ -44,135 +49,326 @@ class NetworkPort(object):
 
     @property
     def stats(self):
-        if self._counters:
-            return self._counters
-
-        """ Get ip link info for the interface. """
-        s = FileSearcher()
-        seqdef = SequenceSearchDef(
-                    # match start of interface
-                    start=SearchDef(IP_IFACE_NAME_TEMPLATE.format(self.name)),
-                    # match body of interface
-                    body=SearchDef(r".+"),
-                    # match next interface or EOF
-                    end=SearchDef([IP_IFACE_NAME, IP_EOF]),
-                    tag="ifaces")
-        s.add_search_term(seqdef, path=self.f_ip_link_show)
-        results = s.search()
-        stats_raw = []
-        for section in results.find_sequence_sections(seqdef).values():
-            for result in section:
-                if result.tag == seqdef.body_tag:
-                    stats_raw.append(result.get(0))
-
-        # NOTE: we only expect one match
-        counters = {}
-        if stats_raw:
-            for i, line in enumerate(stats_raw):
-                ret = re.compile(r"\s+([RT]X):\s+.+").findall(line)
+        """ Get ip link counters for the interface. """
+        return get_network_topology().link_counters.get(self.name)
+
+
+class NetworkTopology(object):
+    """
+    Snapshot of the network interfaces on the host and in its network
+    namespaces. Output of ip addr is parsed once and interfaces are indexed by
+    name, hwaddr and address. Namespace interfaces are only loaded when a
+    lookup needs them and then concurrently, in batches, until the lookup is
+    satisfied.
+    """
+
+    def __init__(self):
+        self.cli = CLIHelper()
+        # helpers available for loading namespaces. Command objects hold
+        # state while they run so concurrent loads each take their own.
+        self._ns_clis = queue.Queue()
+        self._ns_clis.put(self.cli)
+        self._host_interfaces = None
+        self._host_names = set()
+        self._namespaces = None
+        # {namespace: [NetworkPort, ..]} for namespaces loaded so far.
+        self._ns_interfaces = {}
+        # Namespaces are indexed in the order they are listed so that lookups
+        # always return the first found. This is the number indexed so far.
+        self._ns_indexed = 0
+        self._link_counters = None
+        # indexes retain the first interface found for a key with host
+        # interfaces always indexed before those in namespaces.
+        self._by_name = {}
+        self._by_hwaddr = {}
+        self._by_addr = {}
+        # list of (ipaddress.ip_interface, NetworkPort) for CIDR matching
+        self._addrs = []
+
+    @staticmethod
+    def parse_ip_addr(lines):
+        """
+        Parse ip address show output.
+
+        @param lines: ip addr output as a list of lines.
+        @return: list of NetworkPort objects.
+        """
+        start = re.compile(IP_IFACE_NAME)
+        body = [re.compile(expr) for expr in [IP_IFACE_V4_ADDR,
+                                              IP_IFACE_V6_ADDR,
+                                              IP_IFACE_HW_ADDR,
+                                              IP_IFACE_VXLAN_INFO]]
+        interfaces = []
+        port = None
+        for line in lines:
+            ret = start.match(line)
+            if ret:
+                port = NetworkPort(ret.group(1), [], None, ret.group(2), None)
+                interfaces.append(port)
+                continue
+
+            if port is None:
+                continue
+
+            for expr in body:
+                ret = expr.match(line)
                 if ret:
-                    rxtx = ret[0].lower()
-                    ret = re.compile(r"\s*([a-z]+)\s*").findall(line)
-                    if ret:
-                        for j, column in enumerate(ret):
-                            value = int(stats_raw[i + 1].split()[j])
-                            if column in ['packets', 'dropped', 'errors',
-                                          'overrun']:
-                                if rxtx not in counters:
-                                    counters[rxtx] = {}
+                    break
+            else:
+                continue
+
+            if ret.group(1) in ['inet', 'inet6']:
+                port.addresses.append(ret.group(2))
+                port.prefixlens.append(int(ret.group(3)))
+            elif ret.group(1) in ['vxlan']:
+                port.encap_info = {ret.group(1): {'id': ret.group(2),
+                                                  'local_ip': ret.group(3),
+                                                  'dev': ret.group(4)}}
+            else:
+                port.hwaddr = ret.group(2)
 
-                                counters[rxtx][column] = value
+        return interfaces
 
-        if counters:
-            self._counters = counters
+    @staticmethod
+    def parse_ip_link_counters(lines):
+        """
+        Parse ip -s -d link output.
 
-        return self._counters
+        @param lines: ip link output as a list of lines.
+        @return: dict of rx/tx counters keyed by interface name.
+        """
+        start = re.compile(IP_IFACE_NAME)
+        header = re.compile(IP_LINK_STATS_HEADER)
+        column = re.compile(r"\s*([a-z]+)\s*")
+        counters = {}
+        iface = None
+        lines = list(lines)
+        for i, line in enumerate(lines):
+            ret = start.match(line)
+            if ret:
+                iface = ret.group(1)
+                continue
+
+            if not line.strip():
+                iface = None
+                continue
+
+            if iface is None:
+                continue
+
+            ret = header.findall(line)
+            if not ret or i + 1 >= len(lines):
+                continue
+
+            rxtx = ret[0].lower()
+            values = lines[i + 1].split()
+            for j, name in enumerate(column.findall(line)):
+                if name not in IP_LINK_COUNTERS:
+                    continue
+
+                try:
+                    value = int(values[j])
+                except (IndexError, ValueError):
+                    # ignore malformed values
+                    continue
+
+                iface_counters = counters.setdefault(iface, {})
+                iface_counters.setdefault(rxtx, {})[name] = value
+
+        return counters
+
+    @property
+    def link_counters(self):
+        """
+        Interface counters for all interfaces in ip -s -d link. These are
+        parsed in bulk the first time they are needed.
+        """
+        if self._link_counters is None:
+            lines = self.cli.ip_link()
+            self._link_counters = self.parse_ip_link_counters(lines)
 
+        return self._link_counters
 
-class HostNetworkingHelper(object):
+    def _index(self, interfaces):
+        for port in interfaces:
+            self._by_name.setdefault(port.name, port)
+            if port.hwaddr:
+                self._by_hwaddr.setdefault(port.hwaddr, port)
 
-    def __init__(self):
-        self._host_interfaces = []
-        self._host_ns_interfaces = []
-        self.cli = cli_helpers.CLIHelper()
-        self.ip_addr_dump = mktemp_dump('\n'.join(self.cli.ip_addr()))
-
-    def __del__(self):
-        if os.path.exists(self.ip_addr_dump):
-            os.unlink(self.ip_addr_dump)
-
-    def _get_interfaces(self, namespaces=False):
-        """
-        Get all interfaces in ip address show.
-
-        @param namespaces: if set to True will get interfaces from all
-        namespaces on the host.
-        @return: list of NetworkPort objects for each interface found.
-        """
-        paths = []
-        seq = SequenceSearchDef(start=SearchDef(IP_IFACE_NAME),
-                                body=SearchDef([IP_IFACE_V4_ADDR,
-                                                IP_IFACE_V6_ADDR,
-                                                IP_IFACE_HW_ADDR,
-                                                IP_IFACE_VXLAN_INFO]),
-                                tag='ip_addr_show')
-        search_obj = FileSearcher()
-        if namespaces:
-            for ns in self.cli.ip_netns():
-                ns_name = ns.partition(" ")[0]
-                ip_addr = self.cli.ns_ip_addr(namespace=ns_name)
-                path = mktemp_dump('\n'.join(ip_addr))
-                search_obj.add_search_term(seq, path)
-                paths.append(path)
+            for addr, prefixlen in zip(port.addresses, port.prefixlens):
+                try:
+                    iface = ipaddress.ip_interface("{}/{}".format(addr,
+                                                                  prefixlen))
+                except ValueError:
+                    continue
+
+                self._by_addr.setdefault(iface.ip, port)
+                self._addrs.append((iface, port))
+
+    @property
+    def host_interfaces(self):
+        if self._host_interfaces is None:
+            self._host_interfaces = self.parse_ip_addr(self.cli.ip_addr())
+            self._host_names = set([p.name for p in self._host_interfaces])
+            self._index(self._host_interfaces)
+
+        return self._host_interfaces
+
+    @property
+    def num_workers(self):
+        if constants.MAX_PARALLEL_TASKS == 0:
+            return 1  # i.e. no parallelism
+
+        return constants.MAX_PARALLEL_TASKS
+
+    @property
+    def namespaces(self):
+        if self._namespaces is None:
+            self._namespaces = [ns.partition(" ")[0]
+                                for ns in self.cli.ip_netns()]
+
+        return self._namespaces
+
+    def _get_ns_interfaces(self, namespace):
+        # helpers are returned once used so that at most one is created per
+        # concurrent load rather than one per namespace.
+        try:
+            cli = self._ns_clis.get_nowait()
+        except queue.Empty:
+            cli = CLIHelper()
+
+        try:
+            return self.parse_ip_addr(cli.ns_ip_addr(namespace=namespace))
+        finally:
+            self._ns_clis.put(cli)
+
+    def _load_namespaces(self, count=None):
+        """
+        Load and index interfaces for the next count namespaces, or all
+        remaining if count is None. Namespaces are loaded concurrently.
+
+        @return: number of namespaces indexed.
+        """
+        # ensure host interfaces are indexed first
+        self.host_interfaces
+        if count is None:
+            batch = self.namespaces[self._ns_indexed:]
+        else:
+            batch = self.namespaces[self._ns_indexed:self._ns_indexed + count]
+
+        todo = [ns for ns in batch if ns not in self._ns_interfaces]
+        if len(todo) > 1 and self.num_workers > 1:
+            with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+                loaded = list(pool.map(self._get_ns_interfaces, todo))
         else:
-            paths = [self.ip_addr_dump]
-            search_obj.add_search_term(seq, self.ip_addr_dump)
+            loaded = [self._get_ns_interfaces(ns) for ns in todo]
+
+        self._ns_interfaces.update(zip(todo, loaded))
+        for ns in batch:
+            self._index(self._ns_interfaces[ns])
 
-        r = search_obj.search()
+        self._ns_indexed += len(batch)
+        return len(batch)
+
+    def get_ns_interfaces(self, namespace):
+        """ Returns interfaces for a single namespace. """
+        if namespace not in self.namespaces:
+            return []
+
+        if namespace not in self._ns_interfaces:
+            self._ns_interfaces[namespace] = \
+                self._get_ns_interfaces(namespace)
+
+        return self._ns_interfaces[namespace]
+
+    @property
+    def ns_interfaces(self):
+        self._load_namespaces()
         interfaces = []
-        for path in paths:
-            sections = r.find_sequence_sections(seq, path).values()
-            for section in sections:
-                addrs = []
-                encap_info = None
-                hwaddr = None
-                name = None
-                state = None
-                for result in section:
-                    if result.tag == seq.start_tag:
-                        name = result.get(1)
-                        state = result.get(2)
-                    elif result.tag == seq.body_tag:
-                        if result.get(1) in ['inet', 'inet6']:
-                            addrs.append(result.get(2))
-                        elif result.get(1) in ['vxlan']:
-                            encap_info = {result.get(1): {
-                                              'id': result.get(2),
-                                              'local_ip': result.get(3),
-                                              'dev': result.get(4)}}
-                        else:
-                            hwaddr = result.get(2)
-
-                interfaces.append(NetworkPort(name, addrs, hwaddr, state,
-                                              encap_info))
+        for ns in self.namespaces:
+            interfaces += self._ns_interfaces[ns]
 
         return interfaces
 
+    def _lookup(self, index, key):
+        """
+        Lookup key in index, only loading as many namespaces as needed if not
+        found on the host.
+        """
+        self.host_interfaces
+        while key not in index:
+            if not self._load_namespaces(self.num_workers):
+                break
+
+        return index.get(key)
+
+    def _find_in_network(self, network):
+        self.host_interfaces
+        start = 0
+        while True:
+            for iface, port in self._addrs[start:]:
+                if iface.ip in network:
+                    return port
+
+            start = len(self._addrs)
+            if not self._load_namespaces(self.num_workers):
+                return
+
+    def get_interface_with_name(self, name):
+        return self._lookup(self._by_name, name)
+
+    def get_interface_with_hwaddr(self, hwaddr):
+        return self._lookup(self._by_hwaddr, hwaddr)
+
+    def get_interface_with_addr(self, addr):
+        """
+        @param addr: an address or network in CIDR notation. If a network is
+                     provided the first interface with an address in that
+                     network is returned.
+        """
+        try:
+            return self._lookup(self._by_addr, ipaddress.ip_address(addr))
+        except ValueError:
+            pass
+
+        try:
+            network = ipaddress.ip_network(addr, strict=False)
+        except ValueError:
+            # e.g. a hostname
+            return
+
+        return self._find_in_network(network)
+
+    def host_interface_exists(self, name, check_namespaces=True):
+        self.host_interfaces
+        if name in self._host_names:
+            return True
+
+        if not check_namespaces:
+            return False
+
+        return self.get_interface_with_name(name) is not None
+
+
+@run_cached
+def get_network_topology():
+    """ Return the NetworkTopology for this run. """
+    return NetworkTopology()
+
+
+class HostNetworkingHelper(object):
+    """ Interface to the NetworkTopology for this run. """
+
+    def __init__(self):
+        self.topology = get_network_topology()
+
     @property
     def host_interfaces(self):
-        if self._host_interfaces:
-            return self._host_interfaces
-
-        self._host_interfaces = self._get_interfaces()
-        return self._host_interfaces
+        return self.topology.host_interfaces
 
     @property
     def host_ns_interfaces(self):
-        if self._host_ns_interfaces:
-            return self._host_ns_interfaces
-
-        self._host_ns_interfaces = self._get_interfaces(namespaces=True)
-        return self._host_ns_interfaces
+        return self.topology.ns_interfaces
 
     @property
     def host_interfaces_all(self):
@@ -180,31 +376,213 @@ class HostNetworkingHelper(object):
 
     def get_interface_with_hwaddr(self, hwaddr):
         """ Returns first found. """
-        for iface in self.host_interfaces_all:
-            if iface.hwaddr == hwaddr:
-                return iface
+        return self.topology.get_interface_with_hwaddr(hwaddr)
 
     def get_interface_with_addr(self, addr):
-        for iface in self.host_interfaces_all:
-            for _addr in iface.addresses:
-                if _addr.startswith(addr):
-                    return iface
+        return self.topology.get_interface_with_addr(addr)
 
     def get_interface_with_name(self, name):
-        for iface in self.host_interfaces_all:
-            if iface.name == name:
-                return iface
+        return self.topology.get_interface_with_name(name)
 
     def host_interface_exists(self, name, check_namespaces=True):
-        names = [_iface.name for _iface in self.host_interfaces]
-        if name in names:
-            return True
+        return self.topology.host_interface_exists(name, check_namespaces)
 
-        if not check_namespaces:
-            return False
 
-        names = [_iface.name for _iface in self.host_ns_interfaces]
-        if name in names:
-            return True
+class Process(object):
+
+    def __init__(self, pid, argv, line, user=None, rss=None, start=None,
+                 lstart=None):
+        """
+        @param pid: process id
+        @param argv: command line split into a list of arguments
+        @param line: the original line of ps output
+        @param user: user running the process
+        @param rss: resident set size in KiB
+        @param start: START column of ps
+        @param lstart: full start date (minus weekday) as provided by
+                       ps_axo_flags.
+        """
+        self.pid = pid
+        self.argv = argv
+        self.line = line
+        self.user = user
+        self.rss = rss
+        self.start = start
+        self.lstart = lstart
+
+    @property
+    def binary(self):
+        if self.argv:
+            return os.path.basename(self.argv[0])
+
+    def get_arg(self, key):
+        """
+        Return value of argument key or None if not found. Values can be
+        provided either as "<key> <value>" or "<key>=<value>".
+        """
+        for i, arg in enumerate(self.argv):
+            if arg == key:
+                if i + 1 < len(self.argv):
+                    return self.argv[i + 1]
+
+                return
+
+            if arg.startswith(key + '='):
+                return arg.partition('=')[2]
+
+
+class ProcessTable(object):
+    """
+    Structured view of the processes running on a host.
+
+    This is built once from the output of ps and (if available) ps_axo_flags
+    and indexes processes by binary basename and by argument key so that
+    lookups by consumers are dictionary lookups rather than regex scans of
+    every line of ps.
+    """
+
+    def __init__(self, ps_lines, ps_axo_flags_lines=None):
+        self.processes = []
+        self._by_pid = {}
+        self._by_binary = {}
+        self._by_arg = {}
+        self._load_ps(ps_lines)
+        self._load_ps_axo_flags(ps_axo_flags_lines or [])
+
+    def _add(self, proc):
+        self.processes.append(proc)
+        self._by_pid[proc.pid] = proc
+        names = [proc.binary]
+        if (len(proc.argv) > 1 and
+                re.compile(PS_INTERPRETERS).match(proc.binary)):
+            names.append(os.path.basename(proc.argv[1]))
+
+        for name in names:
+            if name not in self._by_binary:
+                self._by_binary[name] = []
+
+            self._by_binary[name].append(proc)
+
+        for key, value in self._get_arg_pairs(proc.argv):
+            if key not in self._by_arg:
+                self._by_arg[key] = {}
+
+            if value not in self._by_arg[key]:
+                self._by_arg[key][value] = []
+
+            self._by_arg[key][value].append(proc)
+
+    @staticmethod
+    def _get_arg_pairs(argv):
+        """
+        Extract (key, value) pairs from a list of arguments. Keys are
+        options i.e. start with a '-' and values are either provided as the
+        next argument or with '='. Values that are themselves comma-separated
+        lists of key=value e.g. qemu "-name guest=instance-0001,debug=on" are
+        also indexed by "<option> <subkey>=" e.g. "-name guest=".
+        """
+        pairs = []
+        for i, arg in enumerate(argv[1:], start=1):
+            if not arg.startswith('-') or arg in ['-', '--']:
+                continue
+
+            if '=' in arg:
+                key, _, value = arg.partition('=')
+            elif i + 1 < len(argv) and not argv[i + 1].startswith('-'):
+                key = arg
+                value = argv[i + 1]
+            else:
+                continue
+
+            pairs.append((key, value))
+            for item in value.split(','):
+                subkey, sep, subvalue = item.partition('=')
+                if sep and subkey and subvalue:
+                    pairs.append(("{} {}=".format(key, subkey), subvalue))
+
+        return pairs
+
+    def _load_ps(self, lines):
+        """
+        Expects ps auxwww format i.e. columns:
+
+            USER PID %CPU %MEM VSZ RSS TTY STAT START TIME COMMAND
+        """
+        for line in lines:
+            fields = line.split(None, 10)
+            if len(fields) < 11 or not fields[1].isdigit():
+                # header, threads (ps m) and unrecognised lines
+                continue
+
+            rss = None
+            if fields[5].isdigit():
+                rss = int(fields[5])
+
+            self._add(Process(int(fields[1]), fields[10].split(),
+                              line.rstrip('\n'), user=fields[0], rss=rss,
+                              start=fields[8]))
+
+    def _load_ps_axo_flags(self, lines):
+        """
+        Expects columns:
+
+            F S UID PID PPID PGID SID CLS PRI ADDR SZ WCHAN STARTED TT TIME CMD
+
+        where STARTED (lstart) is a five field date.
+        """
+        for line in lines:
+            fields = line.split(None, 19)
+            if len(fields) < 20 or not fields[3].isdigit():
+                continue
+
+            pid = int(fields[3])
+            # skip the weekday
+            lstart = ' '.join(fields[13:17])
+            proc = self._by_pid.get(pid)
+            if proc:
+                proc.lstart = lstart
+            else:
+                self._add(Process(pid, fields[19].split(), line.rstrip('\n'),
+                                  lstart=lstart))
+
+    @property
+    def binaries(self):
+        """ Names of all binaries (and interpreted scripts) running. """
+        return list(self._by_binary.keys())
+
+    def get_by_pid(self, pid):
+        return self._by_pid.get(pid)
+
+    def find_by_binary(self, name):
+        """ Return list of Process whose binary basename is name. """
+        return self._by_binary.get(name, [])
+
+    def find_by_arg(self, key, value=None):
+        """
+        Return list of Process that have argument key. If value is provided
+        only processes where key has that value are returned.
+        """
+        values = self._by_arg.get(key, {})
+        if value is not None:
+            return values.get(value, [])
+
+        procs = []
+        for _procs in values.values():
+            procs += _procs
+
+        return procs
+
+    def find(self, binary, key, value):
+        """
+        Return list of Process with given binary basename and argument
+        key/value.
+        """
+        pids = set([p.pid for p in self.find_by_binary(binary)])
+        return [p for p in self.find_by_arg(key, value) if p.pid in pids]
+
 
-        return False
+@run_cached
+def get_process_table():
+    """ Return the ProcessTable for this run. """
+    cli = CLIHelper()
+    return ProcessTable(cli.ps(), cli.ps_axo_flags())
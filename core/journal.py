@@ -0,0 +1,547 @@
+import bisect
+import heapq
+import lzma
+import mmap
+import os
+import re
+import struct
+
+from datetime import datetime, timezone
+
+from core.log import log
+from core import filecatalog
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# See https://systemd.io/JOURNAL_FILE_FORMAT/ for details of the format.
+SIGNATURE = b'LPKSHHRH'
+INCOMPATIBLE_COMPRESSED_XZ = 1 << 0
+INCOMPATIBLE_COMPRESSED_LZ4 = 1 << 1
+INCOMPATIBLE_KEYED_HASH = 1 << 2
+INCOMPATIBLE_COMPRESSED_ZSTD = 1 << 3
+INCOMPATIBLE_COMPACT = 1 << 4
+INCOMPATIBLE_SUPPORTED = (INCOMPATIBLE_COMPRESSED_XZ |
+                          INCOMPATIBLE_COMPRESSED_LZ4 |
+                          INCOMPATIBLE_KEYED_HASH |
+                          INCOMPATIBLE_COMPRESSED_ZSTD |
+                          INCOMPATIBLE_COMPACT)
+
+OBJECT_DATA = 1
+OBJECT_FIELD = 2
+OBJECT_ENTRY = 3
+OBJECT_ENTRY_ARRAY = 6
+OBJECT_COMPRESSED_XZ = 1 << 0
+OBJECT_COMPRESSED_LZ4 = 1 << 1
+OBJECT_COMPRESSED_ZSTD = 1 << 2
+
+# header field offsets
+HEADER_INCOMPATIBLE_FLAGS = 12
+HEADER_FIELD_HASH_TABLE_OFFSET = 120
+HEADER_FIELD_HASH_TABLE_SIZE = 128
+HEADER_N_ENTRIES = 152
+HEADER_ENTRY_ARRAY_OFFSET = 176
+
+OBJECT_HEADER = struct.Struct('<BB6xQ')
+ENTRY_HEADER = struct.Struct('<QQ')  # seqnum, realtime
+U32 = struct.Struct('<I')
+U64 = struct.Struct('<Q')
+
+# journalctl --unit appends .service to names without a unit type suffix
+UNIT_SUFFIX_EXPR = re.compile(r'\.(service|socket|target|device|mount|'
+                              r'automount|swap|timer|path|slice|scope)$')
+# journalctl shows messages containing control characters as blob data
+NON_PRINTABLE_EXPR = re.compile('[\x00-\x08\x0b-\x1f\x7f-\x9f]')
+JOURNAL_DIR_EXPR = re.compile(r'^[0-9a-f]{32}$')
+# fields needed to format an entry as journalctl -o short-iso would
+OUTPUT_FIELDS = (b'MESSAGE', b'_HOSTNAME', b'SYSLOG_IDENTIFIER', b'_COMM',
+                 b'_PID', b'SYSLOG_PID', b'_SOURCE_REALTIME_TIMESTAMP')
+
+
+class JournalFileError(Exception):
+    pass
+
+
+def unit_name(unit):
+    if UNIT_SUFFIX_EXPR.search(unit):
+        return unit
+
+    return "{}.service".format(unit)
+
+
+def format_bytes(size):
+    """ Format size as journalctl does e.g. 10B or 1.5K. """
+    for suffix in 'EPTGMK':
+        factor = 1024 ** ('KMGTPE'.index(suffix) + 1)
+        if size >= factor:
+            return "{}.{}{}".format(size // factor,
+                                    (size // (factor // 10)) % 10, suffix)
+
+    return "{}B".format(size)
+
+
+def get_timezone(name):
+    """
+    Return tzinfo for timezone name e.g. as provided by date +%Z. Like
+    journalctl run with TZ=<name>, names that are not known are treated as
+    UTC.
+    """
+    if name and ZoneInfo is not None:
+        try:
+            return ZoneInfo(name.strip())
+        except (ValueError, OSError, KeyError):
+            pass
+
+    return timezone.utc
+
+
+class EntryList(object):
+
+    def __init__(self, journal, n_entries, array_offset, first=None):
+        """
+        Sequence of entry offsets stored in a chain of entry array objects
+        e.g. all entries in a file or all entries that reference a data
+        object.
+
+        @param journal: JournalFile
+        @param n_entries: number of entries in the list.
+        @param array_offset: offset of first entry array in the chain.
+        @param first: optional entry offset that precedes those in the
+                      chain.
+        """
+        self.journal = journal
+        self.n_entries = n_entries
+        self.head = [first] if first else []
+        # list of (index of first item, offset, number of items)
+        self.arrays = []
+        index = len(self.head)
+        while array_offset and index < n_entries:
+            n_items = journal.entry_array_size(array_offset)
+            self.arrays.append((index, array_offset, n_items))
+            index += n_items
+            array_offset = journal.u64(array_offset + 16)
+
+        self.starts = [a[0] for a in self.arrays]
+
+    def __len__(self):
+        return self.n_entries
+
+    def __getitem__(self, index):
+        if index < len(self.head):
+            return self.head[index]
+
+        start, offset, _ = self.arrays[bisect.bisect_right(self.starts,
+                                                           index) - 1]
+        return self.journal.entry_array_item(offset, index - start)
+
+    def bisect_realtime(self, realtime):
+        """ Return index of first entry at or after realtime. """
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.journal.entry_realtime(self[mid]) < realtime:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    def iter_from(self, index):
+        """ Yield entry offsets starting from index. """
+        for i in range(index, min(len(self.head), self.n_entries)):
+            yield self.head[i]
+
+        for start, offset, n_items in self.arrays:
+            for i in range(max(index - start, 0),
+                           min(n_items, self.n_entries - start)):
+                yield self.journal.entry_array_item(offset, i)
+
+
+class JournalFile(object):
+
+    def __init__(self, path):
+        """
+        Read-only access to a systemd journal file.
+
+        @param path: path to journal file.
+        """
+        self.path = path
+        with open(path, 'rb') as fd:
+            try:
+                self.mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                # e.g. empty file
+                raise JournalFileError("{}: {}".format(path, e)) from e
+
+        if self.mm[:len(SIGNATURE)] != SIGNATURE:
+            self.close()
+            raise JournalFileError("{}: not a journal file".format(path))
+
+        flags = U32.unpack_from(self.mm, HEADER_INCOMPATIBLE_FLAGS)[0]
+        if flags & ~INCOMPATIBLE_SUPPORTED:
+            self.close()
+            raise JournalFileError("{}: unsupported journal features "
+                                   "{:#x}".format(path, flags))
+
+        self.compact = bool(flags & INCOMPATIBLE_COMPACT)
+        # size of an entry item and an entry array item
+        if self.compact:
+            self.entry_item_size, self.array_item = 4, U32
+        else:
+            self.entry_item_size, self.array_item = 16, U64
+
+        self._fields = {}
+        # data objects shared by many entries e.g. _HOSTNAME are only parsed
+        # once.
+        self._data_cache = {}
+
+    def close(self):
+        self.mm.close()
+
+    def u64(self, offset):
+        return U64.unpack_from(self.mm, offset)[0]
+
+    def _object(self, offset, expected_type):
+        """ Return (flags, size) of object at offset. """
+        _type, flags, size = OBJECT_HEADER.unpack_from(self.mm, offset)
+        if _type != expected_type or offset + size > len(self.mm):
+            raise JournalFileError("{}: invalid object at {}".
+                                   format(self.path, offset))
+
+        return flags, size
+
+    def _decompress(self, flags, payload):
+        if flags & OBJECT_COMPRESSED_XZ:
+            return lzma.decompress(payload)
+
+        if flags & OBJECT_COMPRESSED_LZ4:
+            if lz4 is None:
+                raise JournalFileError("lz4 compressed data not supported")
+
+            size = U64.unpack_from(payload)[0]
+            return lz4.block.decompress(payload[8:], uncompressed_size=size)
+
+        if flags & OBJECT_COMPRESSED_ZSTD:
+            if zstandard is None:
+                raise JournalFileError("zstd compressed data not supported")
+
+            return zstandard.ZstdDecompressor().decompressobj().decompress(
+                                                                    payload)
+
+        return payload
+
+    def data_payload(self, offset):
+        """ Return "FIELD=value" payload of data object at offset. """
+        flags, size = self._object(offset, OBJECT_DATA)
+        start = offset + (72 if self.compact else 64)
+        return self._decompress(flags, self.mm[start:offset + size])
+
+    def data_field(self, offset):
+        """ Return (name, value) of data object at offset. """
+        ret = self._data_cache.get(offset)
+        if ret is None:
+            name, _, value = self.data_payload(offset).partition(b'=')
+            ret = (name, value)
+            if name != b'MESSAGE':
+                if len(self._data_cache) > 65536:
+                    self._data_cache.clear()
+
+                self._data_cache[offset] = ret
+
+        return ret
+
+    def entry_array_size(self, offset):
+        _, size = self._object(offset, OBJECT_ENTRY_ARRAY)
+        return (size - 24) // self.array_item.size
+
+    def entry_array_item(self, offset, index):
+        return self.array_item.unpack_from(self.mm, offset + 24 +
+                                           index * self.array_item.size)[0]
+
+    def entry_realtime(self, offset):
+        return ENTRY_HEADER.unpack_from(self.mm, offset + 16)[1]
+
+    def entry_key(self, offset):
+        """ Return (realtime, seqnum) used to order entries. """
+        seqnum, realtime = ENTRY_HEADER.unpack_from(self.mm, offset + 16)
+        return realtime, seqnum
+
+    def entry_fields(self, offset, names):
+        """
+        Return dict of fields of entry at offset restricted to those in
+        names. Where a field occurs more than once the first is used.
+        """
+        _, size = self._object(offset, OBJECT_ENTRY)
+        fields = {}
+        item_size = self.entry_item_size
+        for pos in range(offset + 64, offset + size, item_size):
+            if self.compact:
+                data_offset = U32.unpack_from(self.mm, pos)[0]
+            else:
+                data_offset = U64.unpack_from(self.mm, pos)[0]
+
+            name, value = self.data_field(data_offset)
+            if name in names and name not in fields:
+                fields[name] = value
+
+        return fields
+
+    def entries(self):
+        """ Return EntryList of all entries in the file. """
+        return EntryList(self, self.u64(HEADER_N_ENTRIES),
+                         self.u64(HEADER_ENTRY_ARRAY_OFFSET))
+
+    def _find_field(self, name):
+        """
+        Return offset of field object for name or None if not found. Rather
+        than hash name (the hash function depends on file flags) we walk
+        the field hash table which is small.
+        """
+        if name in self._fields:
+            return self._fields[name]
+
+        self._fields[name] = None
+        table = self.u64(HEADER_FIELD_HASH_TABLE_OFFSET)
+        table_size = self.u64(HEADER_FIELD_HASH_TABLE_SIZE)
+        for bucket in range(table, table + table_size, 16):
+            offset = self.u64(bucket)
+            while offset:
+                _, size = self._object(offset, OBJECT_FIELD)
+                if self.mm[offset + 40:offset + size] == name:
+                    self._fields[name] = offset
+                    return offset
+
+                # next_hash_offset
+                offset = self.u64(offset + 24)
+
+        return None
+
+    def find_data(self, payload):
+        """
+        Return EntryList of entries that reference the data object with
+        payload (FIELD=value) or None if no such object exists.
+        """
+        offset = self._find_field(payload.partition(b'=')[0])
+        if offset is None:
+            return None
+
+        # head_data_offset
+        offset = self.u64(offset + 32)
+        while offset:
+            if self.data_payload(offset) == payload:
+                entry_offset, array_offset, n_entries = struct.unpack_from(
+                    '<QQQ', self.mm, offset + 40)
+                return EntryList(self, n_entries, array_offset,
+                                 first=entry_offset)
+
+            # next_field_offset
+            offset = self.u64(offset + 32)
+
+        return None
+
+
+class JournalReader(object):
+
+    def __init__(self, path, unit=None, since=None, tz=None):
+        """
+        Read entries from a journal directory e.g. var/log/journal of a
+        sosreport and format them as journalctl -o short-iso would. This
+        avoids depending on journalctl (and its version) being available on
+        the analysing host.
+
+        Filters are applied using the journal's own indexes so that only
+        matching entries are read.
+
+        @param path: path to journal directory.
+        @param unit: optional systemd unit name to restrict entries to.
+        @param since: optional date as YYYY-MM-DD[ HH:MM:SS] to restrict
+                      entries to.
+        @param tz: optional timezone name used to display timestamps and to
+                   interpret since. Defaults to UTC.
+        """
+        self.path = path
+        self.unit = unit
+        self.tz = get_timezone(tz)
+        self.since = None
+        if since:
+            fmt = '%Y-%m-%d %H:%M:%S' if ' ' in since else '%Y-%m-%d'
+            since = datetime.strptime(since, fmt).replace(tzinfo=self.tz)
+            self.since = int(since.timestamp() * 1000000)
+
+    def journal_files(self):
+        """
+        Return paths of journal files in path and its machine id
+        subdirectories.
+        """
+        paths = []
+        dirs = [self.path]
+        for name in sorted(filecatalog.listdir(self.path)):
+            if JOURNAL_DIR_EXPR.match(name):
+                dirs.append(os.path.join(self.path, name))
+
+        for _dir in dirs:
+            if not filecatalog.isdir(_dir):
+                continue
+
+            for name in sorted(filecatalog.listdir(_dir)):
+                if name.endswith('.journal') or name.endswith('.journal~'):
+                    paths.append(os.path.join(_dir, name))
+
+        return paths
+
+    def _unit_matches(self, journal):
+        """
+        Return list of (EntryList, conditions) for entries related to unit
+        where conditions are further fields the entry must have. This is the
+        same set of matches that journalctl --unit uses (excluding
+        coredumps).
+        """
+        unit = unit_name(self.unit).encode()
+        matches = []
+        for payload, conditions in [(b'_SYSTEMD_UNIT=' + unit, {}),
+                                    (b'UNIT=' + unit, {b'_PID': b'1'}),
+                                    (b'OBJECT_SYSTEMD_UNIT=' + unit,
+                                     {b'_UID': b'0'})]:
+            entries = journal.find_data(payload)
+            if entries is not None:
+                matches.append((entries, conditions))
+
+        return matches
+
+    @staticmethod
+    def _filter_entries(journal, offsets, conditions):
+        for offset in offsets:
+            if journal.entry_fields(offset, conditions) == conditions:
+                yield offset
+
+    def _iter_matches(self, journal, matches):
+        """
+        Yield offsets of entries in any of matches in file order, skipping
+        any that don't meet the conditions of their match.
+        """
+        iters = []
+        for entries, conditions in matches:
+            start = 0
+            if self.since is not None:
+                start = entries.bisect_realtime(self.since)
+
+            offsets = entries.iter_from(start)
+            if conditions:
+                offsets = self._filter_entries(journal, offsets, conditions)
+
+            iters.append(offsets)
+
+        last = None
+        # entries are appended to the file so file order is entry order
+        for offset in heapq.merge(*iters):
+            if offset != last:
+                yield offset
+
+            last = offset
+
+    def _iter_file(self, journal):
+        """ Yield (realtime, seqnum, journal, offset) for entries in file. """
+        try:
+            if self.unit:
+                offsets = self._iter_matches(journal,
+                                             self._unit_matches(journal))
+            else:
+                entries = journal.entries()
+                start = 0
+                if self.since is not None:
+                    start = entries.bisect_realtime(self.since)
+
+                offsets = entries.iter_from(start)
+
+            for offset in offsets:
+                realtime, seqnum = journal.entry_key(offset)
+                yield realtime, seqnum, journal, offset
+        except (JournalFileError, struct.error, IndexError, ValueError,
+                lzma.LZMAError) as e:
+            # e.g. a file that was being written to when it was collected
+            log.debug("unable to read all of journal file %s - %s",
+                      journal.path, e)
+
+    def format_entry(self, journal, offset, realtime):
+        """
+        Format entry as journalctl -o short-iso does. Returns None for
+        entries that have no message.
+        """
+        fields = journal.entry_fields(offset, OUTPUT_FIELDS)
+        message = fields.get(b'MESSAGE')
+        if message is None:
+            return None
+
+        source_realtime = fields.get(b'_SOURCE_REALTIME_TIMESTAMP')
+        if source_realtime and source_realtime.isdigit():
+            realtime = int(source_realtime)
+
+        ts = datetime.fromtimestamp(realtime // 1000000, self.tz)
+        prefix = [ts.strftime('%Y-%m-%dT%H:%M:%S%z').encode()]
+        if fields.get(b'_HOSTNAME'):
+            prefix.append(b' ' + fields[b'_HOSTNAME'])
+
+        identifier = (fields.get(b'SYSLOG_IDENTIFIER') or
+                      fields.get(b'_COMM') or b'unknown')
+        prefix.append(b' ' + identifier)
+        pid = fields.get(b'_PID') or fields.get(b'SYSLOG_PID')
+        if pid:
+            prefix.append(b'[' + pid + b']')
+
+        prefix.append(b': ')
+        prefix = b''.join(prefix).decode('UTF-8', errors="surrogateescape")
+        try:
+            message = message.decode('UTF-8')
+        except UnicodeDecodeError:
+            message = None
+
+        if message is None or NON_PRINTABLE_EXPR.search(message):
+            return "{}[{} blob data]\n".format(prefix, format_bytes(
+                                              len(fields[b'MESSAGE'])))
+
+        message = message.replace('\t', ' ' * 8)
+        # continuation lines are aligned with the first
+        indent = '\n' + ' ' * len(prefix)
+        return prefix + indent.join(message.rstrip('\n').split('\n')) + '\n'
+
+    def __iter__(self):
+        """ Lazily yield formatted lines of output in timestamp order. """
+        journals = []
+        for path in self.journal_files():
+            try:
+                journals.append(JournalFile(path))
+            except (JournalFileError, OSError) as e:
+                log.debug("skipping journal file %s - %s", path, e)
+
+        try:
+            for realtime, _, journal, offset in heapq.merge(
+                    *[self._iter_file(j) for j in journals],
+                    key=lambda e: e[:2]):
+                try:
+                    text = self.format_entry(journal, offset, realtime)
+                except (JournalFileError, struct.error, ValueError,
+                        lzma.LZMAError) as e:
+                    log.debug("skipping journal entry in %s - %s",
+                              journal.path, e)
+                    continue
+
+                if text is None:
+                    continue
+
+                for line in text.splitlines(keepends=True):
+                    yield line
+        finally:
+            for journal in journals:
+                journal.close()
@@ -0,0 +1,240 @@
+import json
+import re
+
+# Characters that matter when skipping over a container value without
+# decoding it.
+SKIP_EXPR = re.compile(r'[\[\]{}"]')
+# Remainder of a string value i.e. everything after its opening quote.
+STRING_END_EXPR = re.compile(r'(?:[^"\\]|\\.)*"', re.DOTALL)
+WHITESPACE_EXPR = re.compile(r'[ \t\n\r]*')
+# Characters that can follow a value. Numbers and literals are not delimited
+# themselves so are only complete once one of these (or EOF) is reached.
+VALUE_DELIMITERS = ',}] \t\n\r'
+
+
+def parse_pointer(pointer):
+    """
+    Split a JSON pointer (RFC 6901) e.g. "/osdmap_manifest/pinned_maps" into
+    its reference tokens.
+    """
+    if not pointer:
+        return []
+
+    if not pointer.startswith('/'):
+        raise ValueError("invalid json pointer '{}'".format(pointer))
+
+    return [t.replace('~1', '/').replace('~0', '~')
+            for t in pointer.split('/')[1:]]
+
+
+class JSONStreamReader(object):
+    """
+    Decode JSON from a file object without first having to load or copy all
+    of it.
+
+    Only the first top-level value is decoded so any trailing content is
+    ignored e.g. the line that 'ceph report' writes to stderr and which
+    ends up at the end of the sosreport copy of its output.
+
+    Callers that only need parts of a (large) document can ask for them by
+    JSON pointer with extract(), in which case everything else is scanned
+    over rather than decoded and reading stops as soon as all requested
+    parts have been found.
+    """
+
+    def __init__(self, fd, chunk_size=65536):
+        """
+        @param fd: file object opened in text mode.
+        @param chunk_size: amount of data read from fd at a time.
+        """
+        self.fd = fd
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _error(self, msg):
+        return json.JSONDecodeError(msg, self.buf, self.pos)
+
+    def _read(self, size=None):
+        """
+        Read more data into the buffer, dropping anything already consumed.
+
+        @return: False if there is nothing left to read.
+        """
+        if self.eof:
+            return False
+
+        data = self.fd.read(size or self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        """
+        Return the next non-whitespace character without consuming it or an
+        empty string if there is none.
+        """
+        while True:
+            self.pos = WHITESPACE_EXPR.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+
+            if not self._read():
+                return ''
+
+    def _expect(self, chars):
+        c = self._peek()
+        if not c or c not in chars:
+            raise self._error("expected one of '{}'".format(chars))
+
+        self.pos += 1
+        return c
+
+    def _decode_value(self):
+        """ Decode the value starting at the current position. """
+        self._peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # value may be incomplete
+                if not self._read(size):
+                    raise
+
+                size *= 2
+                continue
+
+            # a number (or literal) is only complete if it is followed by a
+            # delimiter e.g. 1.25 split as "1." and "25" decodes as 1.
+            if (self.buf[self.pos] not in '{["' and
+                    (end == len(self.buf) or
+                     self.buf[end] not in VALUE_DELIMITERS) and
+                    self._read(size)):
+                size *= 2
+                continue
+
+            self.pos = end
+            return value
+
+    def _skip_value(self):
+        """ Move past the value starting at the current position. """
+        if self._peek() not in ('{', '['):
+            self._decode_value()
+            return
+
+        depth = 0
+        while True:
+            match = SKIP_EXPR.search(self.buf, self.pos)
+            if not match:
+                self.pos = len(self.buf)
+                if not self._read():
+                    raise self._error("unterminated value")
+
+                continue
+
+            if match.group(0) == '"':
+                end = STRING_END_EXPR.match(self.buf, match.end())
+                if not end:
+                    # string continues beyond the buffer
+                    self.pos = match.start()
+                    if not self._read():
+                        raise self._error("unterminated string")
+
+                    continue
+
+                self.pos = end.end()
+                continue
+
+            self.pos = match.end()
+            if match.group(0) in '{[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def _walk_object(self, wanted, last):
+        """
+        Walk the object at the current position returning only the members
+        in wanted.
+
+        @param wanted: dict of member name to either a dict of the same form
+                       for members to be walked in turn or None for members to
+                       be decoded in full.
+        @param last: if True nothing beyond this object is needed so return
+                     as soon as all wanted members have been found.
+        """
+        result = {}
+        remaining = set(wanted)
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+            return result
+
+        while True:
+            key = self._decode_value()
+            if not isinstance(key, str):
+                raise self._error("expected object member name")
+
+            self._expect(':')
+            if key not in remaining:
+                self._skip_value()
+            else:
+                remaining.discard(key)
+                if wanted[key] is None:
+                    result[key] = self._decode_value()
+                elif self._peek() == '{':
+                    result[key] = self._walk_object(wanted[key],
+                                                    last and not remaining)
+                else:
+                    self._skip_value()
+
+            if last and not remaining:
+                return result
+
+            if self._expect(',}') == '}':
+                return result
+
+    def decode(self):
+        """ Decode the first top-level value. """
+        return self._decode_value()
+
+    def extract(self, pointers):
+        """
+        Decode only the values referenced by pointers. Pointers reference
+        object members; array elements can be returned as part of a value but
+        not referenced individually.
+
+        @param pointers: list of JSON pointers.
+        @return: the document pruned down to the requested values (and their
+                 parent objects) such that the result can be accessed in the
+                 same way as the full document. Values that do not exist are
+                 omitted.
+        """
+        wanted = {}
+        for pointer in pointers:
+            tokens = parse_pointer(pointer)
+            if not tokens:
+                return self.decode()
+
+            node = wanted
+            for token in tokens[:-1]:
+                if token in node and node[token] is None:
+                    # already wanted in full
+                    break
+
+                node = node.setdefault(token, {})
+            else:
+                node[tokens[-1]] = None
+
+        if self._peek() != '{':
+            raise self._error("expected object")
+
+        return self._walk_object(wanted, True)
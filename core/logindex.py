@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+from core.log import log
+from core import constants
+
+INDEX_VERSION = 1
+# a carriage return that is not part of a CRLF
+LONE_CR_EXPR = re.compile(rb'\r(?!\n)')
+
+
+def index_path(path, st):
+    """
+    Return path of the index for the log at path. Indexes are keyed by file
+    identity so that a log that has changed (e.g. on a live host) or been
+    replaced gets a new index.
+
+    @param path: path of log file.
+    @param st: os.stat_result for path.
+    """
+    identity = "{}:{}:{}:{}:{}".format(os.path.realpath(path), st.st_dev,
+                                       st.st_ino, st.st_size, st.st_mtime_ns)
+    name = hashlib.sha1(identity.encode()).hexdigest()
+    return os.path.join(constants.SEARCH_INDEX_DIR, "{}.json".format(name))
+
+
+def text_lines(line):
+    """
+    Split a line read in binary mode into the lines that text mode would
+    read from it. Universal newlines also end a line at a lone '\r' and
+    translate all line endings to '\n'.
+
+    @param line: bytes ending with b'\n' (unless at EOF).
+    @return: list of (size in bytes, line as str).
+    """
+    if b'\r' not in line:
+        return [(len(line), line.decode('utf-8'))]
+
+    pieces = []
+    start = 0
+    for ret in LONE_CR_EXPR.finditer(line):
+        pieces.append(line[start:ret.end()])
+        start = ret.end()
+
+    if start < len(line):
+        pieces.append(line[start:])
+
+    lines = []
+    for piece in pieces:
+        text = piece.decode('utf-8')
+        if text.endswith('\r\n'):
+            text = text[:-2] + '\n'
+        elif text.endswith('\r'):
+            text = text[:-1] + '\n'
+
+        lines.append((len(piece), text))
+
+    return lines
+
+
+class LogIndex(object):
+    # number of lines between index entries
+    INTERVAL = 1000
+    # logs smaller than this are quick enough to read in full so are not
+    # indexed.
+    MIN_SIZE = 65536
+
+    def __init__(self, lines, entries):
+        """
+        Sparse index of an uncompressed log.
+
+        @param lines: total number of lines in the log.
+        @param entries: list of [timestamp, offset, linenumber] for every
+                        INTERVAL lines where timestamp is that of the first
+                        timestamped line at or after linenumber (or None if
+                        there is none).
+        """
+        self.lines = lines
+        self.entries = entries
+
+    @classmethod
+    def load(cls, path, st):
+        """
+        Return LogIndex for path or None if indexing is disabled or the log
+        has not been indexed.
+        """
+        if not constants.SEARCH_INDEX_DIR:
+            return None
+
+        try:
+            with open(index_path(path, st)) as fd:
+                data = json.load(fd)
+        except (OSError, ValueError):
+            return None
+
+        if data.get('version') != INDEX_VERSION:
+            return None
+
+        return cls(data['lines'], data['entries'])
+
+    def save(self, path, st):
+        data = {'version': INDEX_VERSION, 'path': path, 'lines': self.lines,
+                'entries': self.entries}
+        dst = index_path(path, st)
+        try:
+            # write then rename so that concurrent searches of the same file
+            # never see a partial index.
+            with tempfile.NamedTemporaryFile(mode='w', delete=False,
+                                             dir=os.path.dirname(dst)) as fd:
+                json.dump(data, fd)
+
+            os.replace(fd.name, dst)
+        except OSError as e:
+            log.debug("unable to save index of %s - %s", path, e)
+
+    def find_start(self, since):
+        """
+        Return (offset, linenumber) of a line at or before the first line
+        timestamped at or after since. Like bisection, this assumes that
+        timestamps are in order.
+        """
+        for timestamp, offset, linenumber in reversed(self.entries):
+            # everything before this entry is older than its timestamp
+            if timestamp is not None and timestamp < since:
+                return offset, linenumber
+
+        return 0, 1
+
+
+class LogIndexer(object):
+
+    def __init__(self, path, fd, get_timestamp):
+        """
+        Iterate over the lines of a log and build a LogIndex from them as we
+        go so that indexing costs no more than the search that reads it. The
+        index is only saved once the end of the log is reached. Lines are
+        read as they would be in text mode.
+
+        @param path: path of log file.
+        @param fd: file object opened in binary mode at offset 0.
+        @param get_timestamp: callable that returns the timestamp of a line
+                              or None.
+        """
+        self.path = path
+        self.fd = fd
+        self.get_timestamp = get_timestamp
+        self.st = os.fstat(fd.fileno())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.fd.close()
+
+    def __iter__(self):
+        entries = []
+        # entries still waiting for a timestamp
+        pending = []
+        offset = 0
+        linenumber = 0
+        for raw in self.fd:
+            for size, line in text_lines(raw):
+                linenumber += 1
+                if linenumber % LogIndex.INTERVAL == 0:
+                    entry = [None, offset, linenumber]
+                    entries.append(entry)
+                    pending.append(entry)
+
+                if pending:
+                    timestamp = self.get_timestamp(line)
+                    if timestamp is not None:
+                        for entry in pending:
+                            entry[0] = timestamp
+
+                        pending = []
+
+                offset += size
+                yield line
+
+        LogIndex(linenumber, entries).save(self.path, self.st)
@@ -7,10 +7,9 @@ import yaml
 from core import (
     checks,
     constants,
+    host_helpers,
     plugintools,
-    utils,
 )
-from core.cli_helpers import CLIHelper
 
 JUJU_LOG_PATH = os.path.join(constants.DATA_ROOT, "var/log/juju")
 JUJU_LIB_PATH = os.path.join(constants.DATA_ROOT, "var/lib/juju")
@@ -40,16 +39,11 @@ class JujuMachine(object):
             path = path[0]
             # filter out 'sanitised' lines since they will not be valid yaml
             if os.path.exists(path):
-                ftmp = utils.mktemp_dump("")
-                with open(ftmp, 'w') as fdtmp:
-                    expr = re.compile(r"\*\*\*\*\*\*\*\*\*")
-                    with open(path) as fd:
-                        for line in fd.readlines():
-                            if not expr.search(line):
-                                fdtmp.write(line)
+                expr = re.compile(r"\*\*\*\*\*\*\*\*\*")
+                with open(path) as fd:
+                    lines = [line for line in fd if not expr.search(line)]
 
-                self.cfg = yaml.safe_load(open(ftmp))
-                os.remove(ftmp)
+                self.cfg = yaml.safe_load(''.join(lines))
 
         return self.cfg
 
@@ -146,9 +140,9 @@ class JujuBase(object):
     def ps_units(self):
         """ Units identified from running processes. """
         units = set()
-        for line in CLIHelper().ps():
-            if "unit-" in line:
-                ret = re.compile(r".+jujud-unit-(\S+)-(\d+).*").match(line)
+        for name in host_helpers.get_process_table().binaries:
+            if "unit-" in name:
+                ret = re.compile(r"jujud-unit-(\S+)-(\d+).*").match(name)
                 if ret:
                     units.add(JujuUnit(ret[2], ret[1]))
 
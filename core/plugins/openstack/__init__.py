@@ -13,7 +13,7 @@ from core import (
 )
 from core.checks import DPKGVersionCompare
 from core.log import log
-from core.cli_helpers import CmdBase, CLIHelper
+from core.cli_helpers import CmdBase
 from core.plugins.openstack import exceptions
 
 APT_SOURCE_PATH = os.path.join(constants.DATA_ROOT, "etc/apt/sources.list.d")
@@ -268,36 +268,28 @@ class OpenstackBase(object):
         if self._instances:
             return self._instances
 
-        for line in CLIHelper().ps():
-            ret = re.compile(".+product=OpenStack Nova.+").match(line)
-            if ret:
-                name = None
-                uuid = None
-
-                expr = r".+uuid\s+([a-z0-9\-]+)[\s,]+.+"
-                ret = re.compile(expr).match(ret[0])
-                if ret:
-                    uuid = ret[1]
+        ps = host_helpers.get_process_table()
+        for proc in ps.find_by_arg('-name guest='):
+            if "product=OpenStack Nova" not in proc.line:
+                continue
 
-                expr = r".+\s+-name\s+guest=(instance-\w+)[,]*.*\s+.+"
-                ret = re.compile(expr).match(ret[0])
-                if ret:
-                    name = ret[1]
+            name = proc.get_arg('-name').partition(',')[0]
+            name = name.partition('guest=')[2]
+            uuid = proc.get_arg('-uuid')
+            if not all([name, uuid]):
+                continue
 
-                if not all([name, uuid]):
-                    continue
-
-                guest = OSGuest(uuid, name)
-                ret = re.compile(r"mac=([a-z0-9:]+)").findall(line)
-                if ret:
-                    for mac in ret:
-                        # convert libvirt to local/native
-                        mac = "fe" + mac[2:]
-                        _port = self.nethelp.get_interface_with_hwaddr(mac)
-                        if _port:
-                            guest.add_port(_port)
-
-                self._instances.append(guest)
+            guest = OSGuest(uuid, name)
+            ret = re.compile(r"mac=([a-z0-9:]+)").findall(proc.line)
+            if ret:
+                for mac in ret:
+                    # convert libvirt to local/native
+                    mac = "fe" + mac[2:]
+                    _port = self.nethelp.get_interface_with_hwaddr(mac)
+                    if _port:
+                        guest.add_port(_port)
+
+            self._instances.append(guest)
 
         return self._instances
 
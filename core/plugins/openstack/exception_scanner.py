@@ -0,0 +1,117 @@
+import re
+
+from core.runcache import run_cached
+from core.searchtools import SearchDef
+
+# Exceptions in logs are delimited by whitespace or, when printed with their
+# import path, by a dot on the left and whitespace, colon or dot on the right.
+TOKEN_DELIMITERS = re.compile(r'[\s.:]+')
+WORD_EXPR = re.compile(r'^\w+$')
+# any of these make it too hard to know what literal an expression requires
+UNSUPPORTED_METACHARS = re.compile(r'[\\|?*{}()\[\]^$]')
+
+
+def required_literal(expr):
+    """
+    Return the longest literal that any match of expr must contain or None
+    if it can't be determined.
+    """
+    if UNSUPPORTED_METACHARS.search(expr):
+        return
+
+    literal = max(re.split(r'[.+]', expr), key=len)
+    if literal:
+        return literal
+
+
+class ExceptionMatcher(object):
+    """
+    Literal multi-pattern matcher used to find which of a (large) set of
+    exception names occur in a log line.
+
+    Plain names are found with a single hash lookup per delimited token of
+    the line rather than by trying each name in turn. The few names that are
+    expressions or contain delimiters are found by their required literal.
+    """
+
+    def __init__(self, names):
+        """
+        @param names: list of exception names or expressions.
+        """
+        self.names = names
+        self._order = {}
+        self._words = set()
+        self._others = []
+        for name in names:
+            if name in self._order:
+                continue
+
+            self._order[name] = len(self._order)
+            if WORD_EXPR.match(name):
+                self._words.add(name)
+            else:
+                self._others.append((name, required_literal(name)))
+
+    def __deepcopy__(self, memo):
+        # never modified once created so safe to share between searches.
+        return self
+
+    def candidates(self, line):
+        """
+        Return list of names that may match in line in the order they were
+        provided.
+        """
+        found = self._words.intersection(TOKEN_DELIMITERS.split(line))
+        for name, literal in self._others:
+            if literal is None or literal in line:
+                found.add(name)
+
+        return sorted(found, key=self._order.get)
+
+
+@run_cached
+def get_exception_matcher(names):
+    """
+    Return ExceptionMatcher for names (tuple) built once per run and shared
+    by all searches for the same names.
+    """
+    return ExceptionMatcher(names)
+
+
+class ExceptionSearchDef(SearchDef):
+
+    def __init__(self, template, names, tag=None, hint=None, aggregate=None):
+        """
+        Search definition equivalent to SearchDef(template.format(
+        "(?:name1|name2|...)")) but which only tries the names present in a
+        line. This avoids evaluating an alternation of hundreds of names
+        against every line.
+
+        @param template: regex pattern containing a single {} placeholder
+                         for the exception name alternation. The names must
+                         be delimited in the pattern as described by
+                         TOKEN_DELIMITERS.
+        @param names: list of exception names or expressions.
+        """
+        super().__init__([], tag=tag, hint=hint, aggregate=aggregate)
+        self.template = template
+        self.matcher = get_exception_matcher(tuple(names))
+        self._exprs = {}
+
+    def _get_expr(self, names):
+        names = tuple(names)
+        if names not in self._exprs:
+            self._exprs[names] = re.compile(self.template.format(
+                                            "(?:{})".format('|'.join(names))))
+
+        return self._exprs[names]
+
+    def run(self, line):
+        if self.hint and not self.hint.search(line):
+            return None
+
+        names = self.matcher.candidates(line)
+        if not names:
+            return None
+
+        return self._get_expr(names).match(line)
@@ -1,3 +1,5 @@
+import array
+import json
 import os
 import re
 
@@ -10,12 +12,19 @@ from core import (
 from core.cli_helpers import get_ps_axo_flags_available
 from core.cli_helpers import CLIHelper
 from core.plugins.storage import StorageBase
+from core.runcache import run_cached
 from core.searchtools import (
     FileSearcher,
     SequenceSearchDef,
-    SearchDef
+    SearchDef,
+    SearchSource,
 )
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 CEPH_SERVICES_EXPRS = [r"ceph-[a-z0-9-]+",
                        r"rados[a-z0-9-:]+"]
@@ -48,22 +57,295 @@ class CephConfig(checks.SectionalConfigBase):
         super().__init__(path=path, *args, **kwargs)
 
 
-class CephCluster(object):
+class CephOSDDumpEntry(object):
+
+    def __init__(self, id, up, _in, weight, addrs):
+        """
+        An osd entry from ceph osd dump.
+
+        @param id: osd id
+        @param up: True if the osd is up
+        @param _in: True if the osd is in
+        @param weight: osd weight
+        @param addrs: list of address vectors in the order they appear i.e.
+                      public, cluster, heartbeat back, heartbeat front.
+        """
+        self.id = id
+        self.up = up
+        self.is_in = _in
+        self.weight = weight
+        self.addrs = addrs
+
+    @property
+    def public_addr(self):
+        if self.addrs:
+            return self.addrs[0]
+
+    @property
+    def cluster_addr(self):
+        if len(self.addrs) > 1:
+            return self.addrs[1]
+
+    @property
+    def msgr_v2(self):
+        """ True if the osd binds to a messenger v2 address. """
+        return any(["v2:" in addr for addr in self.addrs])
+
+    @classmethod
+    def from_line(cls, line):
+        """
+        Create from an osd line of ceph osd dump or return None if line is
+        not an osd entry.
+        """
+        ret = re.match(r"^osd\.(\d+)\s+(up|down)\s+(in|out)\s+weight\s+"
+                       r"(\S+)\s+(.*)", line)
+        if not ret:
+            return
+
+        addrs = []
+        for field in ret.group(5).split():
+            # address vectors e.g. [v2:10.0.0.1:6800/123,v1:10.0.0.1:6801/123]
+            # or pre-nautilus plain addresses e.g. 10.0.0.1:6800/123
+            if ((field.startswith('[v') and field.endswith(']')) or
+                    re.match(r'^\S+:\d+/\d+$', field)):
+                addrs.append(field)
+
+        return cls(int(ret.group(1)), ret.group(2) == 'up',
+                   ret.group(3) == 'in', float(ret.group(4)), addrs)
+
+
+class CephOSDTable(object):
+    """
+    Columnar view of the osds in ceph osd df tree. Each attribute is held as
+    a single array/list indexed by row so that checks can make one pass over
+    just the column(s) they need rather than over every node dict, which
+    matters for clusters with thousands of osds. If numpy is available,
+    numeric columns are filtered with a boolean mask.
+    """
+
+    def __init__(self, nodes):
+        """
+        @param nodes: list of node dicts from ceph osd df tree.
+        """
+        self.ids = array.array('l')
+        self.names = []
+        self.hosts = []
+        self.device_classes = []
+        self.pgs = array.array('l')
+        self.kb_used_meta = array.array('l')
+        self.crush_weights = array.array('d')
+        self.utilization = array.array('d')
+        # utilization relative to the cluster average
+        self.var = array.array('d')
+
+        osds = []
+        hosts = {}
+        for node in nodes:
+            if node['id'] >= 0:
+                osds.append(node)
+            elif node.get('type') == 'host':
+                for child in node.get('children', []):
+                    hosts[child] = node['name']
+
+        for node in osds:
+            self.ids.append(node['id'])
+            self.names.append(node['name'])
+            self.hosts.append(hosts.get(node['id']))
+            self.device_classes.append(node.get('device_class'))
+            self.pgs.append(node.get('pgs', 0))
+            self.kb_used_meta.append(node.get('kb_used_meta', 0))
+            self.crush_weights.append(node.get('crush_weight', 0))
+            self.utilization.append(node.get('utilization', 0))
+            self.var.append(node.get('var', 0))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def select(self, column, predicate):
+        """
+        Return list of row indexes for which predicate(value) is True for
+        the given column.
+
+        @param column: name of column attribute e.g. 'pgs'
+        @param predicate: callable taking a single column value. For numeric
+                          columns it must only use arithmetic and comparison
+                          operators so that, if numpy is available, it can be
+                          applied to the whole column at once.
+        """
+        values = getattr(self, column)
+        if numpy is not None and isinstance(values, array.array):
+            mask = predicate(numpy.asarray(values))
+            return numpy.flatnonzero(mask).tolist()
+
+        return [row for row, value in enumerate(values) if predicate(value)]
+
+    def by_name(self, column, rows=None):
+        """
+        Return dict of osd name and column value for the given rows or all
+        rows if none provided.
+        """
+        values = getattr(self, column)
+        if rows is None:
+            rows = range(len(self))
+
+        return {self.names[row]: values[row] for row in rows}
+
+
+class CephCrushBucketTable(object):
+    """
+    Columnar view of the buckets in ceph osd crush dump.
+    """
+
+    def __init__(self, buckets):
+        """
+        @param buckets: list of bucket dicts from ceph osd crush dump.
+        """
+        self.ids = array.array('l')
+        self.names = []
+        self.type_ids = array.array('l')
+        self.type_names = []
+        # item ids of each bucket
+        self.items = []
+        self._rows = {}
+        for bucket in buckets:
+            self._rows[bucket['id']] = len(self.ids)
+            self.ids.append(bucket['id'])
+            self.names.append(bucket['name'])
+            self.type_ids.append(bucket['type_id'])
+            self.type_names.append(bucket['type_name'])
+            self.items.append(array.array('l', [item['id'] for item in
+                                                bucket['items']]))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def item_type_id(self, item):
+        """ Type id of a bucket item. Devices (osds) have type id 0. """
+        if item >= 0:
+            return 0
+
+        return self.type_ids[self._rows[item]]
+
+    def mixed_type_buckets(self):
+        """ Return names of buckets whose items are not all the same type. """
+        mixed = []
+        for row, items in enumerate(self.items):
+            if len(set(map(self.item_type_id, items))) > 1:
+                mixed.append(self.names[row])
+
+        return mixed
+
+
+class CephClusterSnapshot(object):
+    """
+    Cluster-wide information collected once per run and shared by everything
+    that needs it e.g. all CephDaemonBase objects. Use get_cluster_snapshot()
+    rather than creating one directly. Once created it is not modified other
+    than to memoise information derived from it.
+    """
 
     def __init__(self):
         self.cli = CLIHelper()
-        # create file-based caches of useful commands so they can be searched.
+        # cache output of useful commands so they can be searched.
         self.cli_cache = {'ceph_mon_dump': self.cli.ceph_mon_dump(),
                           'ceph_osd_dump': self.cli.ceph_osd_dump(),
                           'ceph_versions': self.cli.ceph_versions()}
-        for cmd, output in self.cli_cache.items():
-            self.cli_cache[cmd] = utils.mktemp_dump('\n'.join(output))
+        self._date_in_secs = None
+        self._osd_devtypes = None
+        self._daemon_dumps = {}
+        self._osd_dump_entries = None
+        self._version_info = None
+        self._osd_table = None
+        self._crush_buckets = None
+        # {daemon_type: {id: [Process, ..]}}
+        self._daemon_processes = {}
+        self._daemon_etimes = {}
+
+    @property
+    def date_in_secs(self):
+        if self._date_in_secs is None:
+            self._date_in_secs = utils.get_date_secs()
+
+        return self._date_in_secs
+
+    @property
+    def osd_devtypes(self):
+        """ Dict of osd device class keyed by osd id e.g. {1: 'ssd'}. """
+        if self._osd_devtypes is not None:
+            return self._osd_devtypes
+
+        self._osd_devtypes = {}
+        for line in self.cli.ceph_osd_tree():
+            cols = line.split()
+            if len(cols) < 4:
+                continue
+
+            ret = re.match(r'^osd\.(\d+)$', cols[3])
+            if ret:
+                self._osd_devtypes[int(ret.group(1))] = cols[1]
+
+        return self._osd_devtypes
+
+    @property
+    def osd_table(self):
+        """
+        CephOSDTable of ceph osd df tree or None if it is not available.
+        """
+        if self._osd_table is None:
+            df_tree = self.cli.ceph_osd_df_tree_json_decoded()
+            if not df_tree:
+                return
+
+            self._osd_table = CephOSDTable(df_tree['nodes'])
+
+        return self._osd_table
+
+    @property
+    def crush_buckets(self):
+        """
+        CephCrushBucketTable of ceph osd crush dump or None if it is not
+        available.
+        """
+        if self._crush_buckets is None:
+            crush_dump = self.cli.ceph_osd_crush_dump_json_decoded()
+            if not crush_dump:
+                return
+
+            self._crush_buckets = CephCrushBucketTable(crush_dump['buckets'])
 
-    def __del__(self):
-        """ Ensure temp files/dirs are deleted. """
-        for tmpfile in self.cli_cache.values():
-            if os.path.exists(tmpfile):
-                os.unlink(tmpfile)
+        return self._crush_buckets
+
+    def daemon_processes(self, daemon_type, id):
+        """
+        Return list of processes running daemon with given type and id.
+        """
+        if daemon_type not in self._daemon_processes:
+            procs = {}
+            binary = "ceph-{}".format(daemon_type)
+            for proc in host_helpers.get_process_table().find_by_binary(
+                                                                    binary):
+                procs.setdefault(proc.get_arg('--id'), []).append(proc)
+
+            self._daemon_processes[daemon_type] = procs
+
+        return self._daemon_processes[daemon_type].get(str(id), [])
+
+    def daemon_etime(self, daemon_type, id):
+        """ Return process etime for given daemon. """
+        key = (daemon_type, id)
+        if key in self._daemon_etimes:
+            return self._daemon_etimes[key]
+
+        etime = None
+        if get_ps_axo_flags_available():
+            for proc in self.daemon_processes(daemon_type, id):
+                if self.date_in_secs and proc.lstart:
+                    start_secs = utils.get_date_secs(datestring=proc.lstart)
+                    uptime_secs = (self.date_in_secs - start_secs)
+                    etime = utils.seconds_to_date(uptime_secs)
+
+        self._daemon_etimes[key] = etime
+        return etime
 
     def daemon_dump(self, daemon_type):
         """
@@ -72,19 +354,34 @@ class CephCluster(object):
         Returns a dict where key is first word on each line of dump and value
         is the remainder.
         """
+        if daemon_type in self._daemon_dumps:
+            return self._daemon_dumps[daemon_type]
+
         cmd = "ceph_{}_dump".format(daemon_type)
-        out = self.cli_cache[cmd]
-        if not out:
-            return
+        dump = None
+        if self.cli_cache[cmd]:
+            dump = {}
+            for line in self.cli_cache[cmd]:
+                ret = re.match(r"^(\S+)\s+(.+)", line)
+                if ret:
+                    dump[ret.group(1)] = ret.group(2)
+
+        self._daemon_dumps[daemon_type] = dump
+        return dump
 
-        dump = {}
-        s = FileSearcher()
-        s.add_search_term(SearchDef(r"^(\S+)\s+(.+)", tag='dump'),
-                          path=self.cli_cache[cmd])
-        for result in s.search().find_by_tag('dump'):
-            dump[result.get(1)] = result.get(2)
+    @property
+    def osd_dump_entries(self):
+        """ Dict of CephOSDDumpEntry keyed by osd id. """
+        if self._osd_dump_entries is not None:
+            return self._osd_dump_entries
 
-        return dump
+        self._osd_dump_entries = {}
+        for line in self.cli_cache['ceph_osd_dump']:
+            osd = CephOSDDumpEntry.from_line(line)
+            if osd:
+                self._osd_dump_entries[osd.id] = osd
+
+        return self._osd_dump_entries
 
     def _get_version_info(self, daemon_type=None):
         """
@@ -93,44 +390,34 @@ class CephCluster(object):
         the resulting dict is keyed by daemon type otherwise it is keyed by
         version (and only versions for that daemon type.)
         """
-        out = self.cli_cache['ceph_versions']
-        if not out:
+        if self._version_info is None:
+            self._version_info = {}
+            out = self.cli_cache['ceph_versions']
+            try:
+                versions = json.loads(''.join(out)) if out else {}
+            except ValueError:
+                versions = {}
+
+            expr = re.compile(r"ceph version (\S+) .+ (\S+) \(\S+\)$")
+            for _daemon_type, _versions in versions.items():
+                info = {}
+                for version, count in _versions.items():
+                    ret = expr.match(version)
+                    if ret:
+                        info[ret.group(1)] = {'release_name': ret.group(2),
+                                              'count': int(count)}
+
+                self._version_info[_daemon_type] = info
+
+        if not self._version_info:
             return
 
-        versions = {}
-        s = FileSearcher()
-        body = SearchDef(r"\s+\"ceph version (\S+) .+ (\S+) "
-                         r"\(\S+\)\":\s+(\d)+,?$")
-        if daemon_type is None:
-            # all/any - start matches any so no seq ending needed
-            sd = SequenceSearchDef(start=SearchDef(r"^\s+\"(\S+)\":\s+{"),
-                                   body=body, tag='versions')
-        else:
-            start = SearchDef(r"^\s+\"({})\":\s+{{".format(daemon_type))
-            sd = SequenceSearchDef(start=start, body=body,
-                                   end=SearchDef(r"^\s+\"\S+\":\s+{"),
-                                   tag='versions')
-
-        s.add_search_term(sd, path=self.cli_cache['ceph_versions'])
-        for section in s.search().find_sequence_sections(sd).values():
-            _versions = {}
-            for result in section:
-                if result.tag == sd.start_tag:
-                    _daemon_type = result.get(1)
-                    versions[_daemon_type] = _versions
-                elif result.tag == sd.body_tag:
-                    version = result.get(1)
-                    rname = result.get(2)
-                    amount = result.get(3)
-                    _versions[version] = {'release_name': rname,
-                                          'count': int(amount)}
-
         # If specific daemon_type provided only return version for that type
         # otherwise all.
         if daemon_type is not None:
-            versions = versions.get(daemon_type)
+            return self._version_info.get(daemon_type)
 
-        return versions
+        return self._version_info
 
     def daemon_versions(self, daemon_type=None):
         """
@@ -176,7 +463,7 @@ class CephCluster(object):
                             _releases[daemon] = {}
 
                         rname = info['release_name']
-                        if rname in _releases:
+                        if rname in _releases[daemon]:
                             _releases[daemon][rname] += info['count']
                         else:
                             _releases[daemon][rname] = info['count']
@@ -184,46 +471,36 @@ class CephCluster(object):
         return _releases
 
 
+@run_cached
+def get_cluster_snapshot():
+    """ Return the CephClusterSnapshot for this run. """
+    return CephClusterSnapshot()
+
+
 class CephDaemonBase(object):
 
     def __init__(self, daemon_type):
         self.daemon_type = daemon_type
-        self.cli = CLIHelper()
-        self.date_in_secs = utils.get_date_secs()
-        self._version_info = None
-        self._etime = None
         self._rss = None
-        self.cluster = CephCluster()
-        # create file-based caches of useful commands so they can be searched.
-        self.cli_cache = {'ps': self.cli.ps()}
-        for cmd, output in self.cli_cache.items():
-            self.cli_cache[cmd] = utils.mktemp_dump('\n'.join(output))
-
-    def __del__(self):
-        """ Ensure temp files/dirs are deleted. """
-        for tmpfile in self.cli_cache.values():
-            if os.path.exists(tmpfile):
-                os.unlink(tmpfile)
+        self.cluster = get_cluster_snapshot()
 
     @property
-    def rss(self):
-        """Return memory RSS for a given daemon.
+    def processes(self):
+        """ Return list of processes running this daemon. """
+        return self.cluster.daemon_processes(self.daemon_type, self.id)
 
-        NOTE: this assumes we have ps auxwwwm format.
-        """
+    @property
+    def rss(self):
+        """Return memory RSS for a given daemon. """
         if self._rss:
             return self._rss
 
-        s = FileSearcher()
-        # columns: USER PID %CPU %MEM VSZ RSS TTY STAT START TIME COMMAND
-        sd = SearchDef(r"\S+\s+\d+\s+\S+\s+\S+\s+\d+\s+(\d+)\s+.+/ceph-{}\s+"
-                       r".+--id\s+{}\s+.+".format(self.daemon_type, self.id))
-        s.add_search_term(sd, path=self.cli_cache['ps'])
         rss = 0
         # we only expect one result
-        for result in s.search().find_by_path(self.cli_cache['ps']):
-            rss = int(int(result.get(1)) / 1024)
-            break
+        for proc in self.processes:
+            if proc.rss is not None:
+                rss = int(proc.rss / 1024)
+                break
 
         self._rss = "{}M".format(rss)
         return self._rss
@@ -235,38 +512,7 @@ class CephDaemonBase(object):
         To get etime we have to use ps_axo_flags rather than the default
         ps_auxww.
         """
-        if self._etime:
-            return self._etime
-
-        if not get_ps_axo_flags_available():
-            return
-
-        ps_info = []
-        daemon = "ceph-{}".format(self.daemon_type)
-        for line in self.cli.ps_axo_flags():
-            ret = re.compile(daemon).search(line)
-            if not ret:
-                continue
-
-            expt_tmplt = checks.SVC_EXPR_TEMPLATES["absolute"]
-            ret = re.compile(expt_tmplt.format(daemon)).search(line)
-            if ret:
-                ps_info.append(ret.group(0))
-
-        if not ps_info:
-            return
-
-        for cmd in ps_info:
-            ret = re.compile(r".+\s+.+--id {}\s+.+".format(self.id)).match(cmd)
-            if ret:
-                osd_start = ' '.join(cmd.split()[13:17])
-                if self.date_in_secs and osd_start:
-                    osd_start_secs = utils.get_date_secs(datestring=osd_start)
-                    osd_uptime_secs = (self.date_in_secs - osd_start_secs)
-                    osd_uptime_str = utils.seconds_to_date(osd_uptime_secs)
-                    self._etime = osd_uptime_str
-
-        return self._etime
+        return self.cluster.daemon_etime(self.daemon_type, self.id)
 
     @property
     def versions(self):
@@ -323,7 +569,6 @@ class CephOSD(CephDaemonBase):
         self.id = id
         self.fsid = fsid
         self.device = device
-        self._devtype = None
         self._osd_dump = None
 
     @property
@@ -355,14 +600,7 @@ class CephOSD(CephDaemonBase):
 
     @property
     def devtype(self):
-        if self._devtype:
-            return self._devtype
-
-        for line in self.cli.ceph_osd_tree():
-            if line.split()[3] == "osd.{}".format(self.id):
-                self._devtype = line.split()[1]
-
-        return self._devtype
+        return self.cluster.osd_devtypes.get(self.id)
 
 
 class CephChecksBase(StorageBase):
@@ -378,19 +616,9 @@ class CephChecksBase(StorageBase):
                                                 other_pkgs=CEPH_PKGS_OTHER)
         self.cli = CLIHelper()
 
-        # create file-based caches of useful commands so they can be searched.
-        self.cli_cache = {'udevadm_info_exportdb':
-                          self.cli.udevadm_info_exportdb(),
-                          'ceph_volume_lvm_list':
+        # cache output of useful commands so they can be searched.
+        self.cli_cache = {'ceph_volume_lvm_list':
                           self.cli.ceph_volume_lvm_list()}
-        for cmd, output in self.cli_cache.items():
-            self.cli_cache[cmd] = utils.mktemp_dump('\n'.join(output))
-
-    def __del__(self):
-        """ Ensure temp files/dirs are deleted. """
-        for tmpfile in self.cli_cache.values():
-            if os.path.exists(tmpfile):
-                os.unlink(tmpfile)
 
     @property
     def plugin_runnable(self):
@@ -475,7 +703,9 @@ class CephChecksBase(StorageBase):
                                body=SearchDef([r"\s+osd\s+(fsid)\s+(\S+)\s*",
                                                r"\s+(devices)\s+([\S]+)\s*"]),
                                tag="ceph-lvm")
-        s.add_search_term(sd, path=self.cli_cache['ceph_volume_lvm_list'])
+        source = SearchSource('ceph_volume_lvm_list',
+                              self.cli_cache['ceph_volume_lvm_list'])
+        s.add_search_term(sd, path=source)
         local_osds = []
         for results in s.search().find_sequence_sections(sd).values():
             id = None
@@ -521,14 +751,11 @@ class CephChecksBase(StorageBase):
             return self._bcache_info
 
         devs = []
-        if not self.cli_cache['udevadm_info_exportdb']:
-            return devs
-
         s = FileSearcher()
         sdef = SequenceSearchDef(start=SearchDef(r"^P: .+/(bcache\S+)"),
                                  body=SearchDef(r"^S: disk/by-uuid/(\S+)"),
                                  tag="bcacheinfo")
-        s.add_search_term(sdef, self.cli_cache['udevadm_info_exportdb'])
+        s.add_search_term(sdef, self.cli.udevadm_info_exportdb.search_source())
         results = s.search()
         for section in results.find_sequence_sections(sdef).values():
             dev = {}
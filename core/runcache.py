@@ -0,0 +1,36 @@
+from core import constants
+
+# Run-scoped store of data that is expensive to collect or parse and is shared
+# between plugin parts e.g. structured views of command outputs.
+_RUN_CACHE = {}
+
+
+def run_key():
+    """
+    Every plugin is executed as its own process with its own PLUGIN_TMP_DIR
+    and against a single DATA_ROOT so together these identify the current
+    run. This is also what ensures that (unit test) runs do not see each
+    other's data.
+    """
+    return (constants.DATA_ROOT, constants.PLUGIN_TMP_DIR)
+
+
+def run_cached(f):
+    """
+    Cache the return value of f for the duration of the current run. Any
+    positional arguments passed to f are included in the cache key and must
+    therefore be hashable.
+    """
+    def run_cached_inner(*args):
+        key = (run_key(), f.__module__, f.__qualname__, args)
+        if key not in _RUN_CACHE:
+            _RUN_CACHE[key] = f(*args)
+
+        return _RUN_CACHE[key]
+
+    return run_cached_inner
+
+
+def reset():
+    """ Drop everything cached so far. """
+    _RUN_CACHE.clear()
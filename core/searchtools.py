@@ -1,14 +1,25 @@
+import calendar
+import copy
+import io
 import os
 import sys
+import time
 
-import glob
-import gzip
 import multiprocessing
+import queue
 import re
+import threading
 import uuid
 
+from collections import Counter
+
 from core.log import log
-from core import constants
+from core import compression
+from core.logindex import LogIndex, LogIndexer
+from core import (
+    constants,
+    filecatalog,
+)
 
 
 class FileSearchException(Exception):
@@ -36,15 +47,69 @@ class FilterDef(object):
             return ret is None
 
 
+class CountBy(object):
+
+    def __init__(self, groups, key=None, source_key=None):
+        """
+        Aggregation that can be attached to a SearchDef so that rather than
+        returning a result for every match, the searcher counts matches by
+        key. This is done where the search is executed so that only the
+        counters, and not every matching line, are returned.
+
+        @param groups: list of match group indexes whose values make up the
+                       counter key.
+        @param key: optional callable that takes the tuple of group values
+                    and the source path and returns the key to count against
+                    or None if the match is not to be counted. Since searches
+                    are run in worker processes this must be picklable e.g. a
+                    module level function.
+        @param source_key: optional callable that takes the source path and
+                           returns a value to be appended to the group values
+                           of every match from that source, or None to append
+                           nothing. This is only called once per source. The
+                           same picklability requirement as for key applies.
+        """
+        self.groups = groups
+        self.key = key
+        self.source_key = source_key
+        self._source_keys = {}
+
+    def _get_source_key(self, source):
+        if source not in self._source_keys:
+            self._source_keys[source] = self.source_key(source)
+
+        return self._source_keys[source]
+
+    def get_key(self, result, source):
+        """
+        @param result: python.re match object
+        @param source: data source (path)
+        """
+        values = tuple(result.group(i) for i in self.groups)
+        if self.source_key is not None:
+            source_key = self._get_source_key(source)
+            if source_key is not None:
+                values += (source_key,)
+
+        if self.key is None:
+            return values
+
+        return self.key(values, source)
+
+
 class SearchDef(object):
 
-    def __init__(self, pattern, tag=None, hint=None):
+    def __init__(self, pattern, tag=None, hint=None, aggregate=None):
         """
         Add a search definition
 
         @param pattern: regex pattern or list of patterns to search for
         @param tag: optional user-friendly identifier for this search term
         @param hint: pre-search term to speed things up
+        @param aggregate: optional CountBy object. If provided, matches are
+                          counted and made available with
+                          SearchResultsCollection.find_counts_by_tag() instead
+                          of returning a result per match.
         """
         if type(pattern) != list:
             self.patterns = [re.compile(pattern)]
@@ -54,6 +119,7 @@ class SearchDef(object):
                 self.patterns.append(re.compile(_pattern))
 
         self.tag = tag
+        self.aggregate = aggregate
         if hint:
             self.hint = re.compile(hint)
         else:
@@ -148,6 +214,381 @@ class SequenceSearchDef(object):
         self._mark = 0
         self._section_idx += 1
 
+    def copy(self):
+        """
+        Return a copy of this definition with a clean sequence state. The
+        search definitions and id are shared with the original.
+        """
+        new = copy.copy(self)
+        new._mark = None
+        new._section_idx = 0
+        return new
+
+
+class SearchSource(object):
+
+    def __init__(self, name, lines):
+        """
+        A named data source that is not a file on disk e.g. the output of a
+        command. These are searched inline by FileSearcher (i.e. not
+        dispatched to the process pool) and their results are stored
+        against the source name.
+
+        @param name: logical name used to identify this source and its
+                     results.
+        @param lines: string buffer, iterable of lines or a callable that
+                      returns either. A callable is only called once the
+                      source is searched so that e.g. command output can be
+                      streamed rather than loaded upfront.
+        """
+        self.name = name
+        self._lines = lines
+
+    def __iter__(self):
+        lines = self._lines
+        if callable(lines):
+            lines = lines()
+
+        if isinstance(lines, str):
+            return iter(io.StringIO(lines))
+
+        return iter(lines)
+
+
+class SearchWindow(object):
+    # timestamp at the start of a log line e.g. "2021-08-03 10:00:00.123" or
+    # "2021-08-03T10:00:00+0000".
+    TIMESTAMP_EXPR = re.compile(r'^(\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})')
+    INPUT_EXPR = re.compile(r'^(\d{4}-\d{2}-\d{2})(?:[ T](\d{2}:\d{2})'
+                            r'(:\d{2})?)?$')
+    # bisection stops once the range is this small
+    BISECT_MIN_BYTES = 65536
+    # how far to read from a bisection point to find a timestamp
+    BISECT_SCAN_LIMIT = 1024 * 1024
+    # allowance for the difference between log and mtime timezones
+    MTIME_SLACK_SECS = 86400
+
+    def __init__(self, since=None, until=None):
+        """
+        Time range that searches are restricted to. Timestamps are handled as
+        strings of the form "YYYY-MM-DD HH:MM:SS" so that they can be
+        compared without being converted. Lines that start with any other
+        form of timestamp (e.g. syslog) are treated as untimestamped.
+
+        @param since: optional start of range as YYYY-MM-DD[ HH:MM[:SS]]
+        @param until: optional end of range as YYYY-MM-DD[ HH:MM[:SS]]
+        """
+        self.since = self._normalise(since, '00:00', ':00')
+        self.until = self._normalise(until, '23:59', ':59')
+
+    @classmethod
+    def _normalise(cls, value, default_time, default_secs):
+        if not value:
+            return None
+
+        ret = cls.INPUT_EXPR.match(value.strip())
+        if not ret:
+            raise ValueError("invalid date/time '{}' - expected "
+                             "YYYY-MM-DD[ HH:MM[:SS]]".format(value))
+
+        return "{} {}{}".format(ret.group(1), ret.group(2) or default_time,
+                                ret.group(3) or default_secs)
+
+    @classmethod
+    def from_constants(cls):
+        """
+        Return SearchWindow for the range provided with --since/--until or
+        None if not set.
+        """
+        if not (constants.SEARCH_SINCE or constants.SEARCH_UNTIL):
+            return None
+
+        return cls(constants.SEARCH_SINCE, constants.SEARCH_UNTIL)
+
+    @classmethod
+    def line_timestamp(cls, line):
+        ret = cls.TIMESTAMP_EXPR.match(line)
+        if ret:
+            return "{} {}".format(ret.group(1), ret.group(2))
+
+    @classmethod
+    def raw_line_timestamp(cls, line):
+        """ Same as line_timestamp() for a line read in binary mode. """
+        return cls.line_timestamp(line.decode('utf-8', errors='replace'))
+
+    def too_old(self, timestamp):
+        return self.since is not None and timestamp < self.since
+
+    def too_new(self, timestamp):
+        return self.until is not None and timestamp > self.until
+
+    def rotated_out(self, mtime):
+        """
+        Returns True if a rotated log last modified at mtime can't contain
+        anything in range.
+        """
+        if self.since is None:
+            return False
+
+        since = calendar.timegm(time.strptime(self.since,
+                                              '%Y-%m-%d %H:%M:%S'))
+        return mtime < since - self.MTIME_SLACK_SECS
+
+    def _first_timestamp(self, fd, offset):
+        """
+        Return timestamp of the first line that starts after offset or None
+        if none found within BISECT_SCAN_LIMIT.
+        """
+        fd.seek(offset)
+        fd.readline()
+        while fd.tell() - offset < self.BISECT_SCAN_LIMIT:
+            line = fd.readline()
+            if not line:
+                break
+
+            ts = self.raw_line_timestamp(line)
+            if ts:
+                return ts
+
+    def find_start(self, fd, size):
+        """
+        Bisect an uncompressed log by timestamp to find where lines in range
+        start.
+
+        @param fd: file object opened in binary mode.
+        @param size: file size
+        @return: offset of a line at or before the first line in range.
+        """
+        lo, hi = 0, size
+        if self.since is None:
+            return lo
+
+        while hi - lo > self.BISECT_MIN_BYTES:
+            mid = (lo + hi) // 2
+            ts = self._first_timestamp(fd, mid)
+            if ts is None or ts >= self.since:
+                hi = mid
+            else:
+                lo = mid
+
+        if lo == 0:
+            return lo
+
+        fd.seek(lo)
+        fd.readline()
+        return fd.tell()
+
+
+def count_lines(fd, offset, chunk_size=1024 * 1024):
+    """
+    Count lines in binary file object fd up to offset as they are counted in
+    text mode i.e. a lone '\r' also ends a line.
+    """
+    fd.seek(0)
+    count = 0
+    last = b''
+    while offset > 0:
+        chunk = fd.read(min(chunk_size, offset))
+        if not chunk:
+            break
+
+        count += (chunk.count(b'\n') + chunk.count(b'\r') -
+                  chunk.count(b'\r\n'))
+        if last.endswith(b'\r') and chunk.startswith(b'\n'):
+            # CRLF split across chunks was counted twice
+            count -= 1
+
+        last = chunk
+        offset -= len(chunk)
+
+    return count
+
+
+class LogStream(object):
+    # number of lines passed from the background reader at a time
+    BATCH_SIZE = 1024
+    # number of batches the background reader can get ahead by
+    QUEUE_DEPTH = 16
+    # compressed logs at least this size are worth decompressing in the
+    # background even when searched on their own.
+    PIPELINE_MIN_SIZE = 1024 ** 2
+
+    def __init__(self, paths, window=None):
+        """
+        A log and its logrotate history e.g. foo.log.2.gz, foo.log.1 and
+        foo.log read as a single chronologically ordered stream of lines.
+        This allows state to be carried across rotation boundaries e.g. a
+        sequence that starts in foo.log.1 and ends in foo.log.
+
+        If any of the files are compressed they are read and decompressed by
+        a background thread so that this overlaps with searching.
+
+        @param paths: list of paths ordered oldest first.
+        @param window: optional SearchWindow. If it has a start, uncompressed
+                       files are bisected to skip lines older than it.
+        """
+        self.paths = paths
+        self.window = window
+        # {path: offset} of files that were read from part way through. Line
+        # numbers of these are relative to that offset.
+        self.skipped = {}
+        self._members = None
+
+    @property
+    def name(self):
+        """ The current log i.e. the last in the stream. """
+        return self.paths[-1]
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def members(self):
+        """
+        List of (path, codec, fd) for the files in the stream. Files are
+        opened, and so their codec detected, once when first needed. Files
+        that can't be opened e.g. because their codec is not available are
+        skipped.
+        """
+        if self._members is None:
+            self._members = []
+            for path in self.paths:
+                try:
+                    codec, fd = compression.open_binary(path)
+                except compression.CodecUnavailable as e:
+                    log.debug("%s - skipping", e)
+                    continue
+                except OSError as e:
+                    log.debug("error opening %s - skipping (%s)", path, e)
+                    continue
+
+                self._members.append((path, codec, fd))
+
+        return self._members
+
+    @property
+    def compressed(self):
+        return any([codec is not None for _, codec, _ in self.members])
+
+    def _read(self):
+        members = self.members
+        # files are consumed by reading them so reopen if read again
+        self._members = None
+        try:
+            for path, codec, fd in members:
+                # a file that can't be read is skipped (from wherever the
+                # error occurred) so that the rest of the stream is still
+                # searched.
+                try:
+                    yield from self._read_member(path, codec, fd)
+                except UnicodeDecodeError:
+                    log.debug("caught UnicodeDecodeError for path %s - "
+                              "skipping", path)
+                except compression.READ_ERRORS as e:
+                    log.debug("error reading %s - skipping (%s)", path, e)
+        finally:
+            for _, _, fd in members:
+                fd.close()
+
+    def _read_member(self, path, codec, fd):
+        if codec is None:
+            self._skip_to_window(path, fd)
+            fd = io.TextIOWrapper(fd)
+
+        with fd:
+            skipped = path in self.skipped
+            for ln, line in enumerate(fd, start=1):
+                if type(line) == bytes:
+                    line = line.decode("utf-8")
+
+                if skipped:
+                    # lines before the first timestamp belong to a line that
+                    # was skipped.
+                    if self.window.line_timestamp(line) is None:
+                        continue
+
+                    skipped = False
+
+                yield path, ln, line
+
+    def _skip_to_window(self, path, fd):
+        """
+        Position uncompressed file fd at the start of the window, if there is
+        one.
+        """
+        if self.window is None or self.window.since is None:
+            return
+
+        offset = self.window.find_start(fd, os.fstat(fd.fileno()).st_size)
+        fd.seek(offset)
+        if offset:
+            self.skipped[path] = offset
+
+    def _read_pipelined(self):
+        batches = queue.Queue(maxsize=self.QUEUE_DEPTH)
+        done = threading.Event()
+
+        def put(item):
+            # give up if the consumer has gone away
+            while not done.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+
+            return False
+
+        def reader():
+            batch = []
+            try:
+                for entry in self._read():
+                    batch.append(entry)
+                    if len(batch) == self.BATCH_SIZE:
+                        if not put(batch):
+                            return
+
+                        batch = []
+
+                if batch and not put(batch):
+                    return
+
+                put(None)
+            except Exception as e:
+                put(e)
+
+        thread = threading.Thread(target=reader, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is None:
+                    return
+
+                if isinstance(item, Exception):
+                    raise item
+
+                for entry in item:
+                    yield entry
+        finally:
+            done.set()
+            thread.join()
+
+    def __iter__(self):
+        """ Yields (path, linenumber, line) for every line in the stream. """
+        if self.compressed:
+            return self._read_pipelined()
+
+        return self._read()
+
+
+def source_name(source):
+    """ Return the name under which results for source are stored. """
+    if isinstance(source, (SearchSource, LogStream)):
+        return source.name
+
+    return source
+
 
 class SearchResultPart(object):
 
@@ -207,6 +648,8 @@ class SearchResultsCollection(object):
     def reset(self):
         self._iter_idx = 0
         self._results = {}
+        # {path: {tag: Counter}}
+        self._counts = {}
 
     def add(self, path, results):
         if path not in self._results:
@@ -214,7 +657,49 @@ class SearchResultsCollection(object):
         else:
             self._results[path] += results
 
+    def add_counts(self, path, counts):
+        """
+        @param path: data source (path)
+        @param counts: dict of Counter objects keyed by search tag.
+        """
+        path_counts = self._counts.setdefault(path, {})
+        for tag, counter in counts.items():
+            if tag not in path_counts:
+                path_counts[tag] = Counter()
+
+            path_counts[tag].update(counter)
+
+    def find_counts_by_source(self, tag):
+        """
+        Return dict of Counter objects keyed by path for aggregated searches
+        tagged with tag.
+        """
+        counts = {}
+        for path, path_counts in self._counts.items():
+            if tag in path_counts:
+                counts[path] = path_counts[tag]
+
+        return counts
+
+    def find_counts_by_tag(self, tag, path=None):
+        """
+        Return Counter of aggregated searches tagged with tag.
+
+        If no path is provided counts from all paths are merged.
+        """
+        counts = self.find_counts_by_source(tag)
+        if path:
+            path = source_name(path)
+            counts = {path: counts[path]} if path in counts else {}
+
+        merged = Counter()
+        for counter in counts.values():
+            merged.update(counter)
+
+        return merged
+
     def find_by_path(self, path):
+        path = source_name(path)
         if path not in self._results:
             return []
 
@@ -226,7 +711,7 @@ class SearchResultsCollection(object):
         If no path is provided tagged results from all paths are returned.
         """
         if path:
-            paths = [path]
+            paths = [source_name(path)]
         else:
             paths = list(self._results.keys())
 
@@ -275,6 +760,7 @@ class FileSearcher(object):
         self.paths = {}
         self.filters = {}
         self.results = SearchResultsCollection()
+        self.window = SearchWindow.from_constants()
 
     @property
     def num_cpus(self):
@@ -311,8 +797,12 @@ class FileSearcher(object):
         file,  directory or glob. Any number of searches can be registered.
         Searches are executed concurrently by file.
 
+        Alternatively a SearchSource can be provided in place of a path in
+        which case it is searched inline.
+
         @param searchdef: SearchDef object
-        @param path: path that we will be searching for this key
+        @param path: path or SearchSource that we will be searching for this
+                     key
         """
         if path in self.paths:
             self.paths[path].append(searchdef)
@@ -326,20 +816,34 @@ class FileSearcher(object):
 
     def _search_task_wrapper(self, path, term_key):
         try:
-            with gzip.open(path, 'r') as fd:
-                try:
-                    # test if file is gzip
-                    fd.read(1)
-                    fd.seek(0)
-                    return self._search_task(term_key, fd, path)
-                except OSError:
-                    pass
-
-            with open(path) as fd:
-                return self._search_task(term_key, fd, path)
+            if isinstance(path, LogStream):
+                results, counts = self._search_task(term_key, path,
+                                                    path.name)
+                self._fix_linenumbers(results, path.skipped)
+                return results, counts
+
+            codec, fd = compression.open_binary(path)
+            start = 1
+            skipped = {}
+            if codec is None:
+                fd, start = self._open_uncompressed(path, fd, skipped)
+            elif os.path.getsize(path) >= LogStream.PIPELINE_MIN_SIZE:
+                # overlap decompression with searching
+                fd.close()
+                stream = LogStream([path])
+                return self._search_task(term_key, stream, path)
+
+            with fd:
+                results, counts = self._search_task(term_key, fd, path,
+                                                    start=start)
+
+            self._fix_linenumbers(results, skipped)
+            return results, counts
         except UnicodeDecodeError:
             # ignore the file if it can't be decoded
             log.debug("caught UnicodeDecodeError for path %s - skipping", path)
+        except compression.CodecUnavailable as e:
+            log.debug("%s - skipping", e)
         except EOFError as e:
             msg = ("an exception occured while searching {} - {}".
                    format(path, e))
@@ -349,6 +853,84 @@ class FileSearcher(object):
                    format(path, e))
             raise FileSearchException(msg) from e
 
+    @staticmethod
+    def _fix_linenumbers(results, skipped):
+        """
+        Line numbers of files that were searched from part way through are
+        relative to where the search started. Make them absolute by counting
+        the lines that were skipped, which is only done for files that
+        produced results.
+
+        @param skipped: {path: offset} of files searched from part way
+                        through.
+        """
+        counts = {}
+        for r in results:
+            if r.source not in skipped:
+                continue
+
+            if r.source not in counts:
+                with open(r.source, 'rb') as fd:
+                    counts[r.source] = count_lines(fd, skipped[r.source])
+
+            r.linenumber += counts[r.source]
+
+    def _open_uncompressed(self, path, fd, skipped):
+        """
+        Position an uncompressed log at the first line that needs to be
+        searched. If the log has been indexed the index is used to find
+        that line, otherwise it is bisected. If the log is to be read in
+        full and indexing is enabled, it is indexed as it is searched.
+
+        @param fd: file object for path opened in binary mode at offset 0.
+        @param skipped: dict that path is added to with the offset it is
+                        positioned at if that is found by bisection. The
+                        line number is not known in that case.
+        @return: tuple of file object and the line number it is positioned
+                 at (or None).
+        """
+        since = self.window is not None and self.window.since
+        if not (since or constants.SEARCH_INDEX_DIR):
+            return io.TextIOWrapper(fd), 1
+
+        st = os.fstat(fd.fileno())
+        index = LogIndex.load(path, st)
+        offset = 0
+        if since:
+            # skip straight to the start of the window
+            if index is not None:
+                offset, start = index.find_start(since)
+                log.debug("searching %s from line %s of %s", path, start,
+                          index.lines)
+                fd.seek(offset)
+                return io.TextIOWrapper(fd), start
+
+            offset = self.window.find_start(fd, st.st_size)
+            fd.seek(offset)
+            if offset:
+                skipped[path] = offset
+                return io.TextIOWrapper(fd), None
+
+        if index is None and self._indexable(fd, st):
+            # the log is read in full so index it as we go
+            return LogIndexer(path, fd, SearchWindow.line_timestamp), 1
+
+        return io.TextIOWrapper(fd), 1
+
+    @staticmethod
+    def _indexable(fd, st):
+        """
+        Returns True if indexing is enabled and fd, which is positioned at
+        offset 0, is big enough to be worth indexing and starts with a
+        timestamped line.
+        """
+        if not constants.SEARCH_INDEX_DIR or st.st_size < LogIndex.MIN_SIZE:
+            return False
+
+        line = fd.readline(SearchWindow.BISECT_SCAN_LIMIT)
+        fd.seek(0)
+        return SearchWindow.raw_line_timestamp(line) is not None
+
     def line_filtered(self, term_key, line):
         """Returns True if line is to be skipped."""
         for f_term in self.filters.get(term_key, []):
@@ -357,18 +939,62 @@ class FileSearcher(object):
 
         return False
 
-    def _search_task(self, term_key, fd, path):
+    def _search_source_inline(self, source):
+        try:
+            return self._search_task(source, source, source.name)
+        except UnicodeDecodeError:
+            log.debug("caught UnicodeDecodeError for source %s - skipping",
+                      source.name)
+        except Exception as e:
+            msg = ("an unknown exception occured while searching {} - {}".
+                   format(source.name, e))
+            raise FileSearchException(msg) from e
+
+    def _search_task(self, term_key, fd, path, start=1):
+        """
+        @param start: line number of the first line read from fd or None if
+                      it was positioned part way through and is not known,
+                      in which case line numbers are relative to there.
+        """
         results = []
+        # aggregated (counted) results keyed by tag
+        counts = {}
         sequence_results = {}
-        for ln, line in enumerate(fd, start=1):
+        # Sequence search state is held by the search definitions so we use
+        # copies of those to ensure each search starts from a clean state.
+        search_terms = [s.copy() if type(s) == SequenceSearchDef else s
+                        for s in self.paths[term_key]]
+        if isinstance(fd, LogStream):
+            # path changes as we move through the stream
+            lines = iter(fd)
+        else:
+            lines = ((path, ln, line) for ln, line in
+                     enumerate(fd, start=start or 1))
+
+        window = self.window
+        # lines without a timestamp belong to the last line that had one
+        # which, if we have skipped ahead, is not in the window.
+        in_window = start == 1
+        for path, ln, line in lines:
             if type(line) == bytes:
                 line = line.decode("utf-8")
 
+            if window is not None:
+                ts = window.line_timestamp(line)
+                if ts is not None:
+                    if window.too_new(ts):
+                        break
+
+                    in_window = not window.too_old(ts)
+
+                if not in_window:
+                    continue
+
             # global filters (untagged)
             if self.line_filtered(term_key, line):
                 continue
 
-            for s_term in self.paths[term_key]:
+            for s_term in search_terms:
                 if type(s_term) == SequenceSearchDef:
                     # if the ending is defined and we match a start while
                     # already in a section, we start again.
@@ -389,9 +1015,19 @@ class FileSearcher(object):
                     ret = s_term.run(line)
 
                 if ret:
+                    tag = s_term.tag
+                    if isinstance(s_term, SearchDef) and s_term.aggregate:
+                        key = s_term.aggregate.get_key(ret, path)
+                        if key is not None:
+                            if tag not in counts:
+                                counts[tag] = Counter()
+
+                            counts[tag][key] += 1
+
+                        continue
+
                     section_idx = None
                     sequence_obj_id = None
-                    tag = s_term.tag
                     if type(s_term) == SequenceSearchDef:
                         if not s_term.started:
                             tag = s_term.start_tag
@@ -433,13 +1069,17 @@ class FileSearcher(object):
                                          sequence_obj_id=s_term.id)
                         sequence_results[s_term.id].append(r)
 
+        if hasattr(lines, 'close'):
+            # release any background reader if we stopped early
+            lines.close()
+
         if sequence_results:
             # If a sequence ending definition is provided and we reached EOF
             # while a sequence is started, complete the sequence is s_end
             # matches an empty string. If none is defined we just go ahead and
             # complete the section.
             filter_section_idx = []
-            for s_term in self.paths[term_key]:
+            for s_term in search_terms:
                 if type(s_term) == SequenceSearchDef:
                     if s_term.started:
                         if s_term.s_end is None:
@@ -466,7 +1106,7 @@ class FileSearcher(object):
 
                     results.append(r)
 
-        return results
+        return results, counts
 
     def logrotate_file_sort(self, fname):
         """
@@ -479,7 +1119,8 @@ class FileSearcher(object):
 
         filters = [r"\S+\.log$",
                    r"\S+\.log\.(\d+)$",
-                   r"\S+\.log\.(\d+)\.gz?$"]
+                   r"\S+\.log\.(\d+)(?:\.gz?|{})$".format(
+                                                compression.suffix_expr())]
         for filter in filters:
             ret = re.compile(filter).match(fname)
             if ret:
@@ -495,6 +1136,42 @@ class FileSearcher(object):
 
         return int(ret.group(1))
 
+    def log_streams(self, paths):
+        """
+        Group logs with their logrotate history (as returned by
+        filtered_paths) into LogStream objects. Paths that have no history
+        are returned as-is.
+        """
+        streams = {}
+        entries = []
+        for path in paths:
+            ret = re.match(r"(\S+\.log)(\.\d+({})?)?$".format(
+                                                compression.suffix_expr()),
+                           path)
+            if not ret:
+                entries.append(path)
+                continue
+
+            base = ret.group(1)
+            if base not in streams:
+                streams[base] = []
+                entries.append(base)
+
+            streams[base].append(path)
+
+        for i, entry in enumerate(entries):
+            if entry not in streams:
+                continue
+
+            if len(streams[entry]) == 1:
+                entries[i] = streams[entry][0]
+            else:
+                history = sorted(streams[entry], key=self.logrotate_file_sort,
+                                 reverse=True)
+                entries[i] = LogStream(history, window=self.window)
+
+        return entries
+
     def filtered_paths(self, paths):
         """
         Paths can be a mix of files and directories.
@@ -502,7 +1179,7 @@ class FileSearcher(object):
         logrotate_collection = {}
         dir_contents = []
         for path in paths:
-            if not os.path.isfile(path):
+            if not filecatalog.isfile(path):
                 continue
 
             ret = re.compile(r"(\S+)\.log\S*").match(path)
@@ -522,45 +1199,91 @@ class FileSearcher(object):
         for logrotated in logrotate_collection.values():
             capped = sorted(logrotated,
                             key=self.logrotate_file_sort)[:limit]
+            if self.window is not None:
+                capped = [path for path in capped if not
+                          self.window.rotated_out(filecatalog.getmtime(path))]
+
             dir_contents += capped
 
         return dir_contents
 
+    def _add_results(self, path, results, counts):
+        if isinstance(path, LogStream):
+            # results are stored against the file they came from
+            by_path = {}
+            for result in results:
+                by_path.setdefault(result.source, []).append(result)
+
+            for _path in path.paths:
+                if _path in by_path:
+                    self.results.add(_path, by_path[_path])
+        elif results:
+            self.results.add(path, results)
+
+        if counts:
+            self.results.add_counts(source_name(path), counts)
+
+    def _run_searches(self, pool):
+        jobs = {}
+        for user_path in self.paths:
+            jobs[user_path] = []
+            if isinstance(user_path, SearchSource):
+                # searched inline below
+                continue
+
+            log.debug("path=%s", user_path)
+            if filecatalog.isfile(user_path):
+                job = self._job_wrapper(pool, user_path, user_path)
+                jobs[user_path] = [(user_path, job)]
+            elif filecatalog.isdir(user_path):
+                paths = [os.path.join(user_path, name) for name in
+                         filecatalog.listdir(user_path)]
+                for path in self.log_streams(self.filtered_paths(paths)):
+                    job = self._job_wrapper(pool, user_path, path)
+                    jobs[user_path].append((path, job))
+            else:
+                paths = filecatalog.glob_paths(user_path)
+                for path in self.log_streams(self.filtered_paths(paths)):
+                    job = self._job_wrapper(pool, user_path, path)
+                    jobs[user_path].append((path, job))
+
+        total_paths = sum([len(jobs[p]) for p in jobs])
+        total_searches = sum([len(jobs[p]) * len(self.paths[p])
+                              for p in jobs])
+        log.debug("files=%s searches=%s", total_paths, total_searches)
+        for user_path in jobs:
+            if isinstance(user_path, SearchSource):
+                log.debug("source=%s", user_path.name)
+                try:
+                    result = self._search_source_inline(user_path)
+                    if result:
+                        self._add_results(user_path.name, *result)
+                except FileSearchException as e:
+                    sys.stderr.write("{}\n".format(e.msg))
+
+                continue
+
+            for fpath, job in jobs[user_path]:
+                try:
+                    result = job.get()
+                    if result:
+                        self._add_results(fpath, *result)
+                except FileSearchException as e:
+                    sys.stderr.write("{}\n".format(e.msg))
+
     def search(self):
         """Execute all the search queries.
 
         @return: search results
         """
         self.results.reset()
+        if all([isinstance(p, SearchSource) for p in self.paths]):
+            # no need for a pool if there are no files to search
+            self._run_searches(None)
+            return self.results
+
         log.debug("creating filesearcher with max=%d processes", self.num_cpus)
         with multiprocessing.Pool(processes=self.num_cpus) as pool:
-            jobs = {}
-            for user_path in self.paths:
-                log.debug("path=%s", user_path)
-                jobs[user_path] = []
-                if os.path.isfile(user_path):
-                    job = self._job_wrapper(pool, user_path, user_path)
-                    jobs[user_path] = [(user_path, job)]
-                elif os.path.isdir(user_path):
-                    for path in self.filtered_paths(user_path):
-                        job = self._job_wrapper(pool, user_path, path)
-                        jobs[user_path].append((path, job))
-                else:
-                    for path in self.filtered_paths(glob.glob(user_path)):
-                        job = self._job_wrapper(pool, user_path, path)
-                        jobs[user_path].append((path, job))
-
-            total_paths = sum([len(jobs[p]) for p in jobs])
-            total_searches = sum([len(jobs[p]) * len(self.paths[p])
-                                  for p in jobs])
-            log.debug("files=%s searches=%s", total_paths, total_searches)
-            for user_path in jobs:
-                for fpath, job in jobs[user_path]:
-                    try:
-                        result = job.get()
-                        if result:
-                            self.results.add(fpath, result)
-                    except FileSearchException as e:
-                        sys.stderr.write("{}\n".format(e.msg))
+            self._run_searches(pool)
 
         return self.results
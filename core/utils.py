@@ -1,7 +1,5 @@
 import subprocess
-import tempfile
 
-from core import constants
 from core.cli_helpers import CLIHelper
 
 
@@ -15,17 +13,6 @@ def sorted_dict(d, key=None, reverse=False):
     return dict(sorted(d.items(), key=key, reverse=reverse))
 
 
-def mktemp_dump(data):
-    """Create a temporary file under the current plugin tmp directory and write
-    data to the file.
-    """
-    ftmp = tempfile.mktemp(dir=constants.PLUGIN_TMP_DIR)
-    with open(ftmp, 'w') as fd:
-        fd.write(data)
-
-    return ftmp
-
-
 def get_date_secs(datestring=None):
     if datestring:
         cmd = ["date", "--utc", "--date={}".format(datestring), "+%s"]
@@ -34,6 +34,12 @@ export AGENT_ERROR_KEY_BY_TIME=false
 # Path to the end product that plugins can see along the way.
 export MASTER_YAML_OUT
 export USE_ALL_LOGS=false
+# Optional time range that log searches are restricted to.
+export SEARCH_SINCE=
+export SEARCH_UNTIL=
+# Where log indexes are kept. Log indexing is disabled unless provided with
+# --index-dir.
+export SEARCH_INDEX_DIR=
 # Name of the current plugin being executed
 export PLUGIN_NAME
 # Name of the current plugin part being executed
@@ -111,6 +117,11 @@ OPTIONS
         This message.
     --<plugin name>
         Use the specified plugin.
+    --index-dir [PATH]
+        Index uncompressed timestamped logs by timestamp and line number in
+        PATH the first time they are read in full so that future runs that
+        are restricted with --since can skip straight to the lines they
+        need. Logs are not indexed unless this option is provided.
     --list-plugins
         Show available plugins.
     --max-parallel-tasks [INT]
@@ -120,6 +131,17 @@ OPTIONS
     --max-logrotate-depth [INT]
         Defaults to 7. This is maximum logrotate history that will be searched
         for a given log. Only applies when --all-logs is provided.
+    --since [DATETIME]
+        Only search log lines timestamped at or after DATETIME which must be
+        of the form YYYY-MM-DD[ HH:MM[:SS]]. Lines without a timestamp e.g.
+        tracebacks are treated as part of the last timestamped line. Rotated
+        logs last modified before this time are skipped entirely. Only lines
+        that start with a YYYY-MM-DD HH:MM:SS (or YYYY-MM-DDTHH:MM:SS)
+        timestamp are recognised so logs that use other formats, e.g. syslog
+        style "Mon DD HH:MM:SS", are not filtered.
+    --until [DATETIME]
+        Only search log lines timestamped at or before DATETIME (same format
+        as --since).
     --short
         Filtered yaml output to only include known-bugs and potential-issues
         sections for plugins run.
@@ -147,6 +169,19 @@ SOSPATH
 EOF
 }
 
+check_datetime ()
+{
+    # Must match what core.searchtools.SearchWindow accepts.
+    local opt=$1
+    local value=$2
+    local expr='^[0-9]{4}-[0-9]{2}-[0-9]{2}([ T][0-9]{2}:[0-9]{2}(:[0-9]{2})?)?$'
+
+    if ! [[ $value =~ $expr ]]; then
+        echo "ERROR: invalid $opt '$value' - expected YYYY-MM-DD[ HH:MM[:SS]]"
+        exit 1
+    fi
+}
+
 while (($#)); do
     case $1 in
         --debug)
@@ -178,6 +213,20 @@ while (($#)); do
             export MAX_LOGROTATE_DEPTH=$2
             shift
             ;;
+        --index-dir)
+            SEARCH_INDEX_DIR="$2"
+            shift
+            ;;
+        --since)
+            check_datetime $1 "$2"
+            SEARCH_SINCE="$2"
+            shift
+            ;;
+        --until)
+            check_datetime $1 "$2"
+            SEARCH_UNTIL="$2"
+            shift
+            ;;
         -s|--save)
             SAVE_OUTPUT=true
             ;;
@@ -276,6 +325,10 @@ run_part ()
     $DEBUG_MODE && echo " (${delta}s)" 1>&2
 }
 
+if [[ -n $SEARCH_INDEX_DIR ]]; then
+    mkdir -p $SEARCH_INDEX_DIR
+fi
+
 CWD=$(dirname `realpath $0`)
 for data_root in "${SOS_PATHS[@]}"; do
     if [ "$data_root" = "/" ]; then
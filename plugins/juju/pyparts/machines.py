@@ -1,6 +1,6 @@
 import re
 
-from core.cli_helpers import CLIHelper
+from core import host_helpers
 from core.issues import (
     issue_types,
     issue_utils,
@@ -20,10 +20,10 @@ class JujuMachineChecks(JujuChecksBase):
                         'machine': self.machine.id}
 
         agent_running = False
-        for line in CLIHelper().ps():
-            if 'jujud' in line:
-                expr = r".+(jujud-machine-\d+(?:-lxd-\d+)?)"
-                ret = re.compile(expr).match(line)
+        for name in host_helpers.get_process_table().binaries:
+            if 'jujud' in name:
+                expr = r"(jujud-machine-\d+(?:-lxd-\d+)?)"
+                ret = re.compile(expr).match(name)
                 if ret:
                     if ret.group(1) == self.machine.agent_service_name:
                         agent_running = True
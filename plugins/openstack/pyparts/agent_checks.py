@@ -1,7 +1,7 @@
 import yaml
 
 from core.checks import CallbackHelper
-from core.searchtools import FileSearcher
+from core.searchtools import CountBy, FileSearcher
 from core.analytics import LogEventStats, SearchResultIndices
 from core import utils
 from core.plugins.openstack import (
@@ -14,6 +14,19 @@ YAML_PRIORITY = 9
 EVENTCALLBACKS = CallbackHelper()
 
 
+def failover_count_key(values, source):
+    """
+    Failovers are counted by date and loadbalancer id which is extracted from
+    the payload. Failovers with no loadbalancer are not counted.
+    """
+    ts_date, payload = values
+    lb_id = yaml.safe_load(payload).get("load_balancer_id")
+    if lb_id is None:
+        return
+
+    return ts_date, lb_id
+
+
 class NeutronAgentEventChecks(OpenstackEventChecksBase):
     """
     Loads events we want to check from definitions yaml and executes them. The
@@ -26,15 +39,18 @@ class NeutronAgentEventChecks(OpenstackEventChecksBase):
                          event_results_passthrough=True,
                          **kwargs)
 
-    def _get_event_stats(self, results, event_name, custom_idxs=None):
-        stats = LogEventStats(results, event_name, custom_idxs=custom_idxs)
+    def _get_event_stats(self, results, event_name, custom_idxs=None,
+                         streaming=False):
+        stats = LogEventStats(results, event_name, custom_idxs=custom_idxs,
+                              streaming=streaming)
         stats.run()
         top5 = stats.get_top_n_events_sorted(5)
         if not top5:
             return
 
         return {"top": top5,
-                "stats": stats.get_event_stats()}
+                "stats": stats.get_event_stats(),
+                "distribution": stats.get_event_distribution()}
 
     @EVENTCALLBACKS.callback
     def router_updates(self, event):
@@ -60,7 +76,9 @@ class NeutronAgentEventChecks(OpenstackEventChecksBase):
     def rpc_loop(self, event):
         agent = event.section
         event_name = 'rpc-loop'
-        ret = self._get_event_stats(event.results, event_name)
+        # there can be a very large number of these across a long log history
+        ret = self._get_event_stats(event.results, event_name,
+                                    streaming=True)
         if ret:
             return {event_name: ret}, agent
 
@@ -68,61 +86,44 @@ class NeutronAgentEventChecks(OpenstackEventChecksBase):
 class OctaviaAgentEventChecks(OpenstackEventChecksBase):
 
     def __init__(self, *args, **kwargs):
+        aggregates = {'lb-failover-auto':
+                      CountBy(groups=[1, 2], key=failover_count_key),
+                      'lb-failover-manual':
+                      CountBy(groups=[1, 2], key=failover_count_key),
+                      'amp-missed-heartbeats': CountBy(groups=[1, 2])}
         super().__init__(*args, callback_helper=EVENTCALLBACKS,
-                         event_results_output_key='octavia', **kwargs)
+                         event_results_output_key='octavia',
+                         event_aggregates=aggregates, **kwargs)
 
-    def _get_failover(self, result):
-        ts_date = result.get(1)
-        payload = yaml.safe_load(result.get(2))
-        lb_id = payload.get("load_balancer_id")
-        if lb_id is None:
-            return None, None
+    def _get_counts_by_date(self, counts):
+        """
+        @param counts: Counter keyed by (date, resource)
+        @return: dict of resource counts keyed by date.
+        """
+        by_date = {}
+        for (ts_date, resource), count in counts.items():
+            if ts_date not in by_date:
+                by_date[ts_date] = {}
 
-        return ts_date, lb_id
+            by_date[ts_date][resource] = count
 
-    def _get_failovers(self, results):
-        failovers = {}
-        for r in results:
-            ts_date, lb_id = self._get_failover(r)
-            if ts_date is None:
-                continue
-
-            if ts_date not in failovers:
-                failovers[ts_date] = {}
-
-            if lb_id not in failovers[ts_date]:
-                failovers[ts_date][lb_id] = 1
-            else:
-                failovers[ts_date][lb_id] += 1
-
-        return failovers
+        return by_date
 
     @EVENTCALLBACKS.callback
     def lb_failover_auto(self, event):
-        ret = self._get_failovers(event.results)
+        ret = self._get_counts_by_date(event.counts_merged)
         if ret:
             return {'auto': ret}, 'lb-failovers'
 
     @EVENTCALLBACKS.callback
     def lb_failover_manual(self, event):
-        ret = self._get_failovers(event.results)
+        ret = self._get_counts_by_date(event.counts_merged)
         if ret:
             return {'manual': ret}, 'lb-failovers'
 
     @EVENTCALLBACKS.callback
     def amp_missed_heartbeats(self, event):
-        missed_heartbeats = {}
-        for r in event.results:
-            ts_date = r.get(1)
-            amp_id = r.get(2)
-
-            if ts_date not in missed_heartbeats:
-                missed_heartbeats[ts_date] = {}
-
-            if amp_id not in missed_heartbeats[ts_date]:
-                missed_heartbeats[ts_date][amp_id] = 1
-            else:
-                missed_heartbeats[ts_date][amp_id] += 1
+        missed_heartbeats = self._get_counts_by_date(event.counts_merged)
 
         # sort each amp by occurences
         for ts_date, amps in missed_heartbeats.items():
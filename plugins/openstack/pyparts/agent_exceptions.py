@@ -2,12 +2,13 @@ import os
 import re
 
 from core import constants
-from core.searchtools import SearchDef
+from core.searchtools import CountBy
 from core.plugins.openstack import (
     OpenstackEventChecksBase,
     AGENT_ERROR_KEY_BY_TIME,
     SERVICE_RESOURCES,
 )
+from core.plugins.openstack.exception_scanner import ExceptionSearchDef
 from core.plugins.openstack.exceptions import (
     BARBICAN_EXCEPTIONS,
     CASTELLAN_EXCEPTIONS,
@@ -24,6 +25,24 @@ from core.plugins.openstack.exceptions import (
 YAML_PRIORITY = 7
 
 
+def exception_count_key(values, source):
+    """
+    Exceptions are counted by type and date or, if AGENT_ERROR_KEY_BY_TIME is
+    set, date and time.
+    """
+    exc_tag, ts_date, ts_time = values
+    # strip leading/trailing quotes
+    exc_tag = exc_tag.strip("'")
+    if AGENT_ERROR_KEY_BY_TIME:
+        # use hours and minutes only
+        ts_time = re.compile(r'(\d+:\d+).+').search(ts_time)[1]
+        key = "{}_{}".format(ts_date, ts_time)
+    else:
+        key = str(ts_date)
+
+    return exc_tag, key
+
+
 class AgentExceptionChecks(OpenstackEventChecksBase):
 
     def __init__(self):
@@ -99,26 +118,29 @@ class AgentExceptionChecks(OpenstackEventChecksBase):
             expr_template = (r"^{}([0-9\-]+) (\S+) .+\S+\s({}{{}})[\s:\.]".
                              format(prefix_match, exc_obj_full_path_match))
 
+            # matches are counted by the searcher rather than returned
+            aggregate = CountBy(groups=[3, 1, 2], key=exception_count_key)
+            # exception names are located with a literal matcher, shared by
+            # all daemons, before the expression itself is evaluated.
             for agent in SERVICE_RESOURCES[svc]['daemons']:
                 data_source = data_source_template.format(agent)
-                expr = expr_template.format("(?:{})".
-                                            format('|'.join(exc_exprs)))
                 hint = '( ERROR | Traceback)'
-                sd = SearchDef(expr, tag=agent, hint=hint)
+                sd = ExceptionSearchDef(expr_template, exc_exprs, tag=agent,
+                                        hint=hint, aggregate=aggregate)
                 self.searchobj.add_search_term(sd, data_source)
 
                 warn_exprs = self._agent_warnings.get(svc, [])
                 if warn_exprs:
-                    expr = expr_template.format("(?:{})".
-                                                format('|'.join(warn_exprs)))
-                    sd = SearchDef(expr, tag=agent, hint='WARNING')
+                    sd = ExceptionSearchDef(expr_template, warn_exprs,
+                                            tag=agent, hint='WARNING',
+                                            aggregate=aggregate)
                     self.searchobj.add_search_term(sd, data_source)
 
                 err_exprs = self._agent_errors.get(svc, [])
                 if err_exprs:
-                    expr = expr_template.format("(?:{})".
-                                                format('|'.join(err_exprs)))
-                    sd = SearchDef(expr, tag=agent, hint='ERROR')
+                    sd = ExceptionSearchDef(expr_template, err_exprs,
+                                            tag=agent, hint='ERROR',
+                                            aggregate=aggregate)
                     self.searchobj.add_search_term(sd, data_source)
 
     def register_search_terms(self):
@@ -129,32 +151,21 @@ class AgentExceptionChecks(OpenstackEventChecksBase):
         self._prepare_exception_expressions()
         self._add_exception_searches()
 
-    def get_exceptions_results(self, results):
+    def get_exceptions_results(self, counts):
         """ Process exception search results.
 
         Determine frequency of occurrences. By default they are
         grouped/presented by date but can optionally be grouped by time for
         more granularity.
+
+        @param counts: Counter keyed by (exception, date/time).
         """
         agent_exceptions = {}
-        for result in results:
-            # strip leading/trailing quotes
-            exc_tag = result.get(3).strip("'")
+        for (exc_tag, key), count in counts.items():
             if exc_tag not in agent_exceptions:
                 agent_exceptions[exc_tag] = {}
 
-            ts_date = result.get(1)
-            if AGENT_ERROR_KEY_BY_TIME:
-                # use hours and minutes only
-                ts_time = re.compile(r'(\d+:\d+).+').search(result.get(2))[1]
-                key = "{}_{}".format(ts_date, ts_time)
-            else:
-                key = str(ts_date)
-
-            if key not in agent_exceptions[exc_tag]:
-                agent_exceptions[exc_tag][key] = 0
-
-            agent_exceptions[exc_tag][key] += 1
+            agent_exceptions[exc_tag][key] = count
 
         if not agent_exceptions:
             return
@@ -174,8 +185,8 @@ class AgentExceptionChecks(OpenstackEventChecksBase):
         issues = {}
         for service in SERVICE_RESOURCES:
             for agent in SERVICE_RESOURCES[service]['daemons']:
-                _results = results.find_by_tag(agent)
-                ret = self.get_exceptions_results(_results)
+                counts = results.find_counts_by_tag(agent)
+                ret = self.get_exceptions_results(counts)
                 if ret:
                     if service not in issues:
                         issues[service] = {}
@@ -10,8 +10,8 @@ from core.cli_helpers import CLIHelper
 from core.searchtools import (
     SearchDef,
     FileSearcher,
+    SearchWindow,
 )
-from core.utils import mktemp_dump
 from core.plugins.openstack import (
     NEUTRON_HA_PATH,
     OpenstackChecksBase,
@@ -26,7 +26,7 @@ class NeutronL3HAChecks(OpenstackChecksBase):
     def __init__(self):
         super().__init__()
         self.searcher = FileSearcher()
-        self.f_journalctl = None
+        self.journalctl = None
         self.router_vrrp_pids = {}
         self.router_vr_ids = {}
         self.cli = CLIHelper()
@@ -36,18 +36,19 @@ class NeutronL3HAChecks(OpenstackChecksBase):
         if self._output:
             return {"neutron-l3ha": self._output}
 
-    def __del__(self):
-        if self.f_journalctl and os.path.exists(self.f_journalctl):
-            os.unlink(self.f_journalctl)
-
     def _get_journalctl_l3_agent(self):
-        if not constants.USE_ALL_LOGS:
+        window = SearchWindow.from_constants()
+        if window is not None and window.since:
+            # the searcher restricts lines to the window so only the day is
+            # needed to limit what journalctl reads.
+            date = window.since.split()[0]
+        elif not constants.USE_ALL_LOGS:
             date = self.cli.date(format="--iso-8601").rstrip()
         else:
             date = None
 
-        out = self.cli.journalctl(unit="neutron-l3-agent", date=date)
-        self.f_journalctl = mktemp_dump(''.join(out))
+        self.journalctl = self.cli.journalctl.search_source(
+            unit="neutron-l3-agent", date=date)
 
     def get_neutron_ha_info(self):
         ha_state_path = os.path.join(constants.DATA_ROOT, NEUTRON_HA_PATH)
@@ -104,7 +105,7 @@ class NeutronL3HAChecks(OpenstackChecksBase):
                     r"\[([0-9]+)\]: (?:VRRP_Instance)?\(VR_{}\) .+ (\S+) "
                     "STATE.*".format(vr_id))
             d = SearchDef(expr, tag=router)
-            self.searcher.add_search_term(d, self.f_journalctl)
+            self.searcher.add_search_term(d, self.journalctl)
 
         results = self.searcher.search()
         for router in self.router_vrrp_pids:
@@ -1,8 +1,4 @@
 from core.checks import CallbackHelper
-from core.searchtools import (
-    SearchDef,
-    FileSearcher,
-)
 from core.plugins.openstack import OpenstackEventChecksBase
 
 EXT_EVENT_META = {'network-vif-plugged': {'stages_keys':
@@ -22,58 +18,37 @@ class NovaExternalEventChecks(OpenstackEventChecksBase):
                          event_results_output_key='os-server-external-events',
                          **kwargs,)
 
-    def get_state_dict(self, event_name):
-        state = {}
-        for key in EXT_EVENT_META[event_name]['stages_keys']:
-            state[key] = False
-
-        return state
-
-    def _get_events(self, event_name, master_results):
-        ext_output = {}
+    def _get_events(self, event_name, results):
+        """
+        Correlate the stages of each event, keyed by instance and port, from
+        the stage lines matched by its search. An event is only considered
+        if its first stage has been seen and has succeeded if all stages have
+        been seen.
+        """
+        stages_keys = EXT_EVENT_META[event_name]['stages_keys']
         events = {}
-        events_found = {}
+        for result in results:
+            key = (result.get(1), result.get(3))
+            if key not in events:
+                events[key] = set()
 
-        s = FileSearcher()
-        for result in master_results:
-            instance_id = result.get(1)
-            event_id = result.get(3)
-            events[event_id] = {'instance_id': instance_id,
-                                'data_source': result.source}
+            events[key].add(result.get(2))
 
-            for stage in EXT_EVENT_META[event_name]['stages_keys']:
-                expr = (r".+\[instance: {}\]\s+{}\s.*\s?event\s+{}-{}.? "
-                        ".+".
-                        format(instance_id, stage, event_name, event_id))
-                tag = "{}_{}_{}".format(instance_id, event_id, stage)
-                sd = SearchDef(expr, tag, hint=event_name)
-                s.add_search_term(sd, result.source)
-
-        results = s.search()
-        for event_id in events:
-            instance_id = events[event_id]['instance_id']
-            data_source = events[event_id]['data_source']
-            stages = self.get_state_dict(event_name)
-            for stage in stages:
-                tag = "{}_{}_{}".format(instance_id, event_id, stage)
-                r = results.find_by_tag(tag, path=data_source)
-                if r:
-                    stages[stage] = True
+        events_found = {}
+        for (instance_id, event_id), stages in events.items():
+            if stages_keys[0] not in stages:
+                continue
 
-            if all([stages[stage] for stage in stages]):
+            if all([stage in stages for stage in stages_keys]):
                 result = 'succeeded'
             else:
                 result = 'failed'
 
-            if result not in ext_output:
-                ext_output[result] = []
+            if result not in events_found:
+                events_found[result] = []
 
             info = {'port': event_id, 'instance': instance_id}
-            ext_output[result].append(info)
-
-        if ext_output:
-            for result in ext_output:
-                events_found[result] = list(ext_output[result])
+            events_found[result].append(info)
 
         return events_found
 
@@ -18,7 +18,7 @@ class NeutronServiceChecks(OpenstackChecksBase):
         start_count = 0
         cli = CLIHelper()
         cexpr = re.compile(r"Started OpenStack Neutron OVS cleanup.")
-        for line in cli.journalctl(unit="neutron-ovs-cleanup"):
+        for line in cli.journalctl.iter_lines(unit="neutron-ovs-cleanup"):
             if re.compile("-- Reboot --").match(line):
                 # reset after reboot
                 raise_issue = False
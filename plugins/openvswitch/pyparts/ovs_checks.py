@@ -1,4 +1,3 @@
-import os
 import re
 
 from core.checks import CallbackHelper
@@ -8,11 +7,12 @@ from core.issues import (
 )
 from core.cli_helpers import CLIHelper
 from core.searchtools import (
+    CountBy,
     FileSearcher,
     SearchDef,
+    SearchSource,
     SequenceSearchDef,
 )
-from core.utils import mktemp_dump
 from core.plugins.openvswitch import (
     OpenvSwitchChecksBase,
     OpenvSwitchEventChecksBase,
@@ -25,9 +25,14 @@ EVENTCALLBACKS = CallbackHelper()
 class OpenvSwitchDaemonChecks(OpenvSwitchEventChecksBase):
 
     def __init__(self):
+        # all events are counted by (date, resource)
+        aggregates = {event: CountBy(groups=[1, 2]) for event in
+                      ['netdev-linux-no-such-device', 'bridge-no-such-device',
+                       'ovs-vswitchd', 'ovsdb-server']}
         super().__init__(yaml_defs_group='daemon-checks',
                          event_results_output_key='daemon-checks',
-                         callback_helper=EVENTCALLBACKS)
+                         callback_helper=EVENTCALLBACKS,
+                         event_aggregates=aggregates)
 
     def _stats_sort(self, stats):
         stats_sorted = {}
@@ -37,70 +42,65 @@ class OpenvSwitchDaemonChecks(OpenvSwitchEventChecksBase):
 
         return stats_sorted
 
-    def get_results_stats(self, results, key_by_date=True):
+    def get_results_stats(self, counts, key_by_date=True):
         """
         Collect information about how often a resource occurs. A resource can
         be anything e.g. an interface or a loglevel string.
 
-        @param results: a list of SearchResult objects containing two groups; a
-                        date and a resource.
+        @param counts: Counter of occurrences keyed by (date, resource).
         @param key_by_date: by default the results are collected by datetime
                             i.e. for each timestamp show how many of each
                             resource occured.
         """
         stats = {}
-        for r in results:
+        for (date, resource), count in counts.items():
             if key_by_date:
-                key = r.get(1)
-                value = r.get(2)
+                key = date
+                value = resource
             else:
-                key = r.get(2)
-                value = r.get(1)
+                key = resource
+                value = date
 
             if key not in stats:
                 stats[key] = {}
 
-            if value not in stats[key]:
-                stats[key][value] = 1
-            else:
-                stats[key][value] += 1
-
-            # sort each keyset
-            if not key_by_date:
-                stats[key] = self._stats_sort(stats[key])
+            stats[key][value] = count
 
         if stats:
-            # only if sorted per key
             if key_by_date:
                 stats = self._stats_sort(stats)
+            else:
+                # sort each keyset
+                for key in stats:
+                    stats[key] = self._stats_sort(stats[key])
 
             return stats
 
     @EVENTCALLBACKS.callback
     def netdev_linux_no_such_device(self, event):
         """ Group with vswitchd section results. """
-        ret = self.get_results_stats(event.results)
+        ret = self.get_results_stats(event.counts_merged)
         if ret:
             return {'netdev-linux-no-such-device': ret}, 'ovs-vswitchd'
 
     @EVENTCALLBACKS.callback
     def bridge_no_such_device(self, event):
         """ Group with vswitchd section results. """
-        ret = self.get_results_stats(event.results)
+        ret = self.get_results_stats(event.counts_merged)
         if ret:
             return {'bridge-no-such-device': ret}, 'ovs-vswitchd'
 
     @EVENTCALLBACKS.callback
     def ovs_vswitchd(self, event):
         """ Group with errors-and-warnings section results. """
-        ret = self.get_results_stats(event.results, key_by_date=False)
+        ret = self.get_results_stats(event.counts_merged, key_by_date=False)
         if ret:
             return {'ovs-vswitchd': ret}, 'logs'
 
     @EVENTCALLBACKS.callback
     def ovsdb_server(self, event):
         """ Group with errors-and-warnings section results. """
-        ret = self.get_results_stats(event.results, key_by_date=False)
+        ret = self.get_results_stats(event.counts_merged, key_by_date=False)
         if ret:
             return {'ovsdb-server': ret}, 'logs'
 
@@ -111,16 +111,12 @@ class OpenvSwitchDPChecks(OpenvSwitchChecksBase):
         super().__init__()
         cli = CLIHelper()
         out = cli.ovs_appctl_dpctl_show(datapath="system@ovs-system")
-        self.f_dpctl = mktemp_dump(''.join(out))
+        self.dpctl = SearchSource('ovs_appctl_dpctl_show', out)
         bridges = cli.ovs_vsctl_list_br()
         self.ovs_bridges = [br.strip() for br in bridges]
         self.searchobj = FileSearcher()
         self.sequence_defs = []
 
-    def __del__(self):
-        if os.path.exists(self.f_dpctl):
-            os.unlink(self.f_dpctl)
-
     def register_search_terms(self):
         self.sequence_defs.append(SequenceSearchDef(
             start=SearchDef(r"\s+port \d+: (\S+) .+"),
@@ -128,7 +124,7 @@ class OpenvSwitchDPChecks(OpenvSwitchChecksBase):
                            r"\S+:(\d+) \S+:(\d+)"),
             tag="port-stats"))
         for sd in self.sequence_defs:
-            self.searchobj.add_search_term(sd, self.f_dpctl)
+            self.searchobj.add_search_term(sd, self.dpctl)
 
     def process_results(self, results):
         """
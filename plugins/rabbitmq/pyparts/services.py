@@ -1,5 +1,3 @@
-import os
-
 from core.issues import (
     issue_types,
     issue_utils,
@@ -10,7 +8,7 @@ from core.searchtools import (
     SequenceSearchDef,
     FileSearcher,
 )
-from core.utils import mktemp_dump, sorted_dict
+from core.utils import sorted_dict
 from core.plugins.rabbitmq import (
     RabbitMQChecksBase,
     RabbitMQServiceChecksBase
@@ -29,16 +27,10 @@ class RabbitMQServiceChecks(RabbitMQServiceChecksBase):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        out = CLIHelper().rabbitmqctl_report()
-        # save to file so we can search it later
-        self.f_report = mktemp_dump(''.join(out))
+        self.report = CLIHelper().rabbitmqctl_report.search_source()
         self.searcher = FileSearcher()
         self.resources = {}
 
-    def __del__(self):
-        if os.path.exists(self.f_report):
-            os.unlink(self.f_report)
-
     def get_running_services_info(self):
         """Get string info for running services."""
         if self.services:
@@ -105,7 +97,7 @@ class RabbitMQServiceChecks(RabbitMQServiceChecksBase):
             }
         }
         for s in self._sequences.values():
-            self.searcher.add_search_term(s["searchdef"], self.f_report)
+            self.searcher.add_search_term(s["searchdef"], self.report)
 
     def _get_vhost_queue_counts(self, section, seq_def):
         vhost = None
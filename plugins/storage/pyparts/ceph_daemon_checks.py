@@ -15,6 +15,8 @@ LP1936136_BCACHE_CACHE_LIMIT = 70
 OSD_PG_MAX_LIMIT = 500
 OSD_PG_OPTIMAL_NUM = 200
 OSD_META_LIMIT_KB = (10 * 1024 * 1024)
+# max utilization of an osd relative to the cluster average
+OSD_UTILIZATION_VAR_LIMIT = 1.2
 
 
 class CephOSDChecks(ceph.CephChecksBase):
@@ -31,7 +33,8 @@ class CephOSDChecks(ceph.CephChecksBase):
         Doc: https://docs.ceph.com/en/latest/dev/mon-osdmap-prune/
         """
 
-        report = self.cli.ceph_report_json_decoded()
+        report = self.cli.ceph_report_json_decoded(
+                                json_pointers=['/osdmap_manifest/pinned_maps'])
         if not report:
             return
 
@@ -51,7 +54,7 @@ class CephOSDChecks(ceph.CephChecksBase):
             return
 
     def check_require_osd_release(self):
-        cluster = ceph.CephCluster()
+        cluster = ceph.get_cluster_snapshot()
         expected_rname = cluster.daemon_dump('osd').get('require_osd_release')
         if not expected_rname:
             return
@@ -73,25 +76,8 @@ class CephOSDChecks(ceph.CephChecksBase):
             """ v2 only available for >= Nautilus. """
             return
 
-        v1_osds = []
-        cluster = ceph.CephCluster()
-        osd_dump = cluster.daemon_dump('osd')
-        if not osd_dump:
-            return
-
-        osd_count = int(cluster.daemon_dump('osd').get('max_osd', 0))
-        if osd_count < 1:
-            return
-
-        counter = 0
-        while counter < osd_count:
-            key = "osd.{}".format(counter)
-            version_info = cluster.daemon_dump('osd').get(key)
-            if version_info and version_info.find("v2:") == -1:
-                v1_osds.append(counter+1)
-
-            counter = counter + 1
-
+        osds = ceph.get_cluster_snapshot().osd_dump_entries
+        v1_osds = [osd.id for osd in osds.values() if not osd.msgr_v2]
         if v1_osds:
             msg = ("{} OSDs do not bind to v2 address".format(len(v1_osds)))
             issue_utils.add_issue(issue_types.CephOSDWarning(msg))
@@ -100,19 +86,14 @@ class CephOSDChecks(ceph.CephChecksBase):
         """
         Check if the BlueFS metadata size is too large
         """
-        bad_meta_osds = []
-        ceph_osd_df_tree = self.cli.ceph_osd_df_tree_json_decoded()
-        if not ceph_osd_df_tree:
+        osds = ceph.get_cluster_snapshot().osd_table
+        if not osds:
             return
 
-        for device in ceph_osd_df_tree['nodes']:
-            if device['id'] >= 0:
-                meta_kb = device['kb_used_meta']
-                # Usually the meta data is expected to be in 0-4G range
-                # and we check if it's over 10G
-                if meta_kb > OSD_META_LIMIT_KB:
-                    bad_meta_osds.append(device['name'])
-
+        # Usually the meta data is expected to be in 0-4G range and we check
+        # if it's over 10G
+        rows = osds.select('kb_used_meta', lambda kb: kb > OSD_META_LIMIT_KB)
+        bad_meta_osds = [osds.names[row] for row in rows]
         if bad_meta_osds:
             msg = ("{} OSDs have metadata size larger than 10G. This "
                    "indicates compaction failure/bug. Possibly affected by "
@@ -122,6 +103,25 @@ class CephOSDChecks(ceph.CephChecksBase):
                    .format(bad_meta_osds))
             issue_utils.add_issue(issue_types.CephOSDWarning(msg))
 
+    def check_osd_utilization_variance(self):
+        """
+        Check for OSDs that are considerably more utilized than the cluster
+        average since they will become full before the rest of the cluster.
+        """
+        osds = ceph.get_cluster_snapshot().osd_table
+        if not osds:
+            return
+
+        rows = osds.select('var', lambda var: var > OSD_UTILIZATION_VAR_LIMIT)
+        if rows:
+            msg = ("{} osds found with utilization more than {}% above the "
+                   "cluster average ({}) - data distribution may be skewed, "
+                   "please check the balancer/crush weights".
+                   format(len(rows),
+                          int(round((OSD_UTILIZATION_VAR_LIMIT - 1) * 100)),
+                          [osds.names[row] for row in rows]))
+            issue_utils.add_issue(issue_types.CephOSDWarning(msg))
+
     def get_ceph_pg_imbalance(self):
         """ Validate PG counts on OSDs
 
@@ -132,23 +132,17 @@ class CephOSDChecks(ceph.CephChecksBase):
         We also check for OSDs with excessive numbers of PGs that can cause
         them to fail.
         """
-        suboptimal_pgs = {}
-        error_pgs = {}
-        ceph_osd_df_tree = self.cli.ceph_osd_df_tree_json_decoded()
-        if not ceph_osd_df_tree:
+        osds = ceph.get_cluster_snapshot().osd_table
+        if not osds:
             return
 
-        for device in ceph_osd_df_tree['nodes']:
-            if device['id'] >= 0:
-                osd_id = device['name']
-                pgs = device['pgs']
-                if pgs > OSD_PG_MAX_LIMIT:
-                    error_pgs[osd_id] = pgs
+        def suboptimal(pgs):
+            # allow 30% margin from optimal OSD_PG_OPTIMAL_NUM value
+            return abs(100 - (100.0 / OSD_PG_OPTIMAL_NUM * pgs)) > 30
 
-                margin = abs(100 - (100.0 / OSD_PG_OPTIMAL_NUM * pgs))
-                # allow 30% margin from optimal OSD_PG_OPTIMAL_NUM value
-                if margin > 30:
-                    suboptimal_pgs[osd_id] = pgs
+        error_pgs = osds.by_name('pgs', osds.select(
+                                    'pgs', lambda pgs: pgs > OSD_PG_MAX_LIMIT))
+        suboptimal_pgs = osds.by_name('pgs', osds.select('pgs', suboptimal))
 
         if error_pgs:
             info = sorted_dict(error_pgs, key=lambda e: e[1], reverse=True)
@@ -180,7 +174,7 @@ class CephOSDChecks(ceph.CephChecksBase):
         """
         Get versions of all Ceph daemons.
         """
-        versions = ceph.CephCluster().daemon_versions()
+        versions = ceph.get_cluster_snapshot().daemon_versions()
         if not versions:
             return
 
@@ -227,51 +221,17 @@ class CephOSDChecks(ceph.CephChecksBase):
                     issue = issue_types.CephDaemonVersionsError(msg)
                     issue_utils.add_issue(issue)
 
-    def _build_buckets_from_crushdump(self, crushdump):
-        buckets = {}
-        # iterate jp for each bucket
-        for bucket in crushdump["buckets"]:
-            bid = bucket["id"]
-            items = []
-            for item in bucket["items"]:
-                items.append(item["id"])
-
-            buckets[bid] = {"name": bucket["name"],
-                            "type_id": bucket["type_id"],
-                            "type_name": bucket["type_name"],
-                            "items": items}
-
-        return buckets
-
     def get_crushmap_mixed_buckets(self):
         """
         Report buckets that have mixed type of items,
         as they will cause crush map unable to compute
         the expected up set
         """
-        osd_crush_dump = self.cli.ceph_osd_crush_dump_json_decoded()
-        if not osd_crush_dump:
+        buckets = ceph.get_cluster_snapshot().crush_buckets
+        if not buckets:
             return
 
-        bad_buckets = []
-        buckets = self._build_buckets_from_crushdump(osd_crush_dump)
-        # check all bucket
-        for bid in buckets:
-            items = buckets[bid]["items"]
-            type_ids = []
-            for item in items:
-                if item >= 0:
-                    type_ids.append(0)
-                else:
-                    type_ids.append(buckets[item]["type_id"])
-
-            if not type_ids:
-                continue
-
-            # verify if the type_id list contain mixed type id
-            if type_ids.count(type_ids[0]) != len(type_ids):
-                bad_buckets.append(buckets[bid]["name"])
-
+        bad_buckets = buckets.mixed_type_buckets()
         if bad_buckets:
             msg = ("mixed crush bucket types identified in buckets '{}'. "
                    "This can cause data distribution to become skewed - "
@@ -339,6 +299,7 @@ class CephOSDChecks(ceph.CephChecksBase):
         self.check_require_osd_release()
         self.check_osd_msgr_protocol_versions()
         self.check_ceph_bluefs_size()
+        self.check_osd_utilization_variance()
         self.get_ceph_pg_imbalance()
         self.get_ceph_versions_mismatch()
         self.get_crushmap_mixed_buckets()
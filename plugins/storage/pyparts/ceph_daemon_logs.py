@@ -1,67 +1,72 @@
 import re
 
+from collections import Counter
+
 from core.issues import issue_types, issue_utils
 from core.checks import CallbackHelper
 from core.plugins.storage.ceph import CephEventChecksBase
+from core.searchtools import CountBy
 
 YAML_PRIORITY = 2
 EVENTCALLBACKS = CallbackHelper()
+OSD_LOG_EXPR = re.compile(r'.+ceph-osd\.(\d+)\.log')
+
+
+def osd_from_source(path):
+    """ Return osd name e.g. osd.1 if path is an osd log otherwise None. """
+    ret = OSD_LOG_EXPR.match(path)
+    if ret:
+        return "osd.{}".format(ret.group(1))
 
 
 class CephDaemonLogChecks(CephEventChecksBase):
 
     def __init__(self):
+        # events counted by date and, if available, resource. Osd logs are
+        # each searched in their own worker and events that do not identify
+        # the osd in the log line get it from the log path.
+        aggregates = {'osd-reported-failed': CountBy(groups=[1, 2]),
+                      'mon-elections-called': CountBy(groups=[1, 2]),
+                      'heartbeat-no-reply': CountBy(groups=[1, 2]),
+                      'crc-err-bluestore':
+                          CountBy(groups=[1], source_key=osd_from_source),
+                      'crc-err-rocksdb':
+                          CountBy(groups=[1], source_key=osd_from_source),
+                      'long-heartbeat-pings':
+                          CountBy(groups=[1], source_key=osd_from_source)}
         super().__init__(yaml_defs_group='ceph',
-                         callback_helper=EVENTCALLBACKS)
+                         callback_helper=EVENTCALLBACKS,
+                         event_aggregates=aggregates)
 
-    def get_timings(self, results, group_by_resource=False,
-                    resource_osd_from_source=False):
+    def get_timings(self, counts, group_by_resource=False):
         """
-        @param results: list of search results. Each result must contain a
-        timestamp as the first group and optional a resource name as a
-        second group. If timestamp only we return a list with a count of number
-        of times an event occurred per timestamp. If resource is available we
-        provide per-resource counts for each timestamp.
+        @param counts: dict of Counter objects keyed by search path. Each
+        Counter is keyed by a tuple containing a timestamp and optionally a
+        resource name. If timestamp only we return a list with a count of
+        number of times an event occurred per timestamp. If resource is
+        available we provide per-resource counts for each timestamp.
         @param group_by_resource: if resource is available group results by
         resource instead of by timestamp.
-        @param resource_osd_from_source: extract osd id from search path and
-                                         use that as resource.
         """
-        if not results:
+        if not counts:
             return
 
-        info = {}
-        c_expr = re.compile(r'.+ceph-osd\.(\d+)\.log')
-        for result in sorted(results, key=lambda r: r.get(1)):
-            date = result.get(1)
-            resource = result.get(2)
-            if resource_osd_from_source:
-                ret = re.compile(c_expr).match(result.source)
-                if ret:
-                    resource = "osd.{}".format(ret.group(1))
+        merged = Counter()
+        for counter in counts.values():
+            merged.update(counter)
 
+        info = {}
+        for key in sorted(merged):
+            date = key[0]
+            count = merged[key]
+            resource = key[1] if len(key) > 1 else None
             if resource:
                 if group_by_resource:
-                    if resource not in info:
-                        info[resource] = {date: 1}
-                    else:
-                        if date in info[resource]:
-                            info[resource][date] += 1
-                        else:
-                            info[resource][date] = 1
+                    info.setdefault(resource, {})[date] = count
                 else:
-                    if date not in info:
-                        info[date] = {resource: 1}
-                    else:
-                        if resource in info[date]:
-                            info[date][resource] += 1
-                        else:
-                            info[date][resource] = 1
+                    info.setdefault(date, {})[resource] = count
             else:
-                if date not in info:
-                    info[date] = 1
-                else:
-                    info[date] += 1
+                info[date] = count
 
         return info
 
@@ -80,17 +85,17 @@ class CephDaemonLogChecks(CephEventChecksBase):
 
     @EVENTCALLBACKS.callback
     def osd_reported_failed(self, event):
-        return self.get_timings(event.results,
+        return self.get_timings(event.counts,
                                 group_by_resource=True)
 
     @EVENTCALLBACKS.callback
     def mon_elections_called(self, event):
-        return self.get_timings(event.results,
+        return self.get_timings(event.counts,
                                 group_by_resource=True)
 
-    def _get_crc_errors(self, results, osd_type):
-        if results:
-            ret = self.get_timings(results, resource_osd_from_source=True)
+    def _get_crc_errors(self, counts, osd_type):
+        if counts:
+            ret = self.get_timings(counts)
 
             # If on any particular day there were > 3 crc errors for a
             # particular osd we raise an issue since that indicates they are
@@ -122,17 +127,16 @@ class CephDaemonLogChecks(CephEventChecksBase):
 
     @EVENTCALLBACKS.callback
     def crc_err_bluestore(self, event):
-        return self._get_crc_errors(event.results, 'bluestore')
+        return self._get_crc_errors(event.counts, 'bluestore')
 
     @EVENTCALLBACKS.callback
     def crc_err_rocksdb(self, event):
-        return self._get_crc_errors(event.results, 'rocksdb')
+        return self._get_crc_errors(event.counts, 'rocksdb')
 
     @EVENTCALLBACKS.callback
     def long_heartbeat_pings(self, event):
-        return self.get_timings(event.results,
-                                resource_osd_from_source=True)
+        return self.get_timings(event.counts)
 
     @EVENTCALLBACKS.callback
     def heartbeat_no_reply(self, event):
-        return self.get_timings(event.results)
+        return self.get_timings(event.counts)
@@ -1,12 +1,14 @@
 import os
 
 import datetime
+import statistics
 import tempfile
 
+import mock
 import utils
 
 from core import analytics
-from core.searchtools import FileSearcher, SearchDef
+from core.searchtools import FileSearcher, SearchDef, SearchSource
 
 
 SEQ_TEST_1 = """2021-07-19 09:01:58.498 iteration:0 start
@@ -45,6 +47,18 @@ SEQ_TEST_5 = """2021-07-19 09:01:58.498 iteration:0 start
 2021-07-19 09:07:58.498 iteration:0 end
 """
 
+SEQ_TEST_7 = """2021-07-19 09:00:00.000 iteration:0 start
+2021-07-19 09:01:40.000 iteration:0 end
+2021-07-19 09:02:00.000 iteration:0 start
+2021-07-19 09:03:30.000 iteration:0 end
+2021-07-19 09:04:00.000 iteration:1 start
+2021-07-19 09:04:10.000 iteration:1 end
+2021-07-19 09:05:00.000 iteration:0 start
+2021-07-19 09:06:20.000 iteration:0 end
+2021-07-19 09:07:00.000 iteration:2 start
+2021-07-19 09:07:20.000 iteration:2 end
+"""
+
 SEQ_TEST_6 = """2021-07-19 09:01:58.498 iteration:0 start
 2021-07-19 09:03:58.498 iteration:1 start
 2021-07-19 09:04:58.498 iteration:1 end
@@ -238,3 +252,137 @@ class TestAnalytics(utils.BaseTestCase):
         expected = {'avg': 60.0, 'incomplete': 2, 'max': 60.0, 'min': 60.0,
                     'samples': 2, 'stdev': 0.0}
         self.assertEqual(stats, expected)
+
+    def test_ordered_multiple_streaming(self):
+        start0 = datetime.datetime(2021, 7, 19, 9, 5, 58, 498000)
+        end0 = datetime.datetime(2021, 7, 19, 9, 7, 58, 498000)
+        start1 = datetime.datetime(2021, 7, 19, 9, 3, 58, 498000)
+        end1 = datetime.datetime(2021, 7, 19, 9, 4, 58, 498000)
+        expected = {'0': {'duration': 120.0,
+                          'start': start0, 'end': end0},
+                    '1': {'duration': 60.0, 'start': start1, 'end': end1}}
+        source = SearchSource('seq-test-6', SEQ_TEST_6)
+        s = FileSearcher()
+        expr = r'^([0-9\-]+) (\S+) iteration:([0-9]+) start'
+        s.add_search_term(SearchDef(expr, tag="eventX-start"), path=source)
+        expr = r'^([0-9\-]+) (\S+) iteration:([0-9]+) end'
+        s.add_search_term(SearchDef(expr, tag="eventX-end"), path=source)
+        events = analytics.LogEventStats(s.search(), "eventX",
+                                         streaming=True)
+        events.run()
+        top5 = events.get_top_n_events_sorted(5)
+        self.assertEqual(top5, expected)
+        stats = events.get_event_stats()
+        # every complete iteration is a sample
+        expected = {'avg': 80.0, 'incomplete': 2, 'max': 120.0, 'min': 60.0,
+                    'samples': 3, 'stdev': 28.28}
+        self.assertEqual(stats, expected)
+
+    def test_top_n_streaming_reused_ids(self):
+        source = SearchSource('seq-test-7', SEQ_TEST_7)
+        s = FileSearcher()
+        expr = r'^([0-9\-]+) (\S+) iteration:([0-9]+) start'
+        s.add_search_term(SearchDef(expr, tag="eventX-start"), path=source)
+        expr = r'^([0-9\-]+) (\S+) iteration:([0-9]+) end'
+        s.add_search_term(SearchDef(expr, tag="eventX-end"), path=source)
+        events = analytics.LogEventStats(s.search(), "eventX",
+                                         streaming=True, max_top_n=2)
+        events.run()
+        # the longest three events all have the same id but two distinct
+        # events must still be returned.
+        top = events.get_top_n_events_sorted(2)
+        self.assertEqual({k: v['duration'] for k, v in top.items()},
+                         {'0': 100.0, '2': 20.0})
+        top = events.get_top_n_events_sorted(2, reverse=False)
+        self.assertEqual({k: v['duration'] for k, v in top.items()},
+                         {'1': 10.0, '2': 20.0})
+        self.assertEqual(events.get_event_stats()['samples'], 5)
+
+    def test_online_stats(self):
+        values = [5.59, 2.68, 1.23, 2.33, 0.5]
+        stats = analytics.OnlineStats()
+        top = analytics.TopN(2)
+        for value in values:
+            stats.add(value)
+            top.add(value, value)
+
+        self.assertEqual(round(stats.mean, 6),
+                         round(statistics.mean(values), 6))
+        self.assertEqual(round(stats.pstdev, 6),
+                         round(statistics.pstdev(values), 6))
+        self.assertEqual((stats.min, stats.max), (0.5, 5.59))
+        self.assertEqual(top.items(), [5.59, 2.68])
+
+        top = analytics.TopN(2, reverse=False)
+        for uid, value in [('a', 3), ('a', 1), ('b', 2), ('a', 0.5),
+                           ('c', 4), ('b', 5)]:
+            top.add(value, (uid, value), uid=uid)
+
+        self.assertEqual(top.items(), [('a', 0.5), ('b', 2)])
+
+    def test_event_collection(self):
+        start0 = datetime.datetime(2021, 7, 19, 9, 1, 58)
+        start1 = datetime.datetime(2021, 7, 19, 9, 3, 58)
+        end0 = datetime.datetime(2021, 7, 19, 9, 4, 58)
+        events = analytics.EventCollection()
+        # add out of order
+        events.add_event_start('0', start1, metadata='b')
+        events.add_event_end('0', end0)
+        events.add_event_start('0', start0, metadata='a')
+        events.add_event_start('0', end0 + datetime.timedelta(seconds=1))
+        events.calculate_event_deltas()
+        complete = events.complete_events
+        self.assertEqual(complete, {'0': {'start': start1, 'end': end0,
+                                          'duration': 60.0,
+                                          'metadata': 'b'}})
+        self.assertTrue(events.complete_events is complete)
+        self.assertEqual(len(events.incomplete_events['0']), 2)
+        events.add_event_end('1', end0)
+        self.assertFalse(events.complete_events is complete)
+
+    def test_parse_timestamp(self):
+        for day, secs in [("2021-07-19", "09:01:58.498"),
+                          ("2021-07-19", "09:01:58.123456"),
+                          ("2021-07-19", "9:01:58.4")]:
+            self.assertEqual(analytics.parse_timestamp(day, secs),
+                             datetime.datetime.strptime(
+                                "{} {}".format(day, secs),
+                                "%Y-%m-%d %H:%M:%S.%f"))
+
+        self.assertEqual(analytics.parse_timestamp("Jul 19", "09:01:58",
+                                                   date_format="%b %d"),
+                         datetime.datetime(1900, 7, 19, 9, 1, 58))
+        with self.assertRaises(ValueError):
+            analytics.parse_timestamp("2021-07-19", "09:01:5x")
+
+    def test_duration_analytics(self):
+        dists = analytics.DurationAnalytics()
+        self.assertEqual(dists.percentiles(), {})
+        self.assertEqual(dists.outliers(), 0)
+        start = datetime.datetime(2021, 7, 19, 9, 1, 58)
+        for i, duration in enumerate([1, 2, 3, 4, 5, 6, 7, 8, 9, 100]):
+            dists.add(start + datetime.timedelta(minutes=i * 10), duration)
+
+        self.assertEqual(dists.samples, 10)
+        self.assertEqual(dists.percentiles(),
+                         {'p50': 5.5, 'p90': 18.1, 'p99': 91.81})
+        self.assertEqual(dists.outliers(), 1)
+        self.assertEqual(dists.hourly(),
+                         {'2021-07-19 09:00': {'samples': 6, 'p90': 5.5},
+                          '2021-07-19 10:00': {'samples': 4, 'p90': 72.7}})
+
+    def test_duration_analytics_no_numpy(self):
+        # results must not depend on whether numpy is available
+        dists = analytics.DurationAnalytics()
+        start = datetime.datetime(2021, 7, 19, 9, 1, 58)
+        for i in range(500):
+            dists.add(start + datetime.timedelta(seconds=i * 37),
+                      ((i * 7919) % 1000) / 7.0)
+
+        def results():
+            return (dists.percentiles((1, 25, 50, 75, 90, 99, 99.9)),
+                    dists.outliers(), dists.hourly(), dists.hourly(q=99))
+
+        expected = results()
+        with mock.patch.object(analytics, 'numpy', None):
+            self.assertEqual(results(), expected)
@@ -81,3 +81,11 @@ class TestChecks(utils.BaseTestCase):
             obj = checks.PackageBugChecksBase('ussuri', pkg_info)
             obj()
             self.assertFalse(mock_add_known_bug.called)
+
+    def test_ServiceChecksBase(self):
+        exprs = [r"ceph-[a-z0-9-]+", r"rados[a-z0-9-]+"]
+        obj = checks.ServiceChecksBase(exprs)
+        self.assertEqual(obj.get_service_info_str(),
+                         ['ceph-crash (1)', 'ceph-osd (1)'])
+        other = checks.ServiceChecksBase(exprs)
+        self.assertTrue(other.service_matcher is obj.service_matcher)
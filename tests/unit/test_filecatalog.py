@@ -0,0 +1,97 @@
+import glob
+import os
+import tempfile
+
+import utils
+
+from core import (
+    constants,
+    filecatalog,
+)
+
+
+class TestFileCatalog(utils.BaseTestCase):
+
+    def test_get_catalog(self):
+        catalog = filecatalog.get_catalog()
+        self.assertTrue(filecatalog.get_catalog() is catalog)
+        self.assertTrue(catalog.covers(constants.DATA_ROOT))
+        self.assertFalse(catalog.covers('/etc/hosts'))
+
+    def test_get_catalog_localhost(self):
+        os.environ['DATA_ROOT'] = '/'
+        self.assertIsNone(filecatalog.get_catalog())
+
+    def test_lookups(self):
+        path = os.path.join(constants.DATA_ROOT, 'sos_commands/kernel')
+        self.assertTrue(filecatalog.isdir(path))
+        self.assertFalse(filecatalog.isfile(path))
+        self.assertTrue(filecatalog.isfile(os.path.join(path, 'uname_-a')))
+        self.assertFalse(filecatalog.exists(os.path.join(path, 'nothere')))
+        # symlinked directories are followed
+        path = os.path.join(constants.DATA_ROOT,
+                            'sos_commands/snappy/snap_list_--all')
+        self.assertTrue(filecatalog.isfile(path))
+        entry = filecatalog.get_catalog().get(path)
+        self.assertEqual(entry.size, os.path.getsize(path))
+
+    def test_glob(self):
+        for pattern in ['var/log/*', 'sos_commands/*/uname*',
+                        'sos_commands/process/ps_axo_flags_*']:
+            pattern = os.path.join(constants.DATA_ROOT, pattern)
+            self.assertEqual(sorted(filecatalog.glob_paths(pattern)),
+                             sorted(glob.glob(pattern)))
+
+    def test_symlinked_dirs_scanned_once(self):
+        with tempfile.TemporaryDirectory() as dtmp:
+            # sysfs-like graph where every device links to all the others
+            devices = os.path.join(dtmp, 'devices')
+            names = ['eth{}'.format(i) for i in range(10)]
+            for name in names:
+                os.makedirs(os.path.join(devices, name))
+                with open(os.path.join(devices, name, 'address'), 'w'):
+                    pass
+
+            for name in names:
+                for peer in names:
+                    os.symlink(os.path.join('..', peer),
+                               os.path.join(devices, name, 'lower_' + peer))
+
+            os.makedirs(os.path.join(dtmp, 'class'))
+            os.symlink('../devices', os.path.join(dtmp, 'class', 'net'))
+            os.makedirs(os.path.join(dtmp, 'unrelated/subdir'))
+            catalog = filecatalog.FileCatalog(dtmp)
+            # nothing is scanned until it is looked up
+            self.assertEqual(catalog._listings, {})
+            path = os.path.join(dtmp, 'class/net/eth1/lower_eth2/address')
+            self.assertTrue(catalog.isfile(path))
+            self.assertTrue(catalog.isdir(os.path.dirname(path)))
+            self.assertFalse(catalog.exists(os.path.join(
+                                            os.path.dirname(path), 'nothere')))
+            self.assertEqual(sorted(catalog.listdir(os.path.dirname(path))),
+                             sorted(os.listdir(os.path.dirname(path))))
+            pattern = os.path.join(dtmp, 'class/net/*/lower_eth3/addr*')
+            self.assertEqual(sorted(catalog.glob(pattern)),
+                             sorted(glob.glob(pattern)))
+            # root, class, devices (also as class/net) and each device
+            self.assertEqual(len(catalog._listings), 3 + 10)
+            self.assertFalse(os.path.join(dtmp, 'unrelated') in
+                             catalog._dirs)
+
+    def test_dangling_symlink(self):
+        with tempfile.TemporaryDirectory() as dtmp:
+            os.symlink('nothere', os.path.join(dtmp, 'dangling'))
+            os.symlink('/dev/null', os.path.join(dtmp, 'null'))
+            catalog = filecatalog.FileCatalog(dtmp)
+            for name in ['dangling', 'null', 'dangling/x', 'null/x']:
+                path = os.path.join(dtmp, name)
+                self.assertEqual(catalog.exists(path), os.path.exists(path))
+                self.assertEqual(catalog.isfile(path), os.path.isfile(path))
+                self.assertEqual(catalog.isdir(path), os.path.isdir(path))
+
+            self.assertEqual(sorted(catalog.listdir(dtmp)),
+                             sorted(os.listdir(dtmp)))
+            for name in ['dangling', '*', 'dang*']:
+                pattern = os.path.join(dtmp, name)
+                self.assertEqual(sorted(catalog.glob(pattern)),
+                                 sorted(glob.glob(pattern)))
@@ -39,6 +39,33 @@ class TestCLIHelpers(utils.BaseTestCase):
         self.assertEquals(ret, out)
         self.assertFalse(mock_subprocess.called)
 
+    @mock.patch.object(cli_helpers, 'subprocess')
+    def test_ps_iter_lines(self, mock_subprocess):
+        ret = self.helper.ps.iter_lines()
+        self.assertEquals(list(ret), self.helper.ps())
+        path = os.path.join(os.environ["DATA_ROOT"], "ps")
+        self.assertEquals(self.helper.ps.search_source(), path)
+        self.assertFalse(mock_subprocess.called)
+
+    def test_search_source_not_found(self):
+        source = self.helper.udevadm_info_exportdb.search_source()
+        self.assertEquals(source.name, 'udevadm_info_exportdb')
+        self.assertEquals(list(source), [])
+
+    @mock.patch.object(cli_helpers, 'get_sosreport_tz')
+    @mock.patch.object(cli_helpers, 'stream_cmd_lines')
+    @mock.patch.object(cli_helpers, 'subprocess')
+    def test_bin_file_cmd_tz(self, mock_subprocess, mock_stream, mock_tz):
+        mock_tz.return_value = 'UTC'
+        mock_subprocess.check_output.return_value = b"foo\n"
+        mock_stream.return_value = iter(["foo\n"])
+        cmd = cli_helpers.BinFileCmd('ps')
+        self.assertEquals(cmd(), ["foo\n"])
+        self.assertEquals(list(cmd.iter_lines()), ["foo\n"])
+        for call in [mock_subprocess.check_output.call_args,
+                     mock_stream.call_args]:
+            self.assertEquals(call[1]['env'], {'TZ': 'UTC'})
+
     def test_get_date_local(self):
         os.environ['DATA_ROOT'] = '/'
         helper = cli_helpers.CLIHelper()
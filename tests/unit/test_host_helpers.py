@@ -1,6 +1,14 @@
+import os
+
+import mock
 import utils
 
-from core.host_helpers import HostNetworkingHelper
+from core import host_helpers
+from core.host_helpers import (
+    HostNetworkingHelper,
+    get_network_topology,
+    get_process_table,
+)
 
 
 class TestHostHelpers(utils.BaseTestCase):
@@ -47,6 +55,44 @@ class TestHostHelpers(utils.BaseTestCase):
         iface = helper.get_interface_with_addr('10.0.0.49')
         self.assertEqual(iface.to_dict(), expected)
 
+    def test_get_interface_with_network(self):
+        helper = HostNetworkingHelper()
+        self.assertTrue(helper.topology is HostNetworkingHelper().topology)
+        iface = helper.get_interface_with_addr('10.0.0.0/24')
+        self.assertEqual(iface.name, 'br-ens3')
+        # only found in a namespace
+        iface = helper.get_interface_with_addr('10.100.0.0/24')
+        self.assertEqual(iface.name, 'fg-7450b342-b1')
+        iface = helper.get_interface_with_hwaddr('fa:16:3e:8c:e7:10')
+        self.assertEqual(iface.name, 'fg-7450b342-b1')
+        self.assertIsNone(helper.get_interface_with_addr('10.0.0.4'))
+        self.assertIsNone(helper.get_interface_with_addr('a.host.name'))
+        self.assertFalse(helper.host_interface_exists('fg-7450b342-b1',
+                                                      check_namespaces=False))
+        self.assertTrue(helper.host_interface_exists('fg-7450b342-b1'))
+
+    @mock.patch.dict(os.environ, {'MAX_PARALLEL_TASKS': '1'})
+    def test_get_interface_namespaces_lazy(self):
+        topology = get_network_topology()
+        self.assertEqual(len(topology.namespaces), 4)
+        iface = topology.get_interface_with_name('fg-7450b342-b1')
+        self.assertEqual(iface.name, 'fg-7450b342-b1')
+        # only the first namespace needed to be loaded
+        self.assertEqual(len(topology._ns_interfaces), 1)
+        self.assertIsNone(topology.get_interface_with_name('notexist'))
+        self.assertEqual(len(topology._ns_interfaces), 4)
+
+    @mock.patch.dict(os.environ, {'MAX_PARALLEL_TASKS': '2'})
+    def test_get_interface_namespaces_parallel(self):
+        with mock.patch.object(host_helpers, 'CLIHelper',
+                               wraps=host_helpers.CLIHelper) as mock_cli:
+            topology = host_helpers.NetworkTopology()
+            self.assertEqual(len(topology.namespaces), 4)
+            self.assertIsNone(topology.get_interface_with_name('notexist'))
+            self.assertEqual(len(topology._ns_interfaces), 4)
+            # helpers are reused across namespaces
+            self.assertLessEqual(mock_cli.call_count, 1 + 2)
+
     def test_get_interface_stats(self):
         expected = {'rx': {'dropped': 131579,
                            'errors': 0,
@@ -58,3 +104,14 @@ class TestHostHelpers(utils.BaseTestCase):
         helper = HostNetworkingHelper()
         iface = helper.get_interface_with_addr('10.0.0.49')
         self.assertEqual(iface.stats, expected)
+
+    def test_get_process_table(self):
+        ps = get_process_table()
+        self.assertTrue(get_process_table() is ps)
+        procs = ps.find('ceph-osd', '--id', '0')
+        self.assertEqual([p.pid for p in procs], [73392])
+        self.assertEqual(procs[0].rss, 654608)
+        self.assertEqual(procs[0].get_arg('--cluster'), 'ceph')
+        self.assertEqual(ps.find('ceph-osd', '--id', '1'), [])
+        # interpreted scripts are also indexed by script name
+        self.assertTrue('jujud-machine-1-exec-start.sh' in ps.binaries)
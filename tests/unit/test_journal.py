@@ -0,0 +1,54 @@
+import os
+
+import utils
+
+from core import (
+    cli_helpers,
+    constants,
+    journal,
+)
+
+JOURNAL_DIR = 'var/log/journal'
+
+
+class TestJournal(utils.BaseTestCase):
+
+    def _reader(self, **kwargs):
+        path = os.path.join(constants.DATA_ROOT, JOURNAL_DIR)
+        return journal.JournalReader(path, **kwargs)
+
+    def test_read(self):
+        lines = list(self._reader())
+        self.assertEqual(len(lines), 23)
+        self.assertEqual(lines[2], "2021-08-02T08:55:01+0000 compute4 "
+                                   "neutron-l3-agent[17807]: Starting "
+                                   "neutron-l3-agent\n")
+
+    def test_read_unit(self):
+        lines = list(self._reader(unit='neutron-l3-agent'))
+        self.assertEqual(len(lines), 18)
+        self.assertEqual(lines, list(self._reader(
+                                     unit='neutron-l3-agent.service')))
+        self.assertEqual(list(self._reader(unit='nosuchunit')), [])
+
+    def test_read_since(self):
+        lines = list(self._reader(since='2021-08-03'))
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[0].startswith("2021-08-03T03:12:50+0000"))
+        lines = list(self._reader(unit='neutron-l3-agent',
+                                  since='2021-08-02 17:00:00'))
+        self.assertEqual(len(lines), 7)
+        self.assertTrue(lines[0].startswith("2021-08-02T17:02:09+0000"))
+
+    def test_format_bytes(self):
+        self.assertEqual(journal.format_bytes(10), '10B')
+        self.assertEqual(journal.format_bytes(1536), '1.5K')
+        self.assertEqual(journal.format_bytes(3 * 1024 ** 2), '3.0M')
+
+    def test_journalctl_cmd(self):
+        cli = cli_helpers.CLIHelper()
+        lines = list(cli.journalctl.iter_lines(unit='neutron-l3-agent',
+                                               date='2021-08-03'))
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(cli.journalctl(unit='neutron-l3-agent',
+                                        date='2021-08-03'), lines)
@@ -0,0 +1,75 @@
+import io
+import json
+import os
+
+import utils
+
+from core import (
+    cli_helpers,
+    constants,
+    jsonstream,
+)
+
+DOC = {"a": {"b": [1, 2, {"c": "x}]\"y"}], "d": 1.5e3},
+       "e": "f/g", "h/i": {"j": None, "k": True},
+       "l": [{"m": 1}], "n": 12345678}
+
+
+class TestJSONStream(utils.BaseTestCase):
+
+    def _reader(self, doc=DOC, trailing='', chunk_size=4):
+        fd = io.StringIO(json.dumps(doc, indent=2) + trailing)
+        return jsonstream.JSONStreamReader(fd, chunk_size=chunk_size)
+
+    def test_decode(self):
+        self.assertEqual(self._reader().decode(), DOC)
+        self.assertEqual(self._reader(trailing='\nreport 1234\n').decode(),
+                         DOC)
+        self.assertEqual(self._reader(doc=1234, chunk_size=2).decode(), 1234)
+
+    def test_extract(self):
+        reader = self._reader(trailing='\nreport 1234\n')
+        self.assertEqual(reader.extract(['/a/d', '/h~1i/j', '/n', '/a/z']),
+                         {'a': {'d': 1.5e3}, 'h/i': {'j': None},
+                          'n': 12345678})
+        self.assertEqual(self._reader().extract(['/a', '/a/d']),
+                         {'a': DOC['a']})
+        self.assertEqual(self._reader().extract(['/l/0/m', '/e']),
+                         {'e': 'f/g'})
+        self.assertEqual(self._reader().extract(['']), DOC)
+
+    def test_extract_chunk_boundaries(self):
+        doc = ('{"x": "abc", "a": 1.25, "c": {"d": 3.5e10, "e": -7E-3}, '
+               '"f": true, "b": 7}')
+        for chunk_size in range(1, len(doc) + 1):
+            reader = jsonstream.JSONStreamReader(io.StringIO(doc),
+                                                 chunk_size=chunk_size)
+            self.assertEqual(reader.extract(['/a', '/c/d', '/c/e', '/f']),
+                             {'a': 1.25, 'c': {'d': 3.5e10, 'e': -7E-3},
+                              'f': True}, "chunk_size={}".format(chunk_size))
+            reader = jsonstream.JSONStreamReader(io.StringIO(doc),
+                                                 chunk_size=chunk_size)
+            self.assertEqual(reader.decode(), json.loads(doc))
+
+    def test_extract_stops_early(self):
+        fd = io.StringIO('{"a": [1, 2], "b": {"c": 1} <not json>')
+        reader = jsonstream.JSONStreamReader(fd)
+        self.assertEqual(reader.extract(['/a']), {'a': [1, 2]})
+
+    def test_extract_invalid(self):
+        reader = jsonstream.JSONStreamReader(io.StringIO('{"a": [1, 2'))
+        with self.assertRaises(json.JSONDecodeError):
+            reader.extract(['/b'])
+
+    def test_ceph_report(self):
+        path = os.path.join(constants.DATA_ROOT,
+                            'sos_commands/ceph/ceph_report')
+        with open(path) as fd:
+            expected = json.loads(fd.read().rpartition('\nreport')[0])
+
+        cli = cli_helpers.CLIHelper()
+        self.assertEqual(cli.ceph_report_json_decoded(), expected)
+        pinned = cli.ceph_report_json_decoded(
+                                json_pointers=['/osdmap_manifest/pinned_maps'])
+        self.assertEqual(pinned, {'osdmap_manifest': {
+            'pinned_maps': expected['osdmap_manifest']['pinned_maps']}})
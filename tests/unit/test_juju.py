@@ -4,7 +4,10 @@ import mock
 
 import utils
 
-from core import checks
+from core import (
+    checks,
+    host_helpers,
+)
 from core import known_bugs_utils
 
 from plugins.juju.pyparts import (
@@ -27,11 +30,9 @@ class TestJujuPluginPartServices(utils.BaseTestCase):
         self.assertTrue(inst.plugin_runnable)
         self.assertEquals(inst.output, expected)
 
-    @mock.patch.object(machines, 'CLIHelper')
-    def test_get_lxd_machine_info(self, mock_cli_helper):
-        mock_helper = mock.MagicMock()
-        mock_cli_helper.return_value = mock_helper
-        mock_helper.ps.return_value = FAKE_PS.split('\n')
+    @mock.patch.object(host_helpers, 'get_process_table')
+    def test_get_lxd_machine_info(self, mock_ps):
+        mock_ps.return_value = host_helpers.ProcessTable(FAKE_PS.split('\n'))
         expected = {'machine': '0-lxd-11',
                     'version': '2.9.9'}
 
@@ -9,6 +9,7 @@ import utils
 from core import checks
 from core.issues import issue_types
 import core.plugins.openstack as openstack_core
+from core.plugins.openstack.exception_scanner import ExceptionSearchDef
 from plugins.openstack.pyparts import (
     openstack_info,
     vm_info,
@@ -35,6 +36,19 @@ SVC_CONF = """
 debug = True
 """
 
+RPC_LOOP_LOG = """
+2021-08-03 10:00:00.000 1 INFO ovs_neutron_agent [-] Agent rpc_loop - iteration:1 started
+2021-08-03 10:00:01.000 1 INFO ovs_neutron_agent [-] Agent rpc_loop - iteration:1 completed. Elapsed:1.000
+2021-08-03 10:00:02.000 1 INFO ovs_neutron_agent [-] Agent rpc_loop - iteration:2 started
+2021-08-03 10:00:05.500 1 INFO ovs_neutron_agent [-] Agent rpc_loop - iteration:2 completed. Elapsed:3.500
+2021-08-03 10:00:06.000 1 INFO ovs_neutron_agent [-] Agent rpc_loop - iteration:3 started
+2021-08-03 11:00:00.000 2 INFO ovs_neutron_agent [-] Agent rpc_loop - iteration:1 started
+2021-08-03 11:00:02.000 2 INFO ovs_neutron_agent [-] Agent rpc_loop - iteration:1 completed. Elapsed:2.000
+2021-08-03 11:00:03.000 2 INFO ovs_neutron_agent [-] Agent rpc_loop - iteration:2 started
+2021-08-03 11:00:03.250 2 INFO ovs_neutron_agent [-] Agent rpc_loop - iteration:2 completed. Elapsed:0.250
+2021-08-03 11:00:04.000 2 INFO ovs_neutron_agent [-] Agent rpc_loop - iteration:3 started
+"""  # noqa
+
 JOURNALCTL_OVS_CLEANUP_GOOD = """
 -- Logs begin at Thu 2021-04-29 17:44:42 BST, end at Thu 2021-05-06 09:05:01 BST. --
 Apr 29 17:52:37 juju-9c28ce-ubuntu-11 systemd[1]: Starting OpenStack Neutron OVS cleanup...
@@ -437,60 +451,55 @@ class TestOpenstackPluginPartAgentChecks(TestOpenstackBase):
     def test_process_rpc_loop_results(self):
         expected = {'rpc-loop': {
                         'top': {
-                            '1329': {
+                            '1': {
                                 'start':
-                                    datetime.datetime(2021, 8, 3, 10, 29, 51,
-                                                      272000),
+                                    datetime.datetime(2021, 8, 3, 11, 0, 0),
                                 'end':
-                                    datetime.datetime(2021, 8, 3, 10, 29, 56,
-                                                      861000),
-                                'duration': 5.59},
-                            '1328': {
+                                    datetime.datetime(2021, 8, 3, 11, 0, 2),
+                                'duration': 2.0},
+                            '2': {
                                 'start':
-                                    datetime.datetime(2021, 8, 3, 10, 29, 48,
-                                                      591000),
+                                    datetime.datetime(2021, 8, 3, 10, 0, 2),
                                 'end':
-                                    datetime.datetime(2021, 8, 3, 10, 29, 51,
-                                                      271000),
-                                'duration': 2.68},
-                            '55': {
-                                'start':
-                                    datetime.datetime(2021, 8, 3, 9, 47, 20,
-                                                      938000),
-                                'end':
-                                    datetime.datetime(2021, 8, 3, 9, 47, 22,
-                                                      166000),
-                                'duration': 1.23},
-                            '41': {
-                                'start':
-                                    datetime.datetime(2021, 8, 3, 9, 46, 52,
-                                                      597000),
-                                'end':
-                                    datetime.datetime(2021, 8, 3, 9, 46, 54,
-                                                      923000),
-                                'duration': 2.33},
-                            '40': {
-                                'start':
-                                    datetime.datetime(2021, 8, 3, 9, 46, 50,
-                                                      151000),
-                                'end':
-                                    datetime.datetime(2021, 8, 3, 9, 46, 52,
-                                                      596000),
-                                'duration': 2.44}},
+                                    datetime.datetime(2021, 8, 3, 10, 0, 5,
+                                                      500000),
+                                'duration': 3.5}},
                         'stats': {
-                            'min': 0.0,
-                            'max': 5.59,
-                            'stdev': 0.2,
-                            'avg': 0.02,
-                            'samples': 1389,
-                            'incomplete': 2}
+                            'min': 0.25,
+                            'max': 3.5,
+                            'stdev': 1.22,
+                            'avg': 1.69,
+                            # iteration ids restart with the agent and every
+                            # complete iteration is counted.
+                            'samples': 4,
+                            # one superseded by the restart and one still
+                            # running.
+                            'incomplete': 2},
+                        'distribution': {
+                            'p50': 1.5,
+                            'p90': 3.05,
+                            'p99': 3.46,
+                            'outliers': 0,
+                            'hourly': {
+                                '2021-08-03 10:00': {'samples': 2,
+                                                     'p90': 3.25},
+                                '2021-08-03 11:00': {'samples': 2,
+                                                     'p90': 1.82}}}
                         }
                     }
-        group_key = "neutron-agent-checks"
-        section_key = "neutron-ovs-agent"
-        c = agent_checks.NeutronAgentEventChecks(yaml_defs_group=group_key)
-        c()
-        self.assertEqual(c.output.get(section_key), expected)
+        with tempfile.TemporaryDirectory() as dtmp:
+            path = os.path.join(dtmp, 'var/log/neutron',
+                                'neutron-openvswitch-agent.log')
+            os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as fd:
+                fd.write(RPC_LOOP_LOG)
+
+            os.environ["DATA_ROOT"] = dtmp
+            group_key = "neutron-agent-checks"
+            section_key = "neutron-ovs-agent"
+            c = agent_checks.NeutronAgentEventChecks(yaml_defs_group=group_key)
+            c()
+            self.assertEqual(c.output.get(section_key), expected)
 
     @mock.patch('core.checks.add_known_bug')
     def test_get_agents_bugs(self, mock_add_known_bug):
@@ -572,7 +581,17 @@ class TestOpenstackPluginPartAgentChecks(TestOpenstackBase):
                             'max': 25.08,
                             'stdev': 5.88,
                             'avg': 15.43,
-                            'samples': 8}
+                            'samples': 8},
+                        'distribution': {
+                            'p50': 14.14,
+                            'p90': 24.11,
+                            'p99': 24.98,
+                            'outliers': 0,
+                            'hourly': {
+                                '2021-08-02 21:00': {'samples': 6,
+                                                     'p90': 24.39},
+                                '2021-08-03 09:00': {'samples': 2,
+                                                     'p90': 15.19}}}
                         },
                     'router-spawn-events': {
                         'top': {
@@ -585,7 +604,15 @@ class TestOpenstackPluginPartAgentChecks(TestOpenstackBase):
                             'max': 19.55,
                             'stdev': 0.0,
                             'avg': 19.55,
-                            'samples': 1}
+                            'samples': 1},
+                        'distribution': {
+                            'p50': 19.55,
+                            'p90': 19.55,
+                            'p99': 19.55,
+                            'outliers': 0,
+                            'hourly': {
+                                '2021-08-03 09:00': {'samples': 1,
+                                                     'p90': 19.55}}}
                         }
                     }
         group_key = "neutron-agent-checks"
@@ -693,6 +720,25 @@ class TestOpenstackPluginPartAgentExceptions(TestOpenstackBase):
         inst()
         self.assertEqual(inst.output['agent-exceptions'], expected)
 
+    def test_exception_search_def(self):
+        template = r"^([0-9\-]+) (\S+) .+\S+\s((?:\S+\.)?{})[\s:\.]"
+        names = ['Timeout', 'MessagingTimeout', 'AMQP server on .+ is down']
+        sd = ExceptionSearchDef(template, names)
+        # matcher is shared by searches for the same names
+        other = ExceptionSearchDef(template, names)
+        self.assertTrue(sd.matcher is other.matcher)
+        line = ("2021-08-02 10:00:00.1 1 ERROR foo "
+                "oslo_messaging.exceptions.MessagingTimeout: bar")
+        self.assertEqual(sd.matcher.candidates(line), ['MessagingTimeout'])
+        self.assertEqual(sd.run(line).group(3),
+                         'oslo_messaging.exceptions.MessagingTimeout')
+        line = "2021-08-02 10:00:00.1 1 ERROR AMQP server on 10.0.0.1 is down"
+        self.assertEqual(sd.run(line + " ").group(3),
+                         'AMQP server on 10.0.0.1 is down')
+        line = "2021-08-02 10:00:00.1 1 ERROR foo Timeouts: bar"
+        self.assertEqual(sd.matcher.candidates(line), [])
+        self.assertIsNone(sd.run(line))
+
 
 class TestOpenstackPluginPartNeutronL3HA_checks(TestOpenstackBase):
 
@@ -742,7 +788,7 @@ class TestOpenstackPluginPartServiceChecks(TestOpenstackBase):
     @mock.patch.object(service_checks.issue_utils, "add_issue")
     def test_run_service_checks(self, mock_add_issue, mock_helper):
         mock_helper.return_value = mock.MagicMock()
-        mock_helper.return_value.journalctl.return_value = \
+        mock_helper.return_value.journalctl.iter_lines.return_value = \
             JOURNALCTL_OVS_CLEANUP_GOOD.splitlines(keepends=True)
         inst = service_checks.NeutronServiceChecks()
         inst()
@@ -755,7 +801,7 @@ class TestOpenstackPluginPartServiceChecks(TestOpenstackBase):
         Covers scenario where we had manual restart but not after last reboot.
         """
         mock_helper.return_value = mock.MagicMock()
-        mock_helper.return_value.journalctl.return_value = \
+        mock_helper.return_value.journalctl.iter_lines.return_value = \
             JOURNALCTL_OVS_CLEANUP_GOOD2.splitlines(keepends=True)
         inst = service_checks.NeutronServiceChecks()
         inst()
@@ -765,7 +811,7 @@ class TestOpenstackPluginPartServiceChecks(TestOpenstackBase):
     @mock.patch.object(service_checks.issue_utils, "add_issue")
     def test_run_service_checks_w_issue(self, mock_add_issue, mock_helper):
         mock_helper.return_value = mock.MagicMock()
-        mock_helper.return_value.journalctl.return_value = \
+        mock_helper.return_value.journalctl.iter_lines.return_value = \
             JOURNALCTL_OVS_CLEANUP_BAD.splitlines(keepends=True)
         inst = service_checks.NeutronServiceChecks()
         inst()
@@ -6,6 +6,7 @@ import tempfile
 import utils
 
 from core import constants
+from core.searchtools import SearchSource
 from plugins.rabbitmq.pyparts import (
     cluster_checks,
     services,
@@ -94,14 +95,10 @@ class TestRabbitmqServices(TestRabbitmqBase):
     def test_get_service_info_focal(self, mock_helper):
         mock_helper.return_value = mock.MagicMock()
 
-        def fake_get_rabbitmqctl_report():
-            path = os.path.join(constants.DATA_ROOT,
-                                "sos_commands/rabbitmq/rabbitmqctl_report."
-                                "focal")
-            return open(path, 'r').readlines()
-
-        mock_helper.return_value.rabbitmqctl_report.side_effect = \
-            fake_get_rabbitmqctl_report
+        path = os.path.join(constants.DATA_ROOT,
+                            "sos_commands/rabbitmq/rabbitmqctl_report.focal")
+        mock_helper.return_value.rabbitmqctl_report.search_source.\
+            return_value = path
 
         expected = {
             'services': ['beam.smp (1)', 'epmd (1)', 'rabbitmq-server (1)'],
@@ -177,7 +174,8 @@ class TestRabbitmqServices(TestRabbitmqBase):
     @mock.patch.object(services, 'CLIHelper')
     def test_get_service_info_no_report(self, mock_helper):
         mock_helper.return_value = mock.MagicMock()
-        mock_helper.return_value.rabbitmqctl_report.return_value = []
+        mock_helper.return_value.rabbitmqctl_report.search_source.\
+            return_value = SearchSource('rabbitmqctl_report', [])
         inst = services.RabbitMQServiceChecks()
         inst()
         self.assertFalse("resources" in inst.output)
@@ -1,4 +1,7 @@
+import bz2
 import glob
+import gzip
+import lzma
 import os
 
 import mock
@@ -6,15 +9,27 @@ import tempfile
 
 import utils
 
-from core import constants
+from core import compression, constants
+from core.logindex import LogIndex
 from core.searchtools import (
+    CountBy,
     FileSearcher,
     FilterDef,
+    LogStream,
     SearchDef,
     SearchResult,
+    SearchSource,
+    SearchWindow,
     SequenceSearchDef,
 )
 
+COUNT_TEST_1 = """2021-01-01 ERROR foo
+2021-01-01 ERROR bar
+2021-01-01 WARNING foo
+2021-01-02 ERROR foo
+2021-01-01 ERROR foo
+"""
+
 FILTER_TEST_1 = """blah blah ERROR blah
 blah blah ERROR blah
 blah blah INFO blah
@@ -68,6 +83,15 @@ section 3
 """
 
 
+def count_key_basename(values, source):
+    return os.path.basename(source)
+
+
+def count_source_key_a_log(source):
+    if os.path.basename(source) == 'a.log':
+        return 'a'
+
+
 class TestSearchTools(utils.BaseTestCase):
 
     @mock.patch.object(os, "environ", {})
@@ -475,3 +499,421 @@ class TestSearchTools(utils.BaseTestCase):
                 self.assertEqual(r.get(1), "blah")
 
             os.remove(ftmp.name)
+
+    def test_search_source(self):
+        source = SearchSource('seq-test', SEQ_TEST_1.splitlines(keepends=True))
+        s = FileSearcher()
+        sd = SequenceSearchDef(start=SearchDef(r"^a\S* (start\S*) point\S*"),
+                               body=SearchDef(r"leads to"),
+                               end=SearchDef(r"^an (ending)$"),
+                               tag="seq-search-test1")
+        s.add_search_term(sd, path=source)
+        s.add_search_term(SearchDef(r"^leads (to)$", tag="simple"),
+                          path=source)
+        results = s.search()
+        self.assertEqual(results.files, ['seq-test'])
+        sections = results.find_sequence_sections(sd)
+        self.assertEqual(len(sections), 1)
+        self.assertEqual([r.get(1) for r in sections[0]],
+                         ['start', None, 'ending'])
+        self.assertFalse(sd.started)
+        results = results.find_by_tag("simple", path=source)
+        self.assertEqual([(r.source, r.linenumber) for r in results],
+                         [('seq-test', 2)])
+
+    def test_search_source_buffer(self):
+        source = SearchSource('filter-test', FILTER_TEST_1)
+        s = FileSearcher()
+        s.add_filter_term(FilterDef(r" (ERROR)"), path=source)
+        s.add_search_term(SearchDef(r".+ ERROR (.+)"), path=source)
+        results = s.search().find_by_path('filter-test')
+        self.assertEqual([r.get(1) for r in results], ['blah', 'blah'])
+
+    def test_search_count_by(self):
+        with tempfile.TemporaryDirectory() as dtmp:
+            for name in ['a.log', 'b.log']:
+                with open(os.path.join(dtmp, name), 'w') as fd:
+                    fd.write(COUNT_TEST_1)
+
+            s = FileSearcher()
+            sd = SearchDef(r"^(\S+) ERROR (\S+)", tag="errors",
+                           aggregate=CountBy(groups=[1, 2]))
+            s.add_search_term(sd, path=dtmp)
+            sd = SearchDef(r"^(\S+) WARNING (\S+)", tag="warnings",
+                           aggregate=CountBy(groups=[2],
+                                             key=count_key_basename))
+            s.add_search_term(sd, path=dtmp)
+            results = s.search()
+            # counted matches are not returned as results
+            self.assertEqual(results.files, [])
+            self.assertEqual(results.find_counts_by_tag("errors"),
+                             {('2021-01-01', 'foo'): 4,
+                              ('2021-01-01', 'bar'): 2,
+                              ('2021-01-02', 'foo'): 2})
+            path = os.path.join(dtmp, 'a.log')
+            self.assertEqual(results.find_counts_by_tag("errors", path=path),
+                             {('2021-01-01', 'foo'): 2,
+                              ('2021-01-01', 'bar'): 1,
+                              ('2021-01-02', 'foo'): 1})
+            self.assertEqual(results.find_counts_by_source("warnings"),
+                             {path: {'a.log': 1},
+                              os.path.join(dtmp, 'b.log'): {'b.log': 1}})
+
+    def test_search_count_by_source_key(self):
+        with tempfile.TemporaryDirectory() as dtmp:
+            for name in ['a.log', 'b.log']:
+                with open(os.path.join(dtmp, name), 'w') as fd:
+                    fd.write(COUNT_TEST_1)
+
+            s = FileSearcher()
+            count_by = CountBy(groups=[1], source_key=count_source_key_a_log)
+            sd = SearchDef(r"^(\S+) ERROR", tag="errors", aggregate=count_by)
+            s.add_search_term(sd, path=dtmp)
+            results = s.search()
+            self.assertEqual(results.find_counts_by_tag("errors"),
+                             {('2021-01-01', 'a'): 3,
+                              ('2021-01-02', 'a'): 1,
+                              ('2021-01-01',): 3,
+                              ('2021-01-02',): 1})
+
+    def test_sequence_searcher_log_stream(self):
+        with tempfile.TemporaryDirectory() as dtmp:
+            with gzip.open(os.path.join(dtmp, 'foo.log.2.gz'), 'wt') as fd:
+                fd.write(SEQ_TEST_1)
+
+            with open(os.path.join(dtmp, 'foo.log.1'), 'w') as fd:
+                fd.write("a start point\nleads to\n")
+
+            with open(os.path.join(dtmp, 'foo.log'), 'w') as fd:
+                fd.write("leads to\nan ending\n")
+
+            s = FileSearcher()
+            streams = s.log_streams(s.filtered_paths(
+                                    glob.glob(os.path.join(dtmp, 'foo.log*'))))
+            self.assertEqual(len(streams), 1)
+            self.assertEqual([os.path.basename(p) for p in streams[0].paths],
+                             ['foo.log.2.gz', 'foo.log.1', 'foo.log'])
+            sd = SequenceSearchDef(start=SearchDef(r"^a\S* (start\S*) point"),
+                                   body=SearchDef(r"leads to"),
+                                   end=SearchDef(r"^an (ending)$"),
+                                   tag="seq-search-test-stream")
+            s.add_search_term(sd, path=os.path.join(dtmp, 'foo.log*'))
+            results = s.search()
+            sections = results.find_sequence_sections(sd)
+            self.assertEqual(len(sections), 2)
+            # the second section spans the rotation boundary
+            sources = [os.path.basename(r.source) for r in sections[1]]
+            self.assertEqual(sources, ['foo.log.1', 'foo.log.1', 'foo.log',
+                                       'foo.log'])
+
+    def test_log_stream_pipelined(self):
+        with tempfile.TemporaryDirectory() as dtmp:
+            contents = ''.join(["{}\n".format(i) for i in
+                                range(LogStream.BATCH_SIZE * 3)])
+            paths = [os.path.join(dtmp, 'foo.log.1.gz'),
+                     os.path.join(dtmp, 'foo.log')]
+            with gzip.open(paths[0], 'wt') as fd:
+                fd.write(contents)
+
+            with open(paths[1], 'w') as fd:
+                fd.write(contents)
+
+            stream = LogStream(paths)
+            self.assertTrue(stream.compressed)
+            lines = list(stream)
+            self.assertEqual(len(lines), LogStream.BATCH_SIZE * 6)
+            self.assertEqual(lines[0], (paths[0], 1, "0\n"))
+            self.assertEqual(lines[-1], (paths[1], LogStream.BATCH_SIZE * 3,
+                                         "{}\n".format(
+                                             LogStream.BATCH_SIZE * 3 - 1)))
+
+    def test_log_stream_bad_member(self):
+        with tempfile.TemporaryDirectory() as dtmp:
+            data = gzip.compress(b"2021-01-01 ERROR foo\n" * 1000)
+            with open(os.path.join(dtmp, 'foo.log.1.gz'), 'wb') as fd:
+                # truncated
+                fd.write(data[:len(data) // 2])
+
+            with open(os.path.join(dtmp, 'foo.log'), 'w') as fd:
+                fd.write("2021-01-02 ERROR foo\n")
+
+            s = FileSearcher()
+            s.add_search_term(SearchDef(r"(\S+) ERROR", tag="err"),
+                              path=os.path.join(dtmp, 'foo.log*'))
+            results = s.search().find_by_tag("err")
+            # the current log is still searched
+            self.assertEqual(results[-1].get(1), '2021-01-02')
+            self.assertEqual(os.path.basename(results[-1].source), 'foo.log')
+
+    def test_search_compressed(self):
+        with tempfile.TemporaryDirectory() as dtmp:
+            with lzma.open(os.path.join(dtmp, 'foo.log.2.xz'), 'wt') as fd:
+                fd.write("2021-01-01 ERROR foo\n")
+
+            with bz2.open(os.path.join(dtmp, 'foo.log.1.bz2'), 'wt') as fd:
+                fd.write("2021-01-02 ERROR foo\n")
+
+            with open(os.path.join(dtmp, 'foo.log'), 'w') as fd:
+                fd.write("2021-01-03 ERROR foo\n")
+
+            paths = sorted(glob.glob(os.path.join(dtmp, 'foo.log*')))
+            s = FileSearcher()
+            streams = s.log_streams(s.filtered_paths(paths))
+            self.assertEqual(len(streams), 1)
+            self.assertEqual([os.path.basename(p) for p in streams[0].paths],
+                             ['foo.log.2.xz', 'foo.log.1.bz2', 'foo.log'])
+            with mock.patch.object(compression, 'open_binary',
+                                   wraps=compression.open_binary) as mock_open:
+                self.assertTrue(streams[0].compressed)
+                self.assertEqual([codec and codec.name for _, codec, _ in
+                                  streams[0].members], ['xz', 'bzip2', None])
+                self.assertEqual(len(list(streams[0])), 3)
+                # each file is only opened once
+                self.assertEqual(mock_open.call_count, 3)
+
+            s.add_search_term(SearchDef(r"(\S+) ERROR", tag="err"),
+                              path=os.path.join(dtmp, 'foo.log*'))
+            results = s.search()
+            self.assertEqual([r.get(1) for r in results.find_by_tag("err")],
+                             ['2021-01-01', '2021-01-02', '2021-01-03'])
+
+            # searched on their own, large compressed logs are pipelined
+            with mock.patch.object(LogStream, 'PIPELINE_MIN_SIZE', 0):
+                for path in paths:
+                    s = FileSearcher()
+                    s.add_search_term(SearchDef(r"(\S+) ERROR", tag="err"),
+                                      path=path)
+                    results = s.search().find_by_path(path)
+                    self.assertEqual(len(results), 1)
+                    self.assertEqual(results[0].source, path)
+
+    def test_search_codec_unavailable(self):
+        zstd = [c for c in compression.CODECS if c.name == 'zstd'][0]
+        with tempfile.TemporaryDirectory() as dtmp:
+            path = os.path.join(dtmp, 'foo.log.1.zst')
+            with open(path, 'wb') as fd:
+                fd.write(zstd.magic + b'\x00' * 16)
+
+            with mock.patch.object(zstd, 'opener', None):
+                self.assertRaises(compression.CodecUnavailable,
+                                  compression.open_binary, path)
+                s = FileSearcher()
+                s.add_search_term(SearchDef(r".+", tag="any"), path=path)
+                self.assertEqual(s.search().find_by_path(path), [])
+
+                # only that file is skipped when part of a stream
+                with open(os.path.join(dtmp, 'foo.log'), 'w') as fd:
+                    fd.write("2021-01-02 ERROR foo\n")
+
+                s = FileSearcher()
+                s.add_search_term(SearchDef(r"(\S+) ERROR", tag="err"),
+                                  path=os.path.join(dtmp, 'foo.log*'))
+                results = s.search().find_by_tag("err")
+                self.assertEqual([r.get(1) for r in results], ['2021-01-02'])
+
+    @mock.patch.object(SearchWindow, 'BISECT_MIN_BYTES', 4096)
+    def test_search_window(self):
+        window = SearchWindow(since='2021-01-02', until='2021-01-03 12:00')
+        self.assertEqual(window.since, '2021-01-02 00:00:00')
+        self.assertEqual(window.until, '2021-01-03 12:00:59')
+        self.assertRaises(ValueError, SearchWindow, since='yesterday')
+        with tempfile.NamedTemporaryFile(mode='w', delete=False) as ftmp:
+            # 4 days of one line per minute plus an untimestamped line
+            for day in range(1, 5):
+                if day == 2:
+                    day2_offset = ftmp.tell()
+
+                for minute in range(24 * 60):
+                    hour, minute = divmod(minute, 60)
+                    ftmp.write("2021-01-0{} {:02d}:{:02d}:00.000 1 INFO foo\n"
+                               "trace\n".format(day, hour, minute))
+
+            ftmp.close()
+            with open(ftmp.name, 'rb') as fd:
+                offset = window.find_start(fd, os.path.getsize(ftmp.name))
+                self.assertTrue(day2_offset - window.BISECT_MIN_BYTES <
+                                offset <= day2_offset)
+
+            env = {'SEARCH_SINCE': '2021-01-02',
+                   'SEARCH_UNTIL': '2021-01-03 12:00'}
+            with mock.patch.dict(os.environ, env):
+                s = FileSearcher()
+                s.add_search_term(SearchDef(r"^(\S+) (\S+) .+ INFO",
+                                            tag="info"), ftmp.name)
+                s.add_search_term(SearchDef(r"^trace", tag="trace"),
+                                  ftmp.name)
+                results = s.search()
+
+            os.remove(ftmp.name)
+            info = results.find_by_tag("info")
+            self.assertEqual(len(info), 24 * 60 + 12 * 60 + 1)
+            self.assertEqual(len(results.find_by_tag("trace")), len(info))
+            self.assertEqual((info[0].get(1), info[0].get(2)),
+                             ('2021-01-02', '00:00:00.000'))
+            self.assertEqual((info[-1].get(1), info[-1].get(2)),
+                             ('2021-01-03', '12:00:00.000'))
+            # line numbers are still those of the whole file
+            self.assertEqual(info[0].linenumber, (24 * 60 * 2) + 1)
+
+    @mock.patch.object(SearchWindow, 'BISECT_MIN_BYTES', 4096)
+    def test_search_window_log_stream(self):
+        with tempfile.TemporaryDirectory() as dtmp:
+            # one line per minute, two days per file
+            for name, days in [('foo.log.1', (1, 2)), ('foo.log', (3, 4))]:
+                with open(os.path.join(dtmp, name), 'w') as fd:
+                    for day in days:
+                        for minute in range(24 * 60):
+                            hour, minute = divmod(minute, 60)
+                            fd.write("2021-01-0{} {:02d}:{:02d}:00.000 1 "
+                                     "INFO foo\ntrace\n".
+                                     format(day, hour, minute))
+
+            window = SearchWindow(since='2021-01-02 12:00')
+            stream = LogStream([os.path.join(dtmp, 'foo.log.1'),
+                                os.path.join(dtmp, 'foo.log')], window=window)
+            lines = list(stream)
+            # the older file is bisected, the newer one is read in full
+            self.assertEqual(list(stream.skipped),
+                             [os.path.join(dtmp, 'foo.log.1')])
+            self.assertTrue(lines[0][2].startswith("2021-01-02"))
+            self.assertEqual(lines[-1][2], "trace\n")
+
+            with mock.patch.dict(os.environ,
+                                 {'SEARCH_SINCE': '2021-01-02 12:00'}):
+                s = FileSearcher()
+                s.add_search_term(SearchDef(r"^(\S+) (\S+) .+ INFO",
+                                            tag="info"),
+                                  os.path.join(dtmp, 'foo.log*'))
+                results = s.search()
+
+            info = results.find_by_tag("info")
+            self.assertEqual(len(info), 12 * 60 + 2 * 24 * 60)
+            self.assertEqual((info[0].get(1), info[0].get(2)),
+                             ('2021-01-02', '12:00:00.000'))
+            # line numbers are still those of the whole file
+            self.assertEqual(info[0].linenumber, (24 * 60 + 12 * 60) * 2 + 1)
+            self.assertEqual(os.path.basename(info[-1].source), 'foo.log')
+            self.assertEqual(info[-1].linenumber, 24 * 60 * 4 - 1)
+
+    def test_search_index(self):
+        with tempfile.TemporaryDirectory() as dtmp:
+            path = os.path.join(dtmp, 'foo.log')
+            with open(path, 'w') as fd:
+                for day in range(1, 3):
+                    for minute in range(24 * 60):
+                        hour, minute = divmod(minute, 60)
+                        fd.write("2021-01-0{} {:02d}:{:02d}:00.000 1 INFO "
+                                 "foo\n".format(day, hour, minute))
+
+            def search():
+                s = FileSearcher()
+                s.add_search_term(SearchDef(r"^(\S+) (\S+) .+ INFO",
+                                            tag="info"), path)
+                return s.search().find_by_tag("info")
+
+            index_dir = os.path.join(dtmp, 'index')
+            os.mkdir(index_dir)
+            with mock.patch.dict(os.environ, {'SEARCH_INDEX_DIR': index_dir}):
+                # first search builds the index
+                self.assertEqual(len(search()), 2 * 24 * 60)
+                index = LogIndex.load(path, os.stat(path))
+                self.assertEqual(index.lines, 2 * 24 * 60)
+                self.assertEqual(len(index.entries),
+                                 (2 * 24 * 60) // LogIndex.INTERVAL)
+                self.assertEqual(index.entries[0][0], '2021-01-01 16:39:00')
+                self.assertEqual(index.entries[0][2], LogIndex.INTERVAL)
+
+                # and the next uses it in place of bisecting the log
+                with mock.patch.dict(os.environ,
+                                     {'SEARCH_SINCE': '2021-01-02 12:00'}):
+                    with mock.patch.object(SearchWindow,
+                                           'find_start') as mock_find:
+                        info = search()
+                        self.assertFalse(mock_find.called)
+
+            self.assertEqual(len(info), 12 * 60)
+            self.assertEqual((info[0].get(1), info[0].get(2)),
+                             ('2021-01-02', '12:00:00.000'))
+            self.assertEqual(info[0].linenumber, 36 * 60 + 1)
+
+    def test_search_index_text_mode(self):
+        with tempfile.TemporaryDirectory() as dtmp:
+            path = os.path.join(dtmp, 'foo.log')
+            with open(path, 'wb') as fd:
+                for minute in range(24 * 60):
+                    hour, minute = divmod(minute, 60)
+                    # CRLF line endings and a lone CR which text mode treats
+                    # as the end of a line.
+                    fd.write("2021-01-01 {:02d}:{:02d}:00.000 1 INFO foo\r\n"
+                             "trace\rINFO bar\n".format(hour, minute).
+                             encode())
+
+            def search():
+                s = FileSearcher()
+                s.add_search_term(SearchDef(r"^(.+ )?INFO (\S+)$",
+                                            tag="info"), path)
+                return [(r.linenumber, r.get(2)) for r in
+                        s.search().find_by_tag("info")]
+
+            expected = search()
+            self.assertEqual(len(expected), 2 * 24 * 60)
+            self.assertEqual(expected[:2], [(1, 'foo'), (3, 'bar')])
+            index_dir = os.path.join(dtmp, 'index')
+            os.mkdir(index_dir)
+            with mock.patch.dict(os.environ, {'SEARCH_INDEX_DIR': index_dir}):
+                self.assertEqual(search(), expected)
+                index = LogIndex.load(path, os.stat(path))
+                self.assertEqual(index.lines, 3 * 24 * 60)
+
+            env = {'SEARCH_SINCE': '2021-01-01 12:00'}
+            with mock.patch.dict(os.environ, env):
+                self.assertEqual(search(), expected[12 * 60 * 2:])
+
+            env['SEARCH_INDEX_DIR'] = index_dir
+            with mock.patch.dict(os.environ, env):
+                self.assertEqual(search(), expected[12 * 60 * 2:])
+
+    def test_search_index_skipped(self):
+        with tempfile.TemporaryDirectory() as dtmp:
+            index_dir = os.path.join(dtmp, 'index')
+            os.mkdir(index_dir)
+            paths = [os.path.join(dtmp, name) for name in ['small.log',
+                                                           'untimestamped',
+                                                           'foo.log']]
+            with open(paths[0], 'w') as fd:
+                fd.write("2021-01-01 00:00:00.000 1 INFO foo\n")
+
+            with open(paths[1], 'w') as fd:
+                fd.write("INFO foo\n" * LogIndex.MIN_SIZE)
+
+            with open(paths[2], 'w') as fd:
+                fd.write("2021-01-02 00:00:00.000 1 INFO foo\n" *
+                         LogIndex.INTERVAL * 2)
+
+            env = {'SEARCH_INDEX_DIR': index_dir,
+                   'SEARCH_SINCE': '2021-01-01'}
+            with mock.patch.dict(os.environ, env):
+                s = FileSearcher()
+                for path in paths:
+                    s.add_search_term(SearchDef(r"INFO (\S+)", tag="info"),
+                                      path)
+
+                s.search()
+                # only a timestamped log that is big enough is indexed, even
+                # when the search is restricted, provided it is read in full.
+                self.assertEqual([LogIndex.load(p, os.stat(p)) is not None
+                                  for p in paths], [False, False, True])
+
+    def test_search_window_rotated(self):
+        with tempfile.TemporaryDirectory() as dtmp:
+            for name in ['foo.log', 'foo.log.1', 'foo.log.2.gz']:
+                os.mknod(os.path.join(dtmp, name))
+
+            # last modified long before the window
+            os.utime(os.path.join(dtmp, 'foo.log.2.gz'), (0, 0))
+            with mock.patch.dict(os.environ, {'SEARCH_SINCE': '2021-01-01'}):
+                path = os.path.join(dtmp, 'foo.log*')
+                paths = FileSearcher().filtered_paths(glob.glob(path))
+
+            self.assertEqual(sorted([os.path.basename(p) for p in paths]),
+                             ['foo.log', 'foo.log.1'])
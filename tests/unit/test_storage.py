@@ -4,7 +4,11 @@ import os
 import tempfile
 import utils
 
-from core import checks
+from core import (
+    checks,
+    constants,
+    host_helpers,
+)
 from core.issues import issue_types
 from core.plugins.storage import (
     bcache as bcache_core,
@@ -218,6 +222,68 @@ class TestStorageCephDaemons(StorageTestsBase):
         dump = ceph_core.CephOSD(1, 1234, '/dev/foo').osd_dump
         self.assertEqual(dump['require_osd_release'], 'octopus')
 
+    def test_osd_dump_entries(self):
+        osds = ceph_core.get_cluster_snapshot().osd_dump_entries
+        self.assertEqual(sorted(osds), [0, 1, 2])
+        self.assertTrue(osds[0].up)
+        self.assertTrue(osds[0].is_in)
+        self.assertTrue(osds[0].msgr_v2)
+        self.assertEqual(osds[0].weight, 1.0)
+        self.assertEqual(osds[0].public_addr,
+                         '[v2:10.0.0.49:6800/33943,v1:10.0.0.49:6801/33943]')
+
+    @mock.patch.object(ceph_core, 'CLIHelper')
+    def test_daemon_versions_counts(self, mock_helper):
+        mock_helper.return_value = mock.MagicMock()
+        mock_helper.return_value.ceph_versions.return_value = \
+            CEPH_VERSIONS_MISMATCHED_MINOR.split('\n')
+        cluster = ceph_core.get_cluster_snapshot()
+        self.assertEqual(cluster.daemon_versions('osd'),
+                         {'15.2.11': 208, '15.2.13': 16})
+        self.assertEqual(cluster.daemon_release_names(),
+                         {'mon': {'octopus': 3}, 'mgr': {'octopus': 3},
+                          'osd': {'octopus': 224},
+                          'overall': {'octopus': 233}})
+
+    def test_cluster_snapshot(self):
+        osd = ceph_core.CephOSD(1, 1234, '/dev/foo')
+        self.assertTrue(osd.cluster is ceph_core.CephMon().cluster)
+        self.assertEqual(osd.cluster.osd_devtypes,
+                         {0: 'ssd', 1: 'ssd', 2: 'ssd'})
+        self.assertEqual(osd.devtype, 'ssd')
+        self.assertEqual(osd.processes, [])
+        self.assertEqual(len(ceph_core.CephOSD(0).processes), 1)
+
+    def test_osd_table(self):
+        osds = ceph_core.get_cluster_snapshot().osd_table
+        self.assertEqual(list(osds.ids), [2, 1, 0])
+        self.assertEqual(osds.hosts, ['compute1', 'compute2', 'compute4'])
+        self.assertEqual(osds.by_name('pgs'),
+                         {'osd.0': 295, 'osd.1': 501, 'osd.2': 200})
+        rows = osds.select('kb_used_meta', lambda kb: kb > 10 * 1024 * 1024)
+        self.assertEqual(osds.by_name('kb_used_meta', rows),
+                         {'osd.2': 11468020})
+
+    def test_osd_table_select_no_numpy(self):
+        osds = ceph_core.get_cluster_snapshot().osd_table
+
+        def suboptimal(pgs):
+            return abs(100 - (100.0 / 200 * pgs)) > 30
+
+        expected = osds.select('pgs', suboptimal)
+        with mock.patch.object(ceph_core, 'numpy', None):
+            self.assertEqual(osds.select('pgs', suboptimal), expected)
+
+        self.assertEqual(osds.by_name('pgs', expected),
+                         {'osd.0': 295, 'osd.1': 501})
+        self.assertEqual(osds.select('names', lambda name: name == 'osd.1'),
+                         [1])
+
+    def test_crush_buckets(self):
+        buckets = ceph_core.get_cluster_snapshot().crush_buckets
+        self.assertEqual(len(buckets), 8)
+        self.assertEqual(buckets.mixed_type_buckets(), [])
+
 
 class TestStoragePluginPartCephGeneral(StorageTestsBase):
 
@@ -243,8 +309,9 @@ class TestStoragePluginPartCephGeneral(StorageTestsBase):
         inst()
         self.assertEqual(inst.output, expected)
 
+    @mock.patch.object(host_helpers, 'get_process_table')
     @mock.patch.object(checks, 'CLIHelper')
-    def test_get_service_info_unavailable(self, mock_helper):
+    def test_get_service_info_unavailable(self, mock_helper, mock_ps):
         expected = {'ceph': {
                         'network': {
                             'cluster': {
@@ -260,8 +327,8 @@ class TestStoragePluginPartCephGeneral(StorageTestsBase):
                             },
                         'release': 'unknown'}}
 
+        mock_ps.return_value = host_helpers.ProcessTable([])
         mock_helper.return_value = mock.MagicMock()
-        mock_helper.return_value.ps.return_value = []
         mock_helper.return_value.dpkg_l.return_value = []
         inst = ceph_general.CephServiceChecks()
         inst()
@@ -407,6 +474,29 @@ class TestStoragePluginPartCephDaemonChecks(StorageTestsBase):
             inst.check_osdmaps_size()
             self.assertTrue(mock_issue_utils.add_issue.called)
 
+    @mock.patch.object(ceph_daemon_checks, 'issue_utils')
+    def test_check_osd_utilization_variance(self, mock_issue_utils):
+        inst = ceph_daemon_checks.CephOSDChecks()
+        inst.check_osd_utilization_variance()
+        self.assertFalse(mock_issue_utils.add_issue.called)
+
+    @mock.patch.object(ceph_daemon_checks, 'issue_utils')
+    def test_check_osd_utilization_variance_w_issue(self, mock_issue_utils):
+        path = os.path.join(constants.DATA_ROOT, 'sos_commands/ceph/'
+                            'json_output/'
+                            'ceph_osd_df_tree_--format_json-pretty')
+        with open(path) as fd:
+            df_tree = json.load(fd)
+
+        df_tree['nodes'][2]['var'] = 1.3
+        with mock.patch.object(ceph_core, 'CLIHelper') as mock_helper:
+            mock_helper.return_value = mock.MagicMock()
+            mock_helper.return_value.ceph_osd_df_tree_json_decoded.\
+                return_value = df_tree
+            inst = ceph_daemon_checks.CephOSDChecks()
+            inst.check_osd_utilization_variance()
+            self.assertTrue(mock_issue_utils.add_issue.called)
+
     @mock.patch.object(ceph_daemon_checks, 'issue_utils')
     def test_check_ceph_bluefs_size(self, mock_issue_utils):
         inst = ceph_daemon_checks.CephOSDChecks()